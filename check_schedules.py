@@ -0,0 +1,108 @@
+"""
+Checks a batch of schedule workbooks from the command line, without opening the window.
+
+Every workbook is read and checked in its own process, so a term's worth of college
+files is checked about as many at a time as there are cores. The report has one line
+per room, faculty or takers conflict and per invalid cell, for example:
+
+    python check_schedules.py term/ extra.xlsx --format json --output report.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from scheduling_core import COURSE_CODE, SECT, ScheduleCore, to_time
+
+REPORT_FIELDS = ("file", "kind", "value", "day", "time", "sheet_row_a", "schedule_a", "sheet_row_b", "schedule_b", "problem")
+
+
+def workbook_paths(paths):
+    """
+    The .xlsx files named on the command line, with the ones inside directories.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith(".xlsx") and not name.startswith("~$"))
+            found.extend(os.path.join(path, name) for name in names)
+        else:
+            found.append(path)
+    return found
+
+
+def check_workbook(path):
+    """
+    The report lines of one workbook. Runs in a worker process, so it only returns plain data.
+    """
+    try:
+        core = ScheduleCore.open(path)
+    except Exception as e:
+        return [dict.fromkeys(REPORT_FIELDS, '') | {"file": path, "kind": "Error", "problem": f"Could not read the workbook: {e}"}]
+
+    df = core.model.df
+    labels = (df[COURSE_CODE].astype(str) + " " + df[SECT].astype(str)).str.strip()
+    lines = []
+    for conflicts in (core.conflicts(), core.takers_conflicts()):
+        for pair in conflicts.to_dict("records"):
+            lines.append({
+                "file": path,
+                "kind": pair["kind"],
+                "value": pair["value"],
+                "day": pair["day"],
+                "time": f"{to_time(max(pair['begin_a'], pair['begin_b']))}-{to_time(min(pair['end_a'], pair['end_b']))}",
+                "sheet_row_a": pair["row_id_a"] + 1,
+                "schedule_a": labels[pair["row_id_a"]],
+                "sheet_row_b": pair["row_id_b"] + 1,
+                "schedule_b": labels[pair["row_id_b"]],
+                "problem": f"{pair['kind']} {pair['value']} is used by both",
+            })
+    for row_id, error in core.validation_errors():
+        lines.append(dict.fromkeys(REPORT_FIELDS, '') | {
+            "file": path, "kind": "Invalid", "sheet_row_a": row_id + 1, "schedule_a": labels[row_id], "problem": error,
+        })
+    core.close()
+    return lines
+
+
+def write_report(lines, output, report_format):
+    if report_format == "json":
+        json.dump(lines, output, indent=1, default=str)
+        output.write("\n")
+    else:
+        writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check schedule workbooks for room, faculty and takers conflicts and invalid cells.")
+    parser.add_argument("paths", nargs="+", help=".xlsx files or directories holding them")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv", dest="report_format")
+    parser.add_argument("--output", help="report file (default: print it)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="workbooks checked at the same time (default: one per core)")
+    args = parser.parse_args(argv)
+
+    paths = workbook_paths(args.paths)
+    if not paths:
+        parser.error("no .xlsx files found")
+
+    # One workbook per task, the results come back in the order of the paths
+    lines = []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(paths)))) as executor:
+        for path, workbook_lines in zip(paths, executor.map(check_workbook, paths)):
+            lines.extend(workbook_lines)
+            print(f"{path}: {len(workbook_lines)} problems", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", newline='', encoding="utf-8") as output:
+            write_report(lines, output, args.report_format)
+    else:
+        write_report(lines, sys.stdout, args.report_format)
+    return 1 if lines else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+A small local HTTP/JSON service over a schedule workbook, for tools that need to ask
+"is this room free?" or "what are this faculty member's conflicts?" without the window.
+
+    python schedule_service.py TestFile.xlsx --port 8765
+
+    GET  /free?room=MRE113&day=T&begin=1100&end=1230   (or faculty=...)
+    GET  /conflicts?faculty=MATIAS, ANGELO              (or room=...)
+    GET  /schedule?row=52
+    POST /edit  {"row": 52, "changes": {"Room1": "MRE200"}}  or  {"row": 52, "delete": true}
+    POST /save  writes the edits back to the workbook
+
+Reads are answered from a ScheduleView, an immutable copy of what the lookups need, so
+any number of them run while an edit is being applied. Edits go through one writer, one
+at a time, and each one swaps in a new view when it is done.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from scheduling_core import (
+    COURSE_CODE, SECT, ScheduleCore, conflict_keys, day_letters, find_meeting_slots, is_shared_room, meetings_table, pd,
+    to_minutes, to_time,
+)
+
+KINDS = {"room": "Room", "faculty": "Faculty"}
+
+
+class ScheduleView:
+    """
+    What the queries read, frozen: the meetings in each (kind, value, day) bucket of the
+    conflict index sorted by begin time, the conflicts of each room and faculty member,
+    and the label of each row.
+
+    updated() makes the next view, only the buckets and names an edit touched are built
+    again, the rest is shared with the old view (which nothing changes anymore).
+    """
+
+    def __init__(self, version, busy, conflicts, labels):
+        self.version = version
+        self.busy = busy  # (kind, value, day) -> ((begin, end, row ID), ...) by begin
+        self.conflicts = conflicts  # (kind, value) -> (conflict record, ...)
+        self.labels = labels  # Row ID -> "CODE SECT"
+
+    @classmethod
+    def build(cls, core):
+        df = core.model.df
+        labels = dict(zip(df.index, (df[COURSE_CODE].astype(str) + " " + df[SECT].astype(str)).str.strip()))
+        busy = {key: cls.bucket(core, key) for key in core.conflict_index.buckets}
+        conflicts = {}
+        for pair in core.conflict_index.pairs.values():
+            conflicts.setdefault((pair["kind"], pair["value"]), []).append(pair)
+        return cls(0, busy, {key: tuple(pairs) for key, pairs in conflicts.items()}, labels)
+
+    @staticmethod
+    def bucket(core, key):
+        meetings = core.conflict_index.buckets.get(key, {})
+        return tuple(sorted((begin, end, row_id) for (row_id, _), (begin, end) in meetings.items()))
+
+    def updated(self, core, bucket_keys, row_ids):
+        busy = dict(self.busy)
+        for key in bucket_keys:
+            meetings = self.bucket(core, key)
+            if meetings:
+                busy[key] = meetings
+            else:
+                busy.pop(key, None)
+
+        # The conflicts of a room or faculty member are found through the rows meeting there
+        conflicts = dict(self.conflicts)
+        for kind, value in {(kind, value) for kind, value, _ in bucket_keys}:
+            rows = {row_id for day in "MTWHFSU" for _, _, row_id in busy.get((kind, value, day), ())}
+            pairs = {key: core.conflict_index.pairs[key] for row_id in rows for key in core.conflict_index.row_pairs.get(row_id, ())}
+            found = tuple(pair for pair in pairs.values() if pair["kind"] == kind and pair["value"] == value)
+            if found:
+                conflicts[(kind, value)] = found
+            else:
+                conflicts.pop((kind, value), None)
+
+        labels = dict(self.labels)
+        df = core.model.df
+        for row_id in row_ids:
+            if row_id in df.index:
+                labels[row_id] = f"{df.at[row_id, COURSE_CODE]} {df.at[row_id, SECT]}".strip()
+            else:
+                labels.pop(row_id, None)
+        return ScheduleView(self.version + 1, busy, conflicts, labels)
+
+    def meeting(self, row_id, begin, end):
+        return {"row": row_id + 1, "schedule": self.labels.get(row_id, ''), "begin": to_time(begin), "end": to_time(end)}
+
+    def free(self, kind, value, days, begin, end):
+        """
+        Whether the room or faculty member has nothing between begin and end on any of the
+        days, with the meetings in the way.
+        """
+        if kind == "Room" and is_shared_room(value):
+            return {"free": True, "busy": []}
+        busy = []
+        for day in days:
+            meetings = self.busy.get((kind, value, day), ())
+            # Meetings are sorted by begin, the ones starting at or after end can't overlap
+            for meeting_begin, meeting_end, row_id in meetings[:bisect_left(meetings, (end,))]:
+                if meeting_end > begin:
+                    busy.append(dict(self.meeting(row_id, meeting_begin, meeting_end), day=day))
+        return {"free": not busy, "busy": busy}
+
+    def conflicts_of(self, kind, value):
+        return [{
+            "day": pair["day"],
+            "a": self.meeting(pair["row_id_a"], pair["begin_a"], pair["end_a"]),
+            "b": self.meeting(pair["row_id_b"], pair["begin_b"], pair["end_b"]),
+        } for pair in self.conflicts.get((kind, value), ())]
+
+
+class ScheduleService:
+    """
+    Holds the core and the current view, answers the requests and runs the writer.
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.view = ScheduleView.build(core)
+        self.edits = asyncio.Queue()  # (work, future) waiting for the writer, work() returns the next view
+        self.executor = ThreadPoolExecutor(max_workers=1)  # The writer's thread, the only one touching the core
+
+    async def writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            work, future = await self.edits.get()
+            try:
+                self.view = await loop.run_in_executor(self.executor, work)
+                future.set_result({"version": self.view.version})
+            except Exception as e:  # The writer keeps going, the client gets the error
+                future.set_result({"error": str(e)})
+
+    def apply_edit(self, edit):
+        """
+        Applies one edit to the core and returns the next view. Runs on the writer's thread.
+        """
+        model = self.core.model
+        try:
+            row_id = int(edit["row"]) - 1
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("The edit needs the sheet row number of the schedule as row.")
+        if row_id not in model.df.index or row_id in model.college_header_ids():
+            raise ValueError(f"Row {row_id + 1} is not a schedule.")
+        before = model.df.loc[[row_id]]
+
+        transaction = model.transaction()
+        if edit.get("delete"):
+            transaction.delete(row_id)
+        else:
+            changes = edit.get("changes")
+            if not isinstance(changes, dict) or not changes:
+                raise ValueError("The edit needs changes like {\"Room1\": \"MRE200\"} or delete.")
+            transaction.update(row_id, {model.column_index(name): value for name, value in changes.items()})
+        transaction.commit()
+
+        # The buckets the row was in and the ones it is in now
+        rows = pd.concat([before, model.df.loc[[row_id]]]) if row_id in model.df.index else before
+        keys = conflict_keys(meetings_table(rows, find_meeting_slots(model.column_names())))
+        return self.view.updated(self.core, set(zip(keys["kind"], keys["value"], keys["day"])), [row_id])
+
+    def save(self):
+        self.core.save(self.core.model.colleges.file_path)
+        return self.view
+
+    def answer(self, method, target, body):
+        """
+        (status, JSON-able result) of one request.
+        """
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        view = self.view  # One view for the whole request, even if an edit lands meanwhile
+        kind, value = next(((KINDS[name], query[name].strip().upper()) for name in KINDS if name in query), (None, None))
+
+        if method == "GET" and url.path == "/free":
+            days = day_letters(query.get("day", ''))
+            begin, end = to_minutes(query.get("begin", '')), to_minutes(query.get("end", ''))
+            if kind is None or not days or begin is None or end is None or begin >= end:
+                return 400, {"error": "Use /free?room=...&day=T&begin=1100&end=1230 (or faculty=...)."}
+            return 200, dict(view.free(kind, value, days, begin, end), version=view.version)
+        if method == "GET" and url.path == "/conflicts":
+            if kind is None:
+                return 400, {"error": "Use /conflicts?faculty=... or /conflicts?room=...."}
+            return 200, {"conflicts": view.conflicts_of(kind, value), "version": view.version}
+        if method == "GET" and url.path == "/schedule":
+            row_id = int(query["row"]) - 1 if query.get("row", '').isdigit() else None
+            if row_id not in view.labels:
+                return 404, {"error": "No such row."}
+            return 200, {"row": row_id + 1, "schedule": view.labels[row_id], "version": view.version}
+        return 404, {"error": f"Unknown request {method} {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, header_value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = header_value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "POST" and target == "/edit":
+                    status, result = await self.queue_edit(body)
+                elif method == "POST" and target == "/save":
+                    status, result = await self.queue(self.save)
+                else:
+                    status, result = self.answer(method, target, body)
+                payload = json.dumps(result, default=str).encode()
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if headers.get("connection", '').lower() == "close":
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def queue_edit(self, body):
+        try:
+            edit = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "The edit has to be JSON."}
+        if not isinstance(edit, dict):
+            return 400, {"error": "The edit has to be a JSON object."}
+        return await self.queue(lambda: self.apply_edit(edit))
+
+    async def queue(self, work):
+        future = asyncio.get_running_loop().create_future()
+        await self.edits.put((work, future))
+        result = await future
+        return (400 if "error" in result else 200), result
+
+
+async def serve(core, host, port):
+    service = ScheduleService(core)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving {core.model.colleges.file_path} on http://{host}:{port}", file=sys.stderr)
+    async with server:
+        await asyncio.gather(server.serve_forever(), service.writer())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer room, faculty and conflict queries over a schedule workbook.")
+    parser.add_argument("path", help="the .xlsx workbook")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(ScheduleCore.open(args.path), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,1244 @@
-import pandas as pd
+import time
+START_TIME = time.perf_counter()  # First thing, so the startup imports count towards the first paint too
+
 import tkinter as tk
-from tkinter import Menu, ttk, simpledialog, messagebox
+from tkinter import Menu, ttk, simpledialog, messagebox, filedialog
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+import difflib
 import os
+import sqlite3
+from scheduling_core import (
+    COURSE_CODE, COURSE_TITLE, DAY_LETTERS, DAY_NAMES, DELETED, INSERTED, RESET, SECT,
+    ScheduleCore, StaleRowsError, Task, TaskCancelled,
+    export_report, find_meeting_slots, meetings_table, minutes_to_times, pd, to_time,
+)
+
+FIRST_PAINT_BUDGET_MS = 300  # The main window should show up within this long
+FILTER_DELAY_MS = 200  # Wait this long after the last keystroke before filtering
+TASK_POLL_MS = 50  # How often the Tk thread checks on a running task
+STORE_POLL_MS = 2000  # How often the edits of the others sharing a store are pulled in
+STORE_POLL_MAX_MS = 60000  # Longest wait between pulls while the store can't be read, the wait doubles up to this
+
+
+class VirtualTable:
+    """
+    A Treeview that only has items for the lines in view.
+
+    The row IDs of every opened college are kept in plain lists and a fixed set of
+    Treeview items, one per visible line, is reused while scrolling. The scrollbar is
+    mapped to the total number of lines, so the widget count and memory stay the same
+    whatever the size of the sheet. Clicking a college line opens or closes it, a college
+    that was never read opens once read_colleges has read its rows on a worker.
+    """
+
+    BUFFER = 20  # Lines above and below the view whose values are kept cached
+    HEADING_HEIGHT = 25
+
+    def __init__(self, parent, model, column_names, sort_keys, read_colleges):
+        self.model = model
+        self.sort_keys = sort_keys
+        self.read_colleges = read_colleges  # read_colleges(indices, on_read, on_failed), see ExcelViewerApp.read_colleges
+        self.sort_column = None  # Column the rows are sorted by, None for sheet order
+        self.sort_descending = False
+        self.opened = set()  # Indexes of the opened colleges
+        self.opening = set()  # Colleges being read on a worker, they open once their rows are in
+        self.college_ids = {}  # College index -> row IDs of its schedules, in sheet order
+        self.selected = set()  # Selected row IDs, including the ones scrolled out of view
+        self.filtered = None  # College index -> matching row IDs while the filter bar is used
+        self.filter_colleges = {}  # Matching row ID -> its college, to take it out of filtered again
+        self.filter_closed = set()  # Colleges closed while filtering
+        self.offset = 0  # First line in view
+        self.visible = 1  # Number of lines that fit in the view
+        self.slots = []  # Treeview items of the lines in view, top to bottom
+        self.slot_entries = []  # ("college", index) or ("row", row ID) shown by each slot
+        self.slot_contents = {}  # Item -> text, values and tags it currently shows
+        self.slot_count = 0
+        self.scroll_position = None
+        self.value_cache = {}
+        self.expected_selection = ()
+        self.extend_selection = False
+
+        self.scroll_y = tk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scroll_x = tk.Scrollbar(parent, orient=tk.HORIZONTAL)
+        self.scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree = ttk.Treeview(parent, show="tree headings", xscrollcommand=self.scroll_x.set)
+        self.scroll_x.config(command=self.tree.xview)
+        self.tree.pack(fill=tk.BOTH, expand=1)
+        self.tree.tag_configure("college", background="#e8e8e8")
+
+        self.column_names = None
+        self.set_columns(column_names)
+
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        self.row_height = int(row_height) if row_height else 20
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<ButtonPress-1>", self.on_click)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Up>", lambda event: self.on_arrow(-1))
+        self.tree.bind("<Down>", lambda event: self.on_arrow(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda event: self.scroll(self.visible))
+
+    def set_columns(self, column_names):
+        # Define columns based on row 4, the college goes in the tree column
+        if column_names == self.column_names:
+            return
+        self.column_names = column_names
+        columns = [str(col) for col in range(len(column_names))]
+        self.tree["columns"] = columns
+        self.tree.heading("#0", text="College")
+        self.tree.column("#0", width=150)
+        for col in columns:
+            self.tree.column(col, width=100)
+        self.update_headings()
+
+    def update_headings(self):
+        # Clicking a heading sorts by it, the arrow shows the current order
+        for col, column_name in enumerate(self.column_names):
+            if col == self.sort_column:
+                column_name = f"{column_name} {'▼' if self.sort_descending else '▲'}"
+            self.tree.heading(str(col), text=column_name, command=lambda col=col: self.sort_by(col))
+
+    def sort_by(self, col):
+        """
+        Cycles a column through ascending, descending and back to sheet order.
+
+        Rows stay under their college, only the order within each college changes.
+        """
+        if col != self.sort_column:
+            self.sort_column, self.sort_descending = col, False
+        elif not self.sort_descending:
+            self.sort_descending = True
+        else:
+            self.sort_column, self.sort_descending = None, False
+        self.update_headings()
+        self.sort_rows(self.college_ids)
+        if self.filtered is not None:
+            self.sort_rows(self.filtered)
+        self.refresh()
+
+    def ordered(self, row_ids):
+        """
+        The row IDs in the current sort order, ties (and unsorted tables) in sheet order.
+        """
+        if not row_ids:
+            return row_ids
+        positions = self.model.df.index.get_indexer(row_ids)
+        if self.sort_column is None:
+            return [row_ids[i] for i in positions.argsort(kind="stable")]
+        keys = self.sort_keys.column_keys(self.sort_column).reindex(row_ids)
+        order = pd.DataFrame({"key": keys.to_numpy(), "position": positions}).sort_values(
+            ["key", "position"], ascending=[not self.sort_descending, True], na_position="last").index
+        return [row_ids[i] for i in order]
+
+    def sort_rows(self, lists, colleges=None):
+        for i in list(lists) if colleges is None else colleges & set(lists):
+            lists[i] = self.ordered(lists[i])
+
+    def reset(self):
+        """
+        Starts over for a newly loaded file, the Treeview and its items are kept.
+        """
+        self.filtered = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.opened.clear()
+        self.opening.clear()
+        self.college_ids.clear()
+        self.selected.clear()
+        self.value_cache.clear()
+        self.offset = 0
+        self.set_columns(self.model.column_names())
+        self.update_headings()
+        self.refresh()
+
+    def college_lines(self):
+        """
+        The colleges shown, each with the row IDs listed under it (none when it is closed).
+        """
+        for i in range(len(self.model.colleges.sections)):
+            if self.filtered is None:
+                yield i, self.college_ids[i] if i in self.opened else ()
+            elif i in self.filtered:
+                yield i, () if i in self.filter_closed else self.filtered[i]
+
+    def is_expanded(self, i):
+        return i not in self.filter_closed if self.filtered is not None else i in self.opened
+
+    def line_count(self):
+        return sum(1 + len(rows) for _, rows in self.college_lines())
+
+    def college_line(self, i):
+        line = 0
+        for j, rows in self.college_lines():
+            if j == i:
+                break
+            line += 1 + len(rows)
+        return line
+
+    def entries(self, start, stop):
+        """
+        The entries on lines start to stop, walking the colleges instead of a list of every line.
+        """
+        result = []
+        line = 0
+        for i, rows in self.college_lines():
+            size = 1 + len(rows)
+            if line + size > start:
+                if line >= start:
+                    result.append(("college", i))
+                first = max(0, start - line - 1)
+                result.extend(("row", row_id) for row_id in rows[first:stop - line - 1])
+            line += size
+            if line >= stop:
+                break
+        return result
+
+    def row_values(self, row_ids):
+        """
+        Values of the rows in view, read from the DataFrame in one lookup for the uncached ones.
+        """
+        missing = [row_id for row_id in row_ids if row_id not in self.value_cache]
+        if missing:
+            self.value_cache.update(zip(missing, self.model.df.loc[missing].values.tolist()))
+        return [self.value_cache[row_id] for row_id in row_ids]
+
+    def refresh(self):
+        total = self.line_count()
+        self.offset = max(0, min(self.offset, total - self.visible))
+        entries = self.entries(self.offset, self.offset + self.visible)
+
+        # Cache the rows just outside the view too, so scrolling a little doesn't touch the DataFrame
+        buffered = self.entries(max(0, self.offset - self.BUFFER), self.offset + self.visible + self.BUFFER)
+        buffered_ids = [key for kind, key in buffered if kind == "row"]
+        self.value_cache = {row_id: self.value_cache[row_id] for row_id in buffered_ids if row_id in self.value_cache}
+        row_values = dict(zip(buffered_ids, self.row_values(buffered_ids)))
+
+        # Diff the new lines against the ones on screen, so only the items that changed get Tk calls
+        contents = [self.line_content(kind, key, row_values) for kind, key in entries]
+        matcher = difflib.SequenceMatcher(None, self.slot_entries, entries, autojunk=False)
+        slots = []
+        for tag, old_start, old_stop, new_start, new_stop in matcher.get_opcodes():
+            reused = self.slots[old_start:old_stop][:new_stop - new_start]
+            for slot in self.slots[old_start + len(reused):old_stop]:
+                self.tree.delete(slot)
+                del self.slot_contents[slot]
+            for position in range(new_start, new_stop):
+                if position - new_start < len(reused):
+                    slot = reused[position - new_start]
+                    if self.slot_contents[slot] == contents[position]:
+                        slots.append(slot)
+                        continue
+                    self.tree.item(slot, **contents[position])
+                else:
+                    self.slot_count += 1
+                    slot = self.tree.insert("", len(slots), iid=f"line-{self.slot_count}", **contents[position])
+                self.slot_contents[slot] = contents[position]
+                slots.append(slot)
+        self.slots = slots
+        self.slot_entries = entries
+
+        selection = tuple(slot for slot, (kind, key) in zip(self.slots, entries) if kind == "row" and key in self.selected)
+        if selection != self.tree.selection():
+            self.expected_selection = selection
+            self.tree.selection_set(selection)
+
+        scroll = (self.offset / total, (self.offset + len(entries)) / total) if total else (0, 1)
+        if scroll != self.scroll_position:
+            self.scroll_position = scroll
+            self.scroll_y.set(*scroll)
+
+    def line_content(self, kind, key, row_values):
+        if kind == "college":
+            name = self.model.colleges.sections[key].name or "(No College)"
+            arrow = "▾" if self.is_expanded(key) else "▸"
+            return {"text": f"{arrow} {name}", "values": [], "tags": ["college"]}
+        return {"text": "", "values": row_values[key], "tags": []}
+
+    def scroll(self, lines):
+        self.offset += lines
+        self.refresh()
+        return "break"
+
+    def on_scroll(self, *args):
+        total = self.line_count()
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.refresh()
+
+    def on_resize(self, event):
+        visible = max(1, (event.height - self.HEADING_HEIGHT) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def on_arrow(self, step):
+        # Moving past the first or last line in view scrolls by one line instead
+        focus = self.tree.focus()
+        if not focus or not self.slots:
+            return None
+        position = self.slots.index(focus)
+        if (step < 0 and position > 0) or (step > 0 and position < len(self.slots) - 1):
+            return None
+        self.offset += step
+        self.refresh()
+        kind, key = self.slot_entries[position]
+        if kind == "row":
+            self.selected = {key}
+            self.refresh()
+        return "break"
+
+    def on_click(self, event):
+        self.extend_selection = bool(event.state & 0x0005)  # Shift or Control held
+        slot = self.tree.identify_row(event.y)
+        if slot and slot in self.slots:
+            kind, key = self.slot_entries[self.slots.index(slot)]
+            if kind == "college":
+                self.toggle_college(key)
+                return "break"
+        return None
+
+    def on_select(self, event):
+        current = self.tree.selection()
+        if current == self.expected_selection:
+            return
+        chosen = set()
+        in_view = set()
+        for slot, (kind, key) in zip(self.slots, self.slot_entries):
+            if kind == "row":
+                in_view.add(key)
+                if slot in current:
+                    chosen.add(key)
+        self.selected = (self.selected - in_view) | chosen if self.extend_selection else chosen
+        self.expected_selection = current
+
+    def open_college(self, i):
+        if self.model.unloaded_colleges([i]):
+            # Never read, its rows are read on a worker so the window doesn't wait for the sheet
+            if i not in self.opening:
+                self.opening.add(i)
+                self.read_colleges([i], lambda: self.on_college_read(i), lambda: self.opening.discard(i))
+            return
+        # The row list of a college is kept up to date from the events once it has been built
+        if i not in self.college_ids:
+            self.college_ids[i] = self.ordered(self.model.college_rows(i).index.tolist())
+        self.opened.add(i)
+
+    def on_college_read(self, i):
+        if i in self.opening:  # Not closed again in the meantime
+            self.opening.discard(i)
+            self.open_college(i)
+            self.refresh()
+
+    def toggle_college(self, i):
+        if self.filtered is not None:
+            self.filter_closed ^= {i}
+        elif i in self.opened:
+            self.opened.discard(i)
+        elif i in self.opening:
+            self.opening.discard(i)  # Closed before its rows were read
+        else:
+            self.open_college(i)
+        self.refresh()
+
+    def show_college(self, i):
+        """
+        Opens a college and scrolls it to the top of the view.
+        """
+        if self.filtered is None:
+            self.open_college(i)
+        else:
+            self.filter_closed.discard(i)
+        self.offset = self.college_line(i)
+        self.refresh()
+
+    def set_filter(self, row_ids):
+        """
+        Shows only the given rows under their colleges, or everything again for None.
+        """
+        if row_ids is None:
+            self.filtered = None
+        else:
+            # Put the matches back in sheet order before grouping them by college
+            index = self.model.df.index
+            positions = index.get_indexer(list(row_ids))
+            positions = positions[positions >= 0]
+            positions.sort()
+            self.filtered = {}
+            self.filter_colleges = {}
+            for row_id in index[positions].tolist():
+                college = self.model.row_college.get(row_id)
+                if college is not None:
+                    self.filtered.setdefault(college, []).append(row_id)
+                    self.filter_colleges[row_id] = college
+            if self.sort_column is not None:
+                self.sort_rows(self.filtered)
+            self.selected &= set(row_ids)
+        self.filter_closed.clear()
+        self.refresh()
+
+    def update_filter(self, changed, matching):
+        """
+        Takes the changed rows out of the filtered ones and puts back those that still match
+        (matching), without going over the other rows.
+        """
+        touched = set()
+        for row_id in changed:
+            college = self.filter_colleges.pop(row_id, None)
+            if college is not None:
+                self.filtered[college].remove(row_id)
+                touched.add(college)
+        index = self.model.df.index
+        for row_id in matching:
+            college = self.model.row_college.get(row_id)
+            if college is None or row_id not in index:
+                continue
+            ids = self.filtered.setdefault(college, [])
+            if self.sort_column is None:
+                ids.insert(bisect_left(index.get_indexer(ids), index.get_loc(row_id)), row_id)
+            else:
+                ids.append(row_id)  # Sorted below
+            self.filter_colleges[row_id] = college
+            touched.add(college)
+        for college in touched:
+            if not self.filtered[college]:
+                del self.filtered[college]
+        if self.sort_column is not None:
+            self.sort_rows(self.filtered, touched)
+        self.selected -= set(changed) - set(matching)
+        self.refresh()
+
+    def selected_ids(self):
+        return sorted(self.selected, key=lambda row_id: self.model.df.index.get_loc(row_id))
+
+    def on_change(self, events):
+        """
+        Updates the row lists from the model's change events, then redraws the lines in view.
+
+        Only lines whose row changed, moved or was removed cost Tk calls, and the scroll
+        position and selection stay where they were.
+        """
+        if any(event.kind == RESET for event in events):
+            self.reset()
+            return
+        deleted = set()
+        for event in events:
+            self.value_cache.pop(event.row_id, None)
+            college = self.model.row_college.get(event.row_id)
+            if event.kind == DELETED:
+                deleted.add(event.row_id)
+            elif event.kind == INSERTED and college is not None:
+                # A row added here opens its college, one pulled from the shared store leaves it as it is
+                if college not in self.college_ids:
+                    if not event.remote:
+                        self.open_college(college)  # Its row list is built (once read) with the new row in it
+                    continue  # Otherwise the new row is read with the others once the college is opened
+                if not event.remote:
+                    self.opened.add(college)
+                ids = self.college_ids[college]
+                position = self.model.df.index.get_loc(event.row_id)
+                previous = self.model.df.index[position - 1] if position > 0 else None
+                ids.insert(ids.index(previous) + 1 if previous in ids else (0 if previous in self.model.college_header_ids() else len(ids)), event.row_id)
+
+        # Deleted rows are filtered out of each row list in one pass
+        if deleted:
+            self.selected -= deleted
+            for i, ids in self.college_ids.items():
+                self.college_ids[i] = [row_id for row_id in ids if row_id not in deleted]
+
+        # New and edited rows may belong somewhere else in a sorted college
+        if self.sort_column is not None:
+            changed = {self.model.row_college.get(event.row_id) for event in events if event.kind != DELETED}
+            self.sort_rows(self.college_ids, changed)
+        self.refresh()
+
+
+class VirtualList:
+    """
+    Treeview for a long flat list, only the lines in view are Treeview items.
+
+    The owner sets the keys of the lines with set_lines, content(key) gives the text,
+    values and tags of a line. Like the VirtualTable the items are reused while scrolling,
+    so the widget count stays the same however long the list is.
+    """
+
+    HEADING_HEIGHT = 25
+
+    def __init__(self, parent, columns, content, on_select=None, show="headings"):
+        self.content = content
+        self.on_select_line = on_select
+        self.lines = []  # Keys of every line, in order
+        self.offset = 0
+        self.visible = 1
+        self.slots = []  # Treeview items of the lines in view
+        self.slot_contents = {}
+        self.selected = None  # Key of the selected line
+        self.scroll_position = None
+
+        frame = tk.Frame(parent)
+        frame.pack(fill=tk.BOTH, expand=1)
+        self.scroll_y = tk.Scrollbar(frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(frame, columns=[str(col) for col in range(len(columns))], show=show, selectmode="browse")
+        self.tree.pack(fill=tk.BOTH, expand=1)
+        for col, name in enumerate(columns):
+            self.tree.heading(str(col), text=name)
+
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        self.row_height = int(row_height) if row_height else 20
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Up>", lambda event: self.on_arrow(-1))
+        self.tree.bind("<Down>", lambda event: self.on_arrow(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda event: self.scroll(self.visible))
+
+    def set_lines(self, lines):
+        self.lines = lines
+        self.refresh()
+
+    def refresh(self):
+        total = len(self.lines)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        keys = self.lines[self.offset:self.offset + self.visible]
+
+        # Add or remove items at the bottom, then update the ones showing a different line
+        while len(self.slots) > len(keys):
+            slot = self.slots.pop()
+            self.tree.delete(slot)
+            del self.slot_contents[slot]
+        while len(self.slots) < len(keys):
+            self.slots.append(self.tree.insert("", "end"))
+            self.slot_contents[self.slots[-1]] = None
+        for slot, key in zip(self.slots, keys):
+            content = self.content(key)
+            if self.slot_contents[slot] != content:
+                self.tree.item(slot, **content)
+                self.slot_contents[slot] = content
+
+        selection = tuple(slot for slot, key in zip(self.slots, keys) if key == self.selected)
+        if selection != self.tree.selection():
+            self.tree.selection_set(selection)
+
+        scroll = (self.offset / total, (self.offset + len(keys)) / total) if total else (0, 1)
+        if scroll != self.scroll_position:
+            self.scroll_position = scroll
+            self.scroll_y.set(*scroll)
+
+    def scroll(self, lines):
+        self.offset += lines
+        self.refresh()
+        return "break"
+
+    def on_scroll(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.lines))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.refresh()
+
+    def on_resize(self, event):
+        visible = max(1, (event.height - self.HEADING_HEIGHT) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def on_arrow(self, step):
+        # Moving past the first or last line in view scrolls and selects the next line
+        if self.selected not in self.lines:
+            return None
+        position = self.lines.index(self.selected) + step
+        if not 0 <= position < len(self.lines):
+            return "break"
+        if not self.offset <= position < self.offset + self.visible:
+            self.offset += step
+        self.select(self.lines[position])
+        return "break"
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self.slots:
+            key = self.lines[self.offset + self.slots.index(selection[0])]
+            if key != self.selected:
+                self.select(key)
+
+    def key_at(self, y):
+        """
+        The key of the line at height y, None below the last line.
+        """
+        slot = self.tree.identify_row(y)
+        return self.lines[self.offset + self.slots.index(slot)] if slot in self.slots else None
+
+    def select(self, key):
+        self.selected = key
+        self.refresh()
+        if self.on_select_line is not None:
+            self.on_select_line(key)
+
+
+class ScheduleForm:
+    """
+    The add/edit form, built once per set of columns and hidden instead of destroyed.
+
+    Every field autocompletes from the values already in its column (see ValueIndex),
+    the suggestions show in one list under the field being typed in.
+    """
+
+    def __init__(self, root, column_names, value_index):
+        self.value_index = value_index
+        self.column_names = column_names
+        self.on_submit = None
+
+        self.window = tk.Toplevel(root)
+        self.window.withdraw()
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+        self.labels = []
+        self.entries = []
+        for col, column_name in enumerate(column_names):
+            label = tk.Label(self.window, text=f"{column_name}:")
+            label.grid(row=col, column=0, padx=10, pady=5, sticky='e')
+            entry = tk.Entry(self.window, width=40)
+            entry.grid(row=col, column=1, padx=10, pady=5, sticky='w')
+            entry.bind("<KeyRelease>", lambda event, col=col: self.on_key(event, col))
+            entry.bind("<Down>", lambda event: self.focus_suggestions())
+            entry.bind("<Escape>", lambda event: self.hide_suggestions())
+            entry.bind("<FocusOut>", lambda event: self.window.after(100, self.check_focus))
+            self.labels.append(label)
+            self.entries.append(entry)
+
+        button_frame = tk.Frame(self.window)
+        button_frame.grid(row=len(column_names), columnspan=2, pady=10)
+        tk.Button(button_frame, text="Submit", command=self.submit).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=self.hide).pack(side=tk.LEFT, padx=5)
+
+        # One suggestion list for the whole form, placed under the field in use
+        self.suggestions = tk.Listbox(self.window, height=6)
+        self.suggestions.bind("<Return>", lambda event: self.pick())
+        self.suggestions.bind("<ButtonRelease-1>", lambda event: self.pick())
+        self.suggestions.bind("<Escape>", lambda event: self.hide_suggestions())
+        self.suggest_col = None
+
+    def open(self, title, label_prefix, values, on_submit):
+        """
+        Shows the form filled with values, on_submit(values) returns True when the form can close.
+        """
+        self.window.title(title)
+        self.on_submit = on_submit
+        for label, entry, column_name, value in zip(self.labels, self.entries, self.column_names, values):
+            label.config(text=f"{label_prefix} {column_name}:")
+            entry.delete(0, tk.END)
+            entry.insert(0, value)
+        self.hide_suggestions()
+        self.window.deiconify()
+        self.window.lift()
+        self.entries[0].focus_set()
+
+    def hide(self):
+        self.hide_suggestions()
+        self.window.withdraw()
+
+    def submit(self):
+        if self.on_submit([entry.get() for entry in self.entries]):
+            self.hide()
+
+    def on_key(self, event, col):
+        if event.keysym in ("Down", "Escape", "Return", "Tab"):
+            return
+        entry = self.entries[col]
+        text = entry.get()
+        matches = self.value_index.complete(col, text) if text.strip() else []
+        if not matches or matches == [text]:
+            self.hide_suggestions()
+            return
+        self.suggest_col = col
+        self.suggestions.delete(0, tk.END)
+        self.suggestions.insert(tk.END, *matches)
+        self.suggestions.config(height=min(6, len(matches)))
+        self.suggestions.place(in_=entry, x=0, rely=1.0, relwidth=1.0)
+        self.suggestions.lift()
+
+    def focus_suggestions(self):
+        if self.suggest_col is not None:
+            self.suggestions.focus_set()
+            self.suggestions.selection_clear(0, tk.END)
+            self.suggestions.selection_set(0)
+            self.suggestions.activate(0)
+        return "break"
+
+    def pick(self):
+        selection = self.suggestions.curselection()
+        if selection and self.suggest_col is not None:
+            entry = self.entries[self.suggest_col]
+            entry.delete(0, tk.END)
+            entry.insert(0, self.suggestions.get(selection[0]))
+            entry.focus_set()
+        self.hide_suggestions()
+
+    def hide_suggestions(self):
+        self.suggest_col = None
+        self.suggestions.place_forget()
+
+    def check_focus(self):
+        # Leaving a field for anything but its suggestions closes them
+        if self.window.focus_get() is not self.suggestions:
+            self.hide_suggestions()
+
+
+class ConflictViewer:
+    """
+    One window listing every conflict, with the two schedules of the selected one below it.
+
+    The list is a VirtualList over the conflict result set and the detail pane is shared,
+    so the window has the same few widgets for ten conflicts or ten thousand. Clicking a
+    heading sorts by that column.
+    """
+
+    COLUMNS = ("Kind", "Room / Faculty", "Day", "Time", "Schedule A", "Schedule B")
+
+    def __init__(self, root, model, conflicts):
+        self.model = model
+        self.window = tk.Toplevel(root)
+        self.window.title(f"Conflicts ({len(conflicts)})")
+        self.window.geometry("900x600")
+
+        self.set_conflicts(conflicts)
+        self.sort_column = None
+        self.sort_descending = False
+
+        panes = ttk.PanedWindow(self.window, orient=tk.VERTICAL)
+        panes.pack(fill=tk.BOTH, expand=1)
+        top = tk.Frame(panes)
+        bottom = tk.Frame(panes)
+        panes.add(top, weight=3)
+        panes.add(bottom, weight=1)
+
+        self.list = VirtualList(top, self.COLUMNS, self.line_content, on_select=self.show_detail)
+        for col in range(len(self.COLUMNS)):
+            self.list.tree.heading(str(col), command=lambda col=col: self.sort_by(col))
+            self.list.tree.column(str(col), width=120)
+
+        # Detail pane: the two schedules of the selected conflict, the items are reused
+        self.detail_label = tk.Label(bottom, text="Select a conflict to see its schedules.", anchor="w")
+        self.detail_label.pack(fill=tk.X, padx=5)
+        column_names = model.column_names()
+        self.detail = ttk.Treeview(bottom, columns=[str(col) for col in range(len(column_names))], show="headings", height=2)
+        for col, name in enumerate(column_names):
+            self.detail.heading(str(col), text=name)
+            self.detail.column(str(col), width=100)
+        detail_scroll = tk.Scrollbar(bottom, orient=tk.HORIZONTAL, command=self.detail.xview)
+        self.detail.config(xscrollcommand=detail_scroll.set)
+        self.detail.pack(fill=tk.BOTH, expand=1)
+        detail_scroll.pack(fill=tk.X)
+        self.detail_items = [self.detail.insert("", "end"), self.detail.insert("", "end")]
+
+        self.list.set_lines(list(range(len(self.conflicts))))
+
+    def set_conflicts(self, conflicts):
+        """
+        Builds the text of every line once, in columns, so showing a line is just a lookup.
+        """
+        df = self.model.df
+        labels = (df[COURSE_CODE].astype(str) + " " + df[SECT].astype(str)).str.strip()
+        begin = conflicts[["begin_a", "begin_b"]].max(axis=1)
+        end = conflicts[["end_a", "end_b"]].min(axis=1)
+        self.conflicts = conflicts
+        self.lines = pd.DataFrame({
+            "kind": conflicts["kind"],
+            "value": conflicts["value"],
+            "day": conflicts["day"],
+            "time": minutes_to_times(begin) + "-" + minutes_to_times(end),
+            "a": conflicts["row_id_a"].map(labels).fillna("(deleted)"),
+            "b": conflicts["row_id_b"].map(labels).fillna("(deleted)"),
+        })
+        # What each column sorts by, days go in week order and times by when they start
+        self.sort_keys = [
+            conflicts["kind"], conflicts["value"], conflicts["day"].map(DAY_LETTERS.index),
+            begin, self.lines["a"], self.lines["b"],
+        ]
+        self.values = self.lines.values.tolist()
+
+    def line_content(self, position):
+        return {"values": self.values[position]}
+
+    def sort_by(self, col):
+        if col == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = col, False
+        for i, name in enumerate(self.COLUMNS):
+            arrow = (" ▼" if self.sort_descending else " ▲") if i == self.sort_column else ""
+            self.list.tree.heading(str(i), text=name + arrow)
+
+        # Ties are broken by day and time, so a room's conflicts read in order
+        keys = pd.DataFrame({"key": self.sort_keys[col], "day": self.sort_keys[2], "time": self.sort_keys[3]})
+        order = keys.sort_values(["key", "day", "time"], ascending=[not self.sort_descending, True, True], kind="stable").index
+        self.list.set_lines(order.tolist())
+
+    def show_detail(self, position):
+        conflict = self.conflicts.iloc[position]
+        line = self.values[position]
+        self.detail_label.config(text=f"{conflict['kind']} conflict on {conflict['value']}, {line[2]} {line[3]}")
+        for item, row_id in zip(self.detail_items, (conflict["row_id_a"], conflict["row_id_b"])):
+            values = self.model.df.loc[row_id].tolist() if row_id in self.model.df.index else ["(deleted)"]
+            self.detail.item(item, values=values)
+
+
+class MergeSuggestionViewer:
+    """
+    Groups of schedules, like the ones below the enrollment threshold by course code or
+    the merges of a merge plan.
+
+    Groups start closed and the lines of a group's sections are only made when it is
+    opened, so the window opens in the same time however many sections are listed.
+    The lines are cached per row and dropped again when the row is edited, merged or deleted.
+    """
+
+    def __init__(self, root, model, groups, title, notes=None, actions=()):
+        self.model = model
+        self.groups = groups  # Group name -> (row IDs, total enrollment cap), in the order shown
+        self.notes = notes or {}  # Group name -> text shown next to it, like the problems of a merge
+        self.codes = list(groups)
+        self.opened = set()
+        self.row_cache = {}
+
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.geometry("900x500")
+
+        self.list = VirtualList(self.window, model.column_names(), self.line_content, show="tree headings")
+        self.list.tree.heading("#0", text="Course Code")
+        self.list.tree.column("#0", width=220)
+        for col in range(len(model.column_names())):
+            self.list.tree.column(str(col), width=100)
+        self.list.tree.tag_configure("group", background="#e8e8e8")
+        self.list.tree.bind("<ButtonPress-1>", self.on_click)
+        self.list.set_lines(self.group_lines())
+
+        # Buttons like Apply Merges, each is called with the viewer
+        if actions:
+            buttons = tk.Frame(self.window)
+            buttons.pack(side=tk.BOTTOM, fill=tk.X, before=self.list.tree.master)
+            for text, command in actions:
+                tk.Button(buttons, text=text, command=lambda command=command: command(self)).pack(side=tk.RIGHT, padx=5, pady=5)
+
+        model.subscribe(self.on_change)
+        self.window.bind("<Destroy>", lambda event: model.unsubscribe(self.on_change) if event.widget is self.window else None)
+
+    def on_change(self, events):
+        # Forget the lines of the rows that changed, after a reset every row could be different
+        for event in events:
+            if event.kind == RESET:
+                self.row_cache.clear()
+            else:
+                self.row_cache.pop(event.row_id, None)
+        if self.window.winfo_exists():
+            self.list.refresh()
+
+    def group_lines(self):
+        lines = []
+        for code in self.codes:
+            lines.append(("group", code))
+            if code in self.opened:
+                lines.extend(("row", row_id) for row_id in self.groups[code][0])
+        return lines
+
+    def line_content(self, key):
+        kind, value = key
+        if kind == "group":
+            row_ids, total_cap = self.groups[value]
+            arrow = "▾" if value in self.opened else "▸"
+            return {"text": f"{arrow} {value} ({len(row_ids)} sections, {total_cap} cap)", "values": [self.notes.get(value, '')], "tags": ["group"]}
+        if value not in self.row_cache:
+            df = self.model.df
+            self.row_cache[value] = df.loc[value].tolist() if value in df.index else ["(deleted)"]
+        return {"text": "", "values": self.row_cache[value], "tags": []}
+
+    def on_click(self, event):
+        key = self.list.key_at(event.y)
+        if key is not None and key[0] == "group":
+            self.opened ^= {key[1]}
+            self.list.set_lines(self.group_lines())
+            return "break"
+        return None
+
+
+class TimetableViewer:
+    """
+    Week grid (days across, time down) of the meetings of one room, faculty member or takers block.
+
+    Everything is drawn on one Canvas. The grid is only drawn again when the window is
+    resized, and the meeting blocks reuse a pool of canvas items: switching to another
+    room or editing a row only moves or recolors the blocks that changed.
+    """
+
+    KINDS = {"Room": "room", "Faculty": "faculty", "Block": "takers"}
+    LEFT, TOP = 50, 25  # Room for the times and the day names
+    FIRST_HOUR, LAST_HOUR = 7, 21
+
+    def __init__(self, root, model, conflict_index, search_index, takers_index):
+        self.model = model
+        self.conflict_index = conflict_index
+        self.search_index = search_index
+        self.takers_index = takers_index
+        self.slots = find_meeting_slots(model.column_names())
+        self.blocks = []  # Pool of (rectangle, text) canvas items
+        self.block_contents = []  # What each pooled block shows now
+        self.grid_items = []
+        self.layout = None
+        self.values = []
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Timetable")
+        self.window.geometry("900x650")
+
+        bar = tk.Frame(self.window)
+        bar.pack(fill=tk.X)
+        self.kind = ttk.Combobox(bar, state="readonly", values=list(self.KINDS), width=10)
+        self.kind.set("Room")
+        self.kind.pack(side=tk.LEFT, padx=5, pady=2)
+        self.kind.bind("<<ComboboxSelected>>", lambda event: self.set_kind())
+        tk.Button(bar, text="◀", command=lambda: self.step(-1)).pack(side=tk.LEFT)
+        self.value = ttk.Combobox(bar, width=40)
+        self.value.pack(side=tk.LEFT, padx=2)
+        self.value.bind("<<ComboboxSelected>>", lambda event: self.redraw())
+        self.value.bind("<Return>", lambda event: self.redraw())
+        tk.Button(bar, text="▶", command=lambda: self.step(1)).pack(side=tk.LEFT)
+        self.status = tk.Label(bar, text="")
+        self.status.pack(side=tk.LEFT, padx=5)
+
+        self.canvas = tk.Canvas(self.window, background="white")
+        self.canvas.pack(fill=tk.BOTH, expand=1)
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<MouseWheel>", lambda event: self.step(-1 if event.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda event: self.step(-1))
+        self.canvas.bind("<Button-5>", lambda event: self.step(1))
+
+        # Edits show up in the open timetable, until the window is closed
+        model.subscribe(self.on_change)
+        self.window.bind("<Destroy>", lambda event: model.unsubscribe(self.on_change) if event.widget is self.window else None)
+        self.set_kind()
+
+    def set_kind(self):
+        # Whole names only, the search index also holds the single words of the faculty names
+        kind = self.kind.get()
+        self.values = self.takers_index.blocks() if kind == "Block" else self.conflict_index.values(kind)
+        self.value["values"] = self.values
+        self.value.set(self.values[0] if self.values else '')
+        self.redraw()
+
+    def step(self, direction):
+        # Scrolling goes through the rooms (or faculty, or blocks) one by one
+        if not self.values:
+            return "break"
+        current = self.value.get().strip().upper()
+        position = bisect_left(self.values, current) + (direction if current in self.values else min(direction, 0))
+        self.value.set(self.values[position % len(self.values)])
+        self.redraw()
+        return "break"
+
+    def on_change(self, events):
+        if self.window.winfo_exists():
+            self.redraw()
+
+    def meetings(self, value):
+        """
+        The meetings of the chosen room, faculty or block, one per (row, meeting, day).
+        """
+        field = self.KINDS[self.kind.get()]
+        if field == "takers":
+            row_ids = sorted(self.takers_index.sections.get(value, ()))
+        else:
+            row_ids = sorted(self.search_index.tokens[field].get(value, ()))
+        meetings = meetings_table(self.model.df.loc[row_ids], self.slots)
+        if field == "room":
+            meetings = meetings[meetings["room"] == value]  # The row may use another room for its other meetings
+        return meetings.reset_index(drop=True)
+
+    def conflicting(self, meetings, value):
+        """
+        Positions of the meetings that clash with another one in view.
+
+        Rooms and faculty go by the conflict index, blocks by the meetings overlapping here.
+        """
+        kind = self.kind.get()
+        if kind in ("Room", "Faculty"):
+            partners = {}
+            for row_id in set(meetings["row_id"]):
+                for pair in self.conflict_index.row_conflicts(row_id):
+                    if pair["kind"] == kind and pair["value"] == value:
+                        partners.setdefault(row_id, set()).update((pair["row_id_a"], pair["row_id_b"]))
+        else:
+            partners = None
+        clashing = set()
+        for _, day_meetings in meetings.groupby("day"):
+            for a in day_meetings.itertuples():
+                for b in day_meetings.itertuples():
+                    if a.row_id != b.row_id and a.begin < b.end and b.begin < a.end:
+                        if partners is None or b.row_id in partners.get(a.row_id, ()):
+                            clashing.add(a.Index)
+        return clashing
+
+    def redraw(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width < 100 or height < 100:
+            return
+        value = self.value.get().strip().upper()
+        meetings = self.meetings(value) if value else meetings_table(self.model.df.iloc[:0], self.slots)
+
+        first = min([self.FIRST_HOUR * 60] + meetings["begin"].tolist()) // 60
+        last = -(-max([self.LAST_HOUR * 60] + meetings["end"].tolist()) // 60)
+        if self.layout != (width, height, first, last):
+            self.layout = (width, height, first, last)
+            self.draw_grid()
+        self.draw_blocks(meetings, self.conflicting(meetings, value))
+        self.status.config(text=f"{meetings['row_id'].nunique()} schedules")
+
+    def position(self, day, minutes):
+        width, height, first, last = self.layout
+        column = (width - self.LEFT) / len(DAY_LETTERS)
+        x = self.LEFT + DAY_LETTERS.index(day) * column
+        y = self.TOP + (minutes - first * 60) * (height - self.TOP) / ((last - first) * 60)
+        return x, y, column
+
+    def draw_grid(self):
+        for item in self.grid_items:
+            self.canvas.delete(item)
+        width, height, first, last = self.layout
+        items = []
+        for hour in range(first, last + 1):
+            _, y, _ = self.position("M", hour * 60)
+            items.append(self.canvas.create_line(self.LEFT, y, width, y, fill="#dddddd"))
+            items.append(self.canvas.create_text(self.LEFT - 5, y, text=f"{hour:02d}00", anchor="e"))
+        for day in DAY_LETTERS:
+            x, _, column = self.position(day, first * 60)
+            items.append(self.canvas.create_line(x, self.TOP, x, height, fill="#dddddd"))
+            name = next(name for name, letter in DAY_NAMES.items() if letter == day)
+            items.append(self.canvas.create_text(x + column / 2, self.TOP / 2, text=name.title()))
+        self.grid_items = items
+        for rectangle, text in self.blocks:
+            self.canvas.tag_raise(rectangle)
+            self.canvas.tag_raise(text)
+
+    def draw_blocks(self, meetings, clashing):
+        # Meetings of a day that overlap go side by side
+        df = self.model.df
+        contents = []
+        for day, day_meetings in meetings.sort_values(["begin", "end"]).groupby("day"):
+            lane_ends = []
+            lanes = []
+            for meeting in day_meetings.itertuples():
+                lane = next((i for i, end in enumerate(lane_ends) if end <= meeting.begin), len(lane_ends))
+                if lane == len(lane_ends):
+                    lane_ends.append(meeting.end)
+                lane_ends[lane] = meeting.end
+                lanes.append((meeting, lane))
+            for meeting, lane in lanes:
+                x, top, column = self.position(day, meeting.begin)
+                _, bottom, _ = self.position(day, meeting.end)
+                lane_width = column / len(lane_ends)
+                row = df.loc[meeting.row_id]
+                other = meeting.faculty if self.kind.get() == "Room" else meeting.room
+                text = f"{row[COURSE_CODE]} {row[SECT]}\n{to_time(meeting.begin)}-{to_time(meeting.end)}\n{other}"
+                fill = "#f4a6a6" if meeting.Index in clashing else "#a6c8f4"
+                coords = (x + lane * lane_width + 1, top + 1, x + (lane + 1) * lane_width - 1, bottom - 1)
+                contents.append((coords, text, fill, lane_width))
+
+        # Reuse the pooled items, only blocks that look different get canvas calls
+        while len(self.blocks) < len(contents):
+            self.blocks.append((self.canvas.create_rectangle(0, 0, 0, 0), self.canvas.create_text(0, 0, anchor="nw")))
+            self.block_contents.append(None)
+        for i, (rectangle, text_item) in enumerate(self.blocks):
+            content = contents[i] if i < len(contents) else None
+            if content == self.block_contents[i]:
+                continue
+            if content is None:
+                self.canvas.itemconfig(rectangle, state="hidden")
+                self.canvas.itemconfig(text_item, state="hidden")
+            else:
+                coords, text, fill, lane_width = content
+                self.canvas.coords(rectangle, *coords)
+                self.canvas.itemconfig(rectangle, fill=fill, outline="#555555", state="normal")
+                self.canvas.coords(text_item, coords[0] + 2, coords[1] + 2)
+                self.canvas.itemconfig(text_item, text=text, width=max(1, lane_width - 4), state="normal")
+            self.block_contents[i] = content
+
+
+class StatsViewer:
+    """
+    The ScheduleStats tables, one at a time: seats per course, college or Offered To,
+    faculty contact hours and room use.
+
+    The tables come from the running totals, so the window follows edits while it is open
+    without going over the sheet again. Clicking a heading sorts by that column.
+    """
+
+    VIEWS = {
+        "Seats per Course": ("Course", "Sections", "Seats"),
+        "Seats per College": ("College", "Sections", "Seats"),
+        "Seats per Offered To": ("Offered To", "Sections", "Seats"),
+        "Faculty Contact Hours": ("Faculty", "Meetings / Week", "Hours / Week"),
+        "Room Utilization": ("Room", "Hours / Week", "Utilization %"),
+    }
+
+    def __init__(self, root, model, stats):
+        self.stats = stats
+        self.lines = []
+        self.sort_column = None
+        self.sort_descending = False
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Statistics")
+        self.window.geometry("600x500")
+
+        bar = tk.Frame(self.window)
+        bar.pack(fill=tk.X)
+        self.view = ttk.Combobox(bar, state="readonly", values=list(self.VIEWS), width=25)
+        self.view.set("Seats per Course")
+        self.view.pack(side=tk.LEFT, padx=5, pady=2)
+        self.view.bind("<<ComboboxSelected>>", lambda event: self.set_view())
+        self.status = tk.Label(bar, text="")
+        self.status.pack(side=tk.LEFT, padx=5)
+
+        self.list = VirtualList(self.window, ("", "", ""), lambda position: {"values": self.lines[position]})
+        for col in range(3):
+            self.list.tree.heading(str(col), command=lambda col=col: self.sort_by(col))
+
+        model.subscribe(self.on_change)
+        self.window.bind("<Destroy>", lambda event: model.unsubscribe(self.on_change) if event.widget is self.window else None)
+        self.set_view()
+
+    def set_view(self):
+        self.sort_column, self.sort_descending = None, False
+        self.refresh()
+
+    def table(self):
+        view = self.view.get()
+        if view == "Faculty Contact Hours":
+            return self.stats.faculty_hours()
+        if view == "Room Utilization":
+            return self.stats.room_use()
+        return self.stats.seats({"Seats per Course": "course", "Seats per College": "college"}.get(view, "offered"))
+
+    def refresh(self):
+        self.lines = self.table()
+        if self.sort_column is not None:
+            self.lines.sort(key=lambda line: line[self.sort_column], reverse=self.sort_descending)
+        for col, name in enumerate(self.VIEWS[self.view.get()]):
+            arrow = (" ▼" if self.sort_descending else " ▲") if col == self.sort_column else ""
+            self.list.tree.heading(str(col), text=name + arrow)
+        self.list.set_lines(list(range(len(self.lines))))
+        self.status.config(text=f"{len(self.lines)} lines")
+
+    def sort_by(self, col):
+        if col == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = col, col > 0  # Numbers read biggest first
+        self.refresh()
+
+    def on_change(self, events):
+        if self.window.winfo_exists():
+            self.refresh()
+
+
+class TaskRunner:
+    """
+    Runs long operations on a worker thread, one at a time, with a progress bar and Cancel button.
+
+    work(task) runs on the worker, on_done(result) runs on the Tk thread once it is finished
+    (and wasn't cancelled) and is the only place that may change the model. The Tk thread polls the running task
+    with root.after, so the window keeps responding in the meantime.
+    """
+
+    def __init__(self, root, before):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.tasks = []  # (task, on_done, on_error), the first one is running
+
+        self.bar = tk.Frame(root)
+        self.before = before
+        self.label = tk.Label(self.bar, text="")
+        self.label.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(self.bar, length=200)
+        self.progress.pack(side=tk.LEFT, padx=5, pady=2)
+        tk.Button(self.bar, text="Cancel", command=self.cancel).pack(side=tk.LEFT, padx=5)
+
+    def run(self, label, work, on_done, on_error=None):
+        task = Task(label)
+        task.future = self.executor.submit(work, task)
+        self.tasks.append((task, on_done, on_error))
+        if len(self.tasks) == 1:
+            self.start()
+        return task
+
+    def start(self):
+        task = self.tasks[0][0]
+        self.label.config(text=task.label)
+        self.progress.config(mode="indeterminate", value=0)
+        self.progress.start()
+        self.bar.pack(side=tk.BOTTOM, fill=tk.X, before=self.before)
+        self.root.after(TASK_POLL_MS, self.poll)
+
+    def poll(self):
+        task, on_done, on_error = self.tasks[0]
+
+        # Only the latest progress update matters
+        update = None
+        while not task.updates.empty():
+            update = task.updates.get_nowait()
+        if update is not None:
+            done, total = update
+            if total:
+                self.progress.stop()
+                self.progress.config(mode="determinate", maximum=total, value=done)
+
+        if not task.future.done():
+            self.root.after(TASK_POLL_MS, self.poll)
+            return
+
+        self.tasks.pop(0)
+        try:
+            result = task.future.result()
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            else:
+                messagebox.showerror("Error", f"{task.label} failed: {e}")
+        else:
+            # Work that never reports progress doesn't notice Cancel, its result is dropped here
+            if not task.cancel_event.is_set():
+                on_done(result)
+        finally:
+            self.progress.stop()
+            if self.tasks:
+                self.start()
+            else:
+                self.bar.pack_forget()
+
+    def cancel(self):
+        if self.tasks:
+            self.tasks[0][0].cancel()
+
+    def cancel_all(self):
+        for task, _, _ in self.tasks:
+            task.cancel()
+
 
 class ExcelViewerApp:
     def __init__(self, root, file_name="TestFile.xlsx"):
@@ -17,228 +1254,454 @@ class ExcelViewerApp:
         self.menu.add_cascade(label="File", menu=self.file_menu)
         self.file_menu.add_command(label="Open", command=self.load_file)
         self.file_menu.add_command(label="Save", command=self.save_file)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Share...", command=self.share_file)
+        self.file_menu.add_command(label="Open Shared...", command=self.open_shared)
+        self.file_menu.add_separator()
+        self.export_menu = Menu(self.file_menu, tearoff=0)
+        self.file_menu.add_cascade(label="Export", menu=self.export_menu)
+        self.export_menu.add_command(label="Conflicts...", command=lambda: self.export("Conflicts", self.core.conflict_report))
+        for kind, label in (("Room", "Room"), ("Faculty", "Faculty"), ("Block", "Block")):
+            self.export_menu.add_command(label=f"{label} Timetables...",
+                                         command=lambda kind=kind: self.export(f"{kind} Timetables", lambda: self.core.timetable_report(kind)))
 
         # Schedule menu
         self.schedule_menu = Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="Schedule", menu=self.schedule_menu)
         self.schedule_menu.add_command(label="Add Schedule", command=self.add_schedule)
         self.schedule_menu.add_command(label="Edit Schedule", command=self.edit_schedule)
+        self.schedule_menu.add_command(label="Bulk Edit", command=self.bulk_edit)
         self.schedule_menu.add_command(label="Suggest Merge", command=self.suggest_merge)
+        self.schedule_menu.add_command(label="Plan Merges", command=self.merge_plan)
         self.schedule_menu.add_command(label="Merge Schedule", command=self.merge_schedules)
         self.schedule_menu.add_command(label="Find Conflict", command=self.find_conflict)
+        self.schedule_menu.add_command(label="Timetable", command=self.show_timetable)
+        self.schedule_menu.add_command(label="Statistics", command=self.show_stats)
         self.schedule_menu.add_command(label="Delete Schedule", command=self.delete_schedule)
 
+        # College picker, only the opened colleges are read from the workbook
+        self.toolbar = tk.Frame(self.root)
+        self.toolbar.pack(fill=tk.X)
+        tk.Label(self.toolbar, text="College:").pack(side=tk.LEFT, padx=5)
+        self.college_picker = ttk.Combobox(self.toolbar, state="readonly", width=40)
+        self.college_picker.pack(side=tk.LEFT, pady=2)
+        self.college_picker.bind("<<ComboboxSelected>>", self.on_college_picked)
+
+        # Filter bar, e.g. "room:LAG-COVCA day:T faculty:tumale"
+        tk.Label(self.toolbar, text="Filter:").pack(side=tk.LEFT, padx=5)
+        self.filter_text = tk.StringVar()
+        self.filter_entry = tk.Entry(self.toolbar, textvariable=self.filter_text, width=50)
+        self.filter_entry.pack(side=tk.LEFT, pady=2)
+        self.filter_status = tk.Label(self.toolbar, text="")
+        self.filter_status.pack(side=tk.LEFT, padx=5)
+        self.filter_job = None
+        self.filter_text.trace_add("write", self.on_filter_typed)
+
         # Frame for displaying the table
         self.frame = tk.Frame(self.root)
         self.frame.pack(fill=tk.BOTH, expand=1)
 
-        self.tree = None
-
-        # Scrollbars
-        self.tree_scroll_y = tk.Scrollbar(self.frame, orient=tk.VERTICAL)
-        self.tree_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree_scroll_x = tk.Scrollbar(self.frame, orient=tk.HORIZONTAL)
-        self.tree_scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
-
-        # Load the file automatically on start
+        self.table = None
+
+        # Long operations run on a worker, with a progress bar above the table while they do
+        self.tasks = TaskRunner(self.root, before=self.frame)
+        self.college_waiters = []  # Called once the colleges being read in the background are in
+
+        # The schedule data and its indexes (see scheduling_core), they subscribe before the table so they are current when it refreshes
+        self.core = ScheduleCore()
+        self.model = self.core.model
+        self.conflict_index = self.core.conflict_index
+        self.search_index = self.core.search_index
+        self.sort_keys = self.core.sort_keys
+        self.value_index = self.core.value_index
+        self.takers_index = self.core.takers_index
+        self.stats = self.core.stats
+        self.merge_checker = self.core.merge_checker
+        self.forms = {}  # Column names -> ScheduleForm
+        self.store_job = None  # Pending poll_store while a shared store is open
+        self.store_failures = 0  # Pulls that failed in a row
+        self.model.subscribe(self.on_model_changed)
+
+        # Load the file automatically on start, once the window is on screen
         self.file_path = os.path.join(os.path.dirname(__file__), file_name)
+        self.first_paint_ms = None
+        self.root.bind("<Map>", self.on_first_map, add="+")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        # The shared store is only closed with the window, saving keeps it open
+        if self.store_job is not None:
+            self.root.after_cancel(self.store_job)
+            self.store_job = None
+        self.core.close()
+        self.root.destroy()
+
+    def on_first_map(self, event):
+        if self.first_paint_ms is None and event.widget is self.root:
+            self.first_paint_ms = 0
+            self.root.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        self.first_paint_ms = (time.perf_counter() - START_TIME) * 1000
+        if self.first_paint_ms > FIRST_PAINT_BUDGET_MS:
+            self.filter_status.config(text=f"Slow start: {self.first_paint_ms:.0f} ms to show (budget {FIRST_PAINT_BUDGET_MS} ms)")
         self.load_file()
 
+    @property
+    def df(self):
+        return self.model.df
 
     def load_file(self):
-        try:
-            self.df = pd.read_excel(self.file_path, header=None)
-            self.df.fillna('', inplace=True)  # Replace NaN with empty string
-            self.show_table(self.df)
-        except Exception as e:
-            print(f"Error loading file: {e}")
-
-    def save_file(self):
-        try:
-            self.df.to_excel(self.file_path, index=False, header=False)
-            messagebox.showinfo("Save", "File saved successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving file: {e}")
+        # The sheet is scanned on a worker, the model only switches over once the scan is done
+        self.tasks.cancel_all()
+        self.college_waiters = []
+        file_path = self.file_path
+        self.tasks.run(f"Opening {os.path.basename(file_path)}", lambda task: ScheduleCore.read_workbook(file_path, task),
+                       self.on_file_loaded, on_error=lambda e: print(f"Error loading file: {e}"))
+
+    def on_file_loaded(self, colleges):
+        self.core.use_workbook(colleges)
+        self.show_colleges()
+
+    def show_colleges(self):
+        self.college_picker["values"] = [section.name or "(No College)" for section in self.model.colleges.sections]
+        self.college_picker.set('')
+        self.show_table(self.df)
+        if self.filter_text.get().strip():
+            self.apply_filter()
 
-    def show_table(self, df):
-        if self.tree is not None:
-            self.tree.destroy()
+    def with_all_colleges(self, then):
+        """
+        Reads the colleges that were never opened on a worker, then calls then() on the Tk thread.
+        """
+        missing = self.model.unloaded_colleges()
+        if not missing:
+            then()
+            return
+        self.college_waiters.append(then)
+        if len(self.college_waiters) > 1:
+            return  # Already being read
 
-        self.tree = ttk.Treeview(self.frame, yscrollcommand=self.tree_scroll_y.set, xscrollcommand=self.tree_scroll_x.set)
-        self.tree_scroll_y.config(command=self.tree.yview)
-        self.tree_scroll_x.config(command=self.tree.xview)
-        self.tree.pack(fill=tk.BOTH, expand=1)
+        def on_read():
+            waiters, self.college_waiters = self.college_waiters, []
+            for waiter in waiters:
+                waiter()
 
-        # Define columns based on row 4 (index 3 in zero-indexed DataFrame), shifting right by one
-        columns = [''] + df.iloc[3].tolist()  # Prepend an empty string
-        self.tree["columns"] = columns
-        self.tree["show"] = "headings"
+        def on_failed():
+            self.college_waiters = []
 
-        # Define headings
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100)
+        self.read_colleges(missing, on_read, on_failed)
 
-        # Process and insert data
-        college_name = None
-        for index, row in df.iterrows():
-            if index <= 3:  # Skip the first 4 rows
-                continue
+    def read_colleges(self, indices, on_read, on_failed=None):
+        """
+        Reads the rows of the colleges on a worker and adds them to the model on the Tk
+        thread, then calls on_read(). on_failed() is called if they couldn't be read.
+        """
+        source = self.model.colleges
+        reader = source.reopen()
 
-            # Identify college header
-            non_na_values = [value for value in row if value]  # Get non-empty values
-            if len(non_na_values) < 3 and row[0]:  # Check for college header
-                college_name = row[0]
-            else:
-                row_data = row.tolist()
-                if college_name:
-                    row_data.insert(0, college_name)  # Insert college name as the first column
-                row_data = [''] + row_data[1:]  # Shift to the right, skip the already shifted college name
-                self.tree.insert("", "end", values=row_data)
+        def read(task):
+            try:
+                return reader.read_sections(indices, task)
+            finally:
+                reader.close()
 
+        def on_done(rows):
+            if self.model.colleges is not source:
+                return  # Another file was opened in the meantime
+            self.model.add_colleges(indices, rows)
+            on_read()
 
-    def add_schedule(self):
-        # Ensure main window focus
-        self.root.lift()
-        self.root.focus_force()
-
-        # Create a new window for schedule entry
-        input_window = tk.Toplevel(self.root)
-        input_window.title("Add New Schedule")
-
-        # Retrieve column names from the table (row 4 in zero-indexed DataFrame)
-        column_names = self.df.iloc[3].tolist()
-
-        # Store new schedule data
-        new_schedule = [''] * len(column_names)  # Create an empty row with the right length
-        entries = []  # To keep track of entry widgets
-
-        def on_submit():
-            # Function to handle submit
-            for i, entry in enumerate(entries):
-                value = entry.get()
-                new_schedule[i] = value if value else ""  # Set value or leave empty
-
-            # Determine the position to insert the new schedule
-            course_code = new_schedule[1]  # Assuming course code is in the second column
-            insert_index = len(self.df)  # Default to the end of the DataFrame
-
-            # Iterate through DataFrame to find the insertion point
-            for idx, row in self.df.iterrows():
-                if row[1] == course_code:
-                    insert_index = idx + 1  # Insert below the last occurrence of the same course code
-                elif idx > insert_index:
-                    break  # Stop when we've gone past the insertion point
-
-            # Insert new schedule into DataFrame
-            new_row = pd.DataFrame([new_schedule], columns=self.df.columns)
-            self.df = pd.concat([self.df.iloc[:insert_index], new_row, self.df.iloc[insert_index:]]).reset_index(drop=True)
-
-            # Refresh the displayed table
-            self.show_table(self.df)
-            input_window.destroy()
-
-        def on_cancel():
-            # Function to handle cancel
-            input_window.destroy()
-
-        # Create labels and entry fields for each column
-        for col, column_name in enumerate(column_names):
-            # Create a label for the column name
-            label = tk.Label(input_window, text=f"Enter {column_name}:")  # Use the actual column name
-            label.grid(row=col, column=0, padx=10, pady=5, sticky='e')
+        def on_error(e):
+            if on_failed is not None:
+                on_failed()
+            messagebox.showerror("Error", f"Error reading the colleges: {e}")
 
-            # Create an entry field for input
-            entry = tk.Entry(input_window)
-            entry.grid(row=col, column=1, padx=10, pady=5, sticky='w')
+        self.tasks.run("Reading colleges", read, on_done, on_error)
 
-            # Append entry to the list
-            entries.append(entry)
+    def save_file(self):
+        if self.model.colleges is None:
+            return  # Still opening
+        # The whole sheet is written back, so the colleges that were never opened are read first
+        self.with_all_colleges(self.write_file)
+
+    def write_file(self):
+        # Everything is loaded now, the core closes the workbook and hands over a copy to write
+        self.tasks.run("Saving", self.core.save_work(self.file_path),
+                       lambda result: messagebox.showinfo("Save", "File saved successfully!"),
+                       on_error=lambda e: messagebox.showerror("Error", f"Error saving file: {e}"))
+
+    def share_file(self):
+        """
+        Copies the schedule into a shared store file, everyone who opens it edits the same schedule.
+        """
+        if self.model.colleges is None:
+            return  # Still opening
+        file_path = filedialog.asksaveasfilename(title="Share Schedule", defaultextension=".sqlite",
+                                                 filetypes=[("Shared schedule", "*.sqlite")])
+        if not file_path:
+            return
 
-        # Create buttons for submit and cancel
-        button_frame = tk.Frame(input_window)
-        button_frame.grid(row=len(column_names), columnspan=2, pady=10)
+        def share():
+            try:
+                self.core.share(file_path)
+            except (ValueError, sqlite3.Error) as e:
+                messagebox.showerror("Share", f"Error sharing the schedule: {e}")
+                return
+            self.on_store_opened()
 
-        submit_button = tk.Button(button_frame, text="Submit", command=on_submit)
-        submit_button.pack(side=tk.LEFT, padx=5)
+        # The store gets every row, so the colleges that were never opened are read first
+        self.with_all_colleges(share)
 
-        cancel_button = tk.Button(button_frame, text="Cancel", command=on_cancel)
-        cancel_button.pack(side=tk.LEFT, padx=5)
+    def export(self, title, make_report, parent=None):
+        """
+        Asks where to export a report and writes it on a worker, make_report() gives (columns, lines).
+        """
+        if self.model.colleges is None:
+            return  # Still opening
+        file_path = filedialog.asksaveasfilename(title=f"Export {title}", defaultextension=".csv", parent=parent or self.root,
+                                                 filetypes=[("CSV", "*.csv"), ("Excel workbook", "*.xlsx"), ("Web page", "*.html")])
+        if not file_path:
+            return
 
+        def write():
+            # What the report needs is copied here, the lines are generated from the copy on the worker one at a time as they are written
+            columns, lines = make_report()
+            self.tasks.run(f"Exporting {title}", lambda task: export_report(file_path, columns, lines, task, title),
+                           lambda count: messagebox.showinfo("Export", f"{count} lines exported to {os.path.basename(file_path)}."),
+                           on_error=lambda e: messagebox.showerror("Export", f"Error exporting: {e}"))
 
+        # Reports cover the whole sheet, so the colleges that were never opened are read first
+        self.with_all_colleges(write)
 
-    def edit_schedule(self):
-        selected_item = self.tree.selection()
+    def open_shared(self):
+        file_path = filedialog.askopenfilename(title="Open Shared Schedule", filetypes=[("Shared schedule", "*.sqlite")])
+        if not file_path:
+            return
+        self.tasks.cancel_all()
+        self.college_waiters = []
+
+        def on_done(result):
+            self.core.use_store(*result)
+            self.on_store_opened()
+
+        self.tasks.run(f"Opening {os.path.basename(file_path)}", lambda task: ScheduleCore.read_store(file_path), on_done,
+                       on_error=lambda e: messagebox.showerror("Error", f"Error opening the shared schedule: {e}"))
+
+    def on_store_opened(self):
+        self.store_failures = 0
+        self.show_colleges()
+        if self.store_job is None:
+            self.store_job = self.root.after(STORE_POLL_MS, self.poll_store)
+
+    def poll_store(self):
+        self.store_job = None
+        if self.model.store is None:
+            return  # A workbook was opened instead
+        if self.pull_changes():
+            delay = STORE_POLL_MS
+        else:
+            delay = min(STORE_POLL_MS * 2 ** self.store_failures, STORE_POLL_MAX_MS)  # Back off while it can't be read
+        self.store_job = self.root.after(delay, self.poll_store)
 
-        if not selected_item:
-            messagebox.showwarning("Warning", "Please select a schedule to edit.")
+    def pull_changes(self):
+        """
+        Pulls in the changes of the others, False if the store couldn't be read. The first
+        failure in a row shows a message, the ones after it only the status.
+        """
+        # Only the rows changed since the last pull are read, they come in as one transaction
+        try:
+            self.model.store.pull(self.model)
+        except sqlite3.Error as e:
+            self.store_failures += 1
+            self.filter_status.config(text=f"Can't read the shared schedule ({e}), trying again")
+            if self.store_failures == 1:
+                messagebox.showwarning("Shared Schedule", f"The changes of the others can't be pulled in: {e}\n\nIt is tried again in the background.")
+            return False
+        if self.store_failures:
+            self.store_failures = 0
+            self.filter_status.config(text="Shared schedule read again")
+        return True
+
+    def on_model_changed(self, events):
+        if self.table is not None:
+            self.table.on_change(events)
+            if self.table.filtered is not None:
+                # Edited rows may now match the filter, or no longer, only they are checked again
+                changed = {event.row_id for event in events}
+                kept = [event.row_id for event in events if event.after is not None]
+                self.table.update_filter(changed, self.search_index.matching(self.filter_text.get(), kept))
+
+    def on_filter_typed(self, *args):
+        # Debounce the keystrokes, the filter runs once typing pauses
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        if self.table is None:
+            return  # Still opening, the filter is applied once the table is there
+        text = self.filter_text.get()
+        if not text.strip():
+            self.table.set_filter(None)
+            self.filter_status.config(text="")
             return
 
-        # Get the selected item's values
-        item_values = self.tree.item(selected_item)['values'][1:]  # Skip the first empty string
+        # The filter covers every college, not only the opened ones
+        if self.model.unloaded_colleges():
+            self.filter_status.config(text="Reading colleges...")
+            self.with_all_colleges(self.apply_filter)
+            return
+        start = time.perf_counter()
+        row_ids = self.search_index.query(text)
+        self.table.set_filter(row_ids if row_ids is not None else None)
+        elapsed = (time.perf_counter() - start) * 1000
+        count = len(row_ids) if row_ids is not None else len(self.search_index.row_tokens)
+        self.filter_status.config(text=f"{count} schedules ({elapsed:.0f} ms)")
+
+    def apply_transaction(self, transaction):
+        """
+        Commits a transaction, showing the validation errors instead if there are any.
+        """
+        try:
+            transaction.commit()
+            return True
+        except ValueError as e:
+            self.show_edit_error(e)
+            return False
+
+    def show_edit_error(self, error):
+        if isinstance(error, StaleRowsError):
+            # Someone sharing the store changed the same rows first, their version wins
+            self.pull_changes()
+            messagebox.showwarning("Edit Not Saved", f"{error} Their changes are shown now, make the edit again.")
+        else:
+            messagebox.showerror("Invalid Edit", str(error))
 
-        # Retrieve column names from the table (row 4 in zero-indexed DataFrame)
-        column_names = self.df.iloc[3].tolist()
+    def show_table(self, df):
+        # The table is created once and then kept up to date from the model's events, see VirtualTable
+        if self.table is None:
+            self.table = VirtualTable(self.frame, self.model, [str(name) for name in df.iloc[3].tolist()], self.sort_keys, self.read_colleges)
+            self.table.tree.bind("<Delete>", lambda event: self.delete_schedule())
+        self.table.refresh()
+
+    def on_college_picked(self, event):
+        i = self.college_picker.current()
+        if i >= 0:
+            self.table.show_college(i)
+
+    def selected_row_ids(self):
+        """
+        Returns the DataFrame row IDs of the selected schedules, skipping college lines.
+        """
+        return self.table.selected_ids()
 
-        # Create a Toplevel window for input
-        input_window = tk.Toplevel(self.root)
-        input_window.title("Edit Schedule Info")
 
-        # Create labels and entry fields for each column
-        entries = []
-        for col, column_name in enumerate(column_names):
-            label = tk.Label(input_window, text=f"Edit {column_name}:")
-            label.grid(row=col, column=0, padx=10, pady=5, sticky='e')
+    def schedule_form(self):
+        # One form per set of columns, reused every time it is opened
+        column_names = tuple(self.model.column_names())
+        if column_names not in self.forms:
+            self.forms[column_names] = ScheduleForm(self.root, column_names, self.value_index)
+        return self.forms[column_names]
 
-            entry = tk.Entry(input_window)
-            entry.insert(0, item_values[col])
-            entry.grid(row=col, column=1, padx=10, pady=5, sticky='w')
-            entries.append(entry)
-
-        # Create buttons for submit and cancel
-        def on_submit():
-            new_values = [entry.get() for entry in entries]
-
-            # Find the original row in the DataFrame that matches the selected item's values
-            found_match = False
-            for index, row in self.df.iterrows():
-                if len(row) == len(item_values):  # Ensure lengths match
-                    if all(str(row[i]).strip() == str(item_values[i]).strip() for i in range(len(item_values))):
-                        # Update the DataFrame at the located index
-                        self.df.iloc[index] = new_values
-                        found_match = True
-                        break
-
-            if not found_match:
-                messagebox.showwarning("Warning", "No matching row found in DataFrame.")
+    def add_schedule(self):
+        if self.df is None:
+            return  # Still opening
+        reading = set()  # Holds True while the college the new schedule goes to is being read
+
+        def on_submit(new_schedule):
+            # Insert below the last occurrence of the same course code, in the same college
+            course_code = new_schedule[COURSE_CODE]
+            siblings = self.model.match_rows({COURSE_CODE: course_code}) if course_code else []
+            if siblings:
+                sibling_id = siblings[-1]
             else:
-                # Reset the DataFrame index
-                self.df.reset_index(drop=True, inplace=True)
+                # No loaded schedule has this course code, add it to the end of the last loaded college
+                sections = self.model.colleges.sections
+                if sections and not self.model.loaded_colleges:
+                    # None read yet, the last one is read on a worker and the schedule added to it then
+                    if not reading:
+                        reading.add(True)
+                        form = self.schedule_form()
+                        self.read_colleges([len(sections) - 1], lambda: reading.clear() or (on_submit(new_schedule) and form.hide()),
+                                           reading.clear)
+                    return False
+                sibling_id = self.df.index[-1]
+
+            # The table is refreshed when the transaction commits
+            transaction = self.model.transaction()
+            transaction.insert(new_schedule, after=sibling_id)
+            return self.apply_transaction(transaction)
+
+        self.schedule_form().open("Add New Schedule", "Enter", [''] * len(self.model.column_names()), on_submit)
 
-                # Refresh the displayed table
-                self.show_table(self.df)
+    def edit_schedule(self):
+        selected_ids = self.selected_row_ids()
 
-            input_window.destroy()
+        if not selected_ids:
+            messagebox.showwarning("Warning", "Please select a schedule to edit.")
+            return
 
-        def on_cancel():
-            input_window.destroy()
+        # Get the selected row's values, and its version in a shared store so an edit someone
+        # else makes while the form is open (and a pull brings in) isn't written over
+        row_id = selected_ids[0]
+        item_values = self.df.loc[row_id].tolist()
+        versions = self.model.row_versions([row_id])
 
-        button_frame = tk.Frame(input_window)
-        button_frame.grid(row=len(entries), columnspan=2, pady=10)
-        
-        submit_button = tk.Button(button_frame, text="Submit", command=on_submit)
-        submit_button.pack(side=tk.LEFT, padx=5)
-        
-        cancel_button = tk.Button(button_frame, text="Cancel", command=on_cancel)
-        cancel_button.pack(side=tk.LEFT, padx=5)
+        def on_submit(new_values):
+            # The tree item is keyed by the row ID, so the row can be updated directly
+            if row_id not in self.df.index:
+                messagebox.showwarning("Warning", "No matching row found in DataFrame.")
+                return True
 
+            # Only the changed columns are validated and written
+            changes = {col: value for col, value in enumerate(new_values) if value != str(item_values[col])}
+            transaction = self.model.transaction(based_on=versions)
+            transaction.update(row_id, changes)
+            if self.apply_transaction(transaction):
+                return True
+            # The form is out of date once someone else's change to the row is in, it closes so it is opened again from that
+            return self.model.row_versions([row_id]) != versions
 
+        self.schedule_form().open("Edit Schedule Info", "Edit", item_values, on_submit)
 
+    def bulk_edit(self):
+        """
+        Sets columns on every schedule matching some column values, as a single transaction.
+        """
+        criteria_text = simpledialog.askstring("Bulk Edit", "Edit the schedules where (e.g. Course Code=GEDANCE; Room1=LAG-COVCA):")
+        if not criteria_text:
+            return
+        changes_text = simpledialog.askstring("Bulk Edit", "Set (e.g. Room1=SMG-BLCHL):")
+        if not changes_text:
+            return
 
+        try:
+            criteria = self.model.parse_assignments(criteria_text)
+            changes = self.model.parse_assignments(changes_text)
+        except ValueError as e:
+            messagebox.showerror("Bulk Edit", str(e))
+            return
 
+        # Bulk edits apply to the whole sheet, not only the opened colleges
+        self.with_all_colleges(lambda: self.apply_bulk_edit(criteria, changes))
 
+    def apply_bulk_edit(self, criteria, changes):
+        row_ids = self.model.match_rows(criteria)
+        if not row_ids:
+            messagebox.showinfo("Bulk Edit", "No schedules match.")
+            return
 
+        if not messagebox.askyesno("Confirm Bulk Edit", f"Apply the change to {len(row_ids)} schedules?"):
+            return
 
+        try:
+            row_ids = self.core.bulk_edit(criteria, changes)
+        except ValueError as e:
+            self.show_edit_error(e)
+            return
+        messagebox.showinfo("Bulk Edit", f"{len(row_ids)} schedules updated.")
 
     def suggest_merge(self):
         # Ask the user for the enrollment threshold
@@ -247,111 +1710,148 @@ class ExcelViewerApp:
         if threshold is None:
             return  # User canceled the input
 
-        # Convert the Enrl Cap column to numeric, coercing errors to NaN
-        self.df[14] = pd.to_numeric(self.df[14], errors='coerce')
-
-        # Find rows with Enrl Cap below the threshold
-        below_threshold = self.df[self.df[14] < threshold]
+        # Find and group the rows with Enrl Cap below the threshold on a worker (only the opened colleges are checked)
+        schedules = self.core.schedules()
+        self.tasks.run("Finding merges", lambda task: self.core.merge_suggestions(threshold, schedules),
+                       lambda groups: self.show_merge_suggestions(groups, threshold))
 
-        if below_threshold.empty:
+    def show_merge_suggestions(self, groups, threshold):
+        if not groups:
             messagebox.showinfo("No Merges Suggested", "No schedules below the specified threshold found.")
             return
+        count = sum(len(row_ids) for row_ids, _ in groups.values())
+        MergeSuggestionViewer(self.root, self.model, groups, f"Merge Suggestions ({count} schedules below {threshold})")
 
-        # Create a Toplevel window to show suggestions
-        suggestion_window = tk.Toplevel(self.root)
-        suggestion_window.title("Merge Suggestions")
-
-        # Create a Canvas widget for scrolling
-        canvas = tk.Canvas(suggestion_window)
-        scrollbar = tk.Scrollbar(suggestion_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        # Pack the Canvas and Scrollbar
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-
-        # Populate the scrollable frame with suggestions
-        label = tk.Label(scrollable_frame, text=f"Schedules with Enrollment Capacity below {threshold}:")
-        label.pack(pady=5)
-
-        for index, row in below_threshold.iterrows():
-            row_text = ', '.join(map(str, row))
-            row_label = tk.Label(scrollable_frame, text=row_text, anchor="w", padx=5)
-            row_label.pack(pady=2, fill="x")
+    def merge_plan(self):
+        """
+        Plans merges of the sections below a threshold for the whole sheet, see ScheduleCore.merge_plan.
+        """
+        threshold = simpledialog.askinteger("Merge Plan", "Merge the sections with an Enrl Cap below:")
+        if threshold is None:
+            return
+        capacity = simpledialog.askinteger("Merge Plan", "Largest Enrl Cap of a merged section:", initialvalue=max(threshold, 40))
+        if capacity is None:
+            return
 
-        # Adjust the window size based on content
-        suggestion_window.update_idletasks()
-        suggestion_window.geometry(f"600x{min(400, suggestion_window.winfo_height())}")
+        def plan():
+            # The rows as they are planned on, to tell when applying the plan whether they changed since
+            schedules = self.core.schedules()
+            versions = self.model.row_versions(schedules.index)
+            self.tasks.run("Planning merges", lambda task: self.core.merge_plan(threshold, capacity, schedules),
+                           lambda result: self.show_merge_plan(*result, schedules, versions))
 
+        self.with_all_colleges(plan)
 
+    def show_merge_plan(self, plan, sections_before, sections_after, schedules, versions):
+        if not plan:
+            messagebox.showinfo("Merge Plan", "No sections can be merged.")
+            return
 
+        # Each planned merge gets the first time it fits in, or its problems if none fits
+        hosts, notes = self.core.check_merge_plan(plan)
+        planned = schedules.loc[[row_id for row_ids, _ in plan.values() for row_id in row_ids]]
+        planned_versions = {row_id: versions[row_id] for row_id in planned.index} if versions else None
+        title = f"Merge Plan: {sections_before} sections into {sections_after}"
+        apply = ("Apply Merges That Fit", lambda viewer: self.apply_merge_plan(viewer, plan, hosts, planned, planned_versions))
+        export = ("Export...", lambda viewer: self.export("Merge Plan", lambda: self.core.merge_plan_report(plan, hosts, notes), viewer.window))
+        MergeSuggestionViewer(self.root, self.model, plan, title, notes, actions=[apply, export])
 
+    def apply_merge_plan(self, viewer, plan, hosts, planned, versions):
+        """
+        Applies every merge of the plan that still fits, all in one transaction.
+        """
+        # The plan may be older than the last edits or pulls, its own rows have to be as they were planned
+        if self.core.changed_rows(planned, versions):
+            messagebox.showwarning("Merge Plan", "Some of the planned schedules changed since, plan the merges again.", parent=viewer.window)
+            return
+        # Other rows may have taken a room or time since, so every merge is checked again
+        hosts_now, _ = self.core.check_merge_plan(plan)
+        no_longer_fit = [name for name in hosts if name not in hosts_now]
+        groups = [(plan[name][0], host) for name, host in hosts_now.items()]
+        if not groups:
+            messagebox.showinfo("Merge Plan", f"None of the merges fit{' anymore' if no_longer_fit else ''}, nothing was changed.", parent=viewer.window)
+            return
+        skipped = len(plan) - len(groups)
+        question = f"Apply {len(groups)} merges ({skipped} that don't fit are left out)?"
+        if no_longer_fit:
+            question += f"\n\nThese don't fit anymore: {', '.join(no_longer_fit)}"
+        if not messagebox.askyesno("Merge Plan", question, parent=viewer.window):
+            return
+        if self.apply_transaction(self.model.merge_transaction(groups)):
+            viewer.window.destroy()
+            messagebox.showinfo("Merge Plan", f"{len(groups)} merges applied.")
 
     def merge_schedules(self):
-        selected_items = self.tree.selection()
+        selected_ids = self.selected_row_ids()
 
-        if len(selected_items) != 2:
-            messagebox.showwarning("Merge Error", "Please select exactly two schedules to merge.")
+        if len(selected_ids) < 2:
+            messagebox.showwarning("Merge Error", "Please select two or more schedules to merge.")
             return
 
-        # Retrieve the values of the selected items
-        schedules = [self.tree.item(item)['values'] for item in selected_items]  # Retrieve all values, including empty columns
+        # The merged section keeps the time of one of them, checked against the rooms and the conflicts
+        host = self.prompt_merge_time(selected_ids)
+        if host is None:
+            return
 
-        # Check if the course codes are the same
-        if schedules[0][2] != schedules[1][2]:  # Assuming course code is the third column
+        # Replace the selected rows with the merged one, where the host was, in one transaction
+        transaction = self.model.merge_transaction([(selected_ids, host)])
+        schedules = [self.df.loc[row_id].tolist() for row_id in selected_ids]
+        if len(schedules) == 2 and schedules[0][COURSE_CODE] != schedules[1][COURSE_CODE]:
             # Ask the user to choose which course code to keep
             course_code, course_title = self.prompt_course_choice(schedules[0], schedules[1])
-        else:
-            # Use the common course code and title if they are the same
-            course_code, course_title = schedules[0][2], schedules[0][3]
-
-        # Construct a new merged schedule
-        merged_schedule = [
-            f"{schedules[0][1]} + {schedules[1][1]}",  # Takers
-            course_code,  # Course Code 
-            course_title,  # Course Title
-            schedules[0][4],  # Offered To 
-            '',  
-            '', 
-            '',  
-            '',  
-            '', 
-            '',  
-            '', 
-            '', 
-            '',  
-            '', 
-            int(schedules[0][15]) + int(schedules[1][15]),  # Enrl Cap (adding integer values), assuming it's the 16th column
-            '', 
-            '', 
-            '', 
-        ]
-
-        # Add the merged schedule to the DataFrame
-        self.df.loc[len(self.df)] = merged_schedule
-
-        # Delete the original schedules from the DataFrame
-        for item in selected_items:
-            index = self.tree.index(item)
-            self.df.drop(index, inplace=True)
-
-        # Reset index to keep it clean
-        self.df.reset_index(drop=True, inplace=True)
-
-        # Refresh the displayed table
-        self.show_table(self.df)
+            merged_id = next(iter(transaction.inserted))
+            transaction.update(merged_id, {COURSE_CODE: course_code, COURSE_TITLE: course_title})
+        if not self.apply_transaction(transaction):
+            return
 
         # Inform the user of the successful merge
         messagebox.showinfo("Success", "Schedules merged successfully.")
 
+    def prompt_merge_time(self, row_ids):
+        """
+        Lets the user pick whose time the merged section keeps, showing why each one does or
+        doesn't fit. Returns the host's row ID, None if cancelled.
+        """
+        options = self.merge_checker.options(row_ids)
+
+        window = tk.Toplevel(self.root)
+        window.title("Merged Section Time")
+        tk.Label(window, text="Keep the time of:").pack(padx=10, pady=5, anchor="w")
+        choices = tk.Listbox(window, width=80, height=len(options))
+        for option in options:
+            choices.insert(tk.END, f"{'OK' if not option.problems else 'X '} {self.merge_checker.describe(option.host)}")
+        choices.pack(padx=10, fill=tk.X)
+        details = tk.Label(window, text="", justify=tk.LEFT, anchor="w")
+        details.pack(padx=10, pady=5, fill=tk.X)
+
+        def on_pick(event=None):
+            selection = choices.curselection()
+            if selection:
+                details.config(text="\n".join(options[selection[0]].problems) or "Fits the room and clashes with nothing.")
+
+        self.chosen_host = None
+
+        def on_merge():
+            selection = choices.curselection()
+            if not selection:
+                return
+            option = options[selection[0]]
+            if option.problems and not messagebox.askyesno("Merge Anyway?", "\n".join(option.problems) + "\n\nMerge anyway?", parent=window):
+                return
+            self.chosen_host = option.host
+            window.destroy()
+
+        choices.bind("<<ListboxSelect>>", on_pick)
+        choices.selection_set(0)
+        on_pick()
+        buttons = tk.Frame(window)
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="Merge", command=on_merge).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Cancel", command=window.destroy).pack(side=tk.LEFT, padx=5)
+
+        window.wait_window()
+        return self.chosen_host
+
     def prompt_course_choice(self, schedule1, schedule2):
         """
         Prompts the user to choose which course code and title to keep in the merged schedule.
@@ -364,8 +1864,8 @@ class ExcelViewerApp:
         tk.Label(choice_window, text="Select the course code to keep:").pack(pady=10)
 
         # Display options for the user
-        course1_button = tk.Button(choice_window, text=f"{schedule1[2]}: {schedule1[3]}", command=lambda: choice('schedule1'))
-        course2_button = tk.Button(choice_window, text=f"{schedule2[2]}: {schedule2[3]}", command=lambda: choice('schedule2'))
+        course1_button = tk.Button(choice_window, text=f"{schedule1[1]}: {schedule1[2]}", command=lambda: choice('schedule1'))
+        course2_button = tk.Button(choice_window, text=f"{schedule2[1]}: {schedule2[2]}", command=lambda: choice('schedule2'))
 
         course1_button.pack(pady=5)
         course2_button.pack(pady=5)
@@ -375,9 +1875,9 @@ class ExcelViewerApp:
 
         def choice(selected):
             if selected == 'schedule1':
-                self.chosen_course = (schedule1[2], schedule1[3])  # Course code and title from schedule1
+                self.chosen_course = (schedule1[1], schedule1[2])  # Course code and title from schedule1
             else:
-                self.chosen_course = (schedule2[2], schedule2[3])  # Course code and title from schedule2
+                self.chosen_course = (schedule2[1], schedule2[2])  # Course code and title from schedule2
             choice_window.destroy()  # Close the window after selection
 
         # Wait for the user to make a choice
@@ -391,144 +1891,46 @@ class ExcelViewerApp:
 
 
     def find_conflict(self):
-        conflicts = []  # To hold all conflicts
-
-        for index1, row1 in self.df.iterrows():
-            for index2, row2 in self.df.iterrows():
-                if index1 >= index2:  # Skip duplicate checks and self-checks
-                    continue
-
-                # Check for non-empty values in room and days
-                if (row1[5] and row2[5]) and (row1[0] and row2[0]):  # Room1 is not empty
-                    try:
-                        # Check Day1, Begin1, End1, Room1 for conflicts
-                        if (row1[6] == row2[6] and row1[5] == row2[5] and  # Same Room
-                            not (int(row1[7]) >= int(row2[8]) or int(row2[7]) >= int(row1[8]))):  # Time overlap
-                            conflicts.append((row1.tolist(), row2.tolist()))
-                    except ValueError:
-                        print(f"Invalid time format for {row1[7]}, {row1[8]}, {row2[7]}, {row2[8]}")
-
-                if (row1[11] and row2[11]) and (row1[0] and row2[0]):  # Room2 is not empty
-                    try:
-                        # Check Day2, Begin2, End2, Room2 for conflicts
-                        if (row1[12] == row2[12] and row1[11] == row2[11] and  # Same Room
-                            not (int(row1[13]) >= int(row2[14]) or int(row2[13]) >= int(row1[14]))):  # Time overlap
-                            conflicts.append((row1.tolist(), row2.tolist()))
-                    except ValueError:
-                        print(f"Invalid time format for {row1[13]}, {row1[14]}, {row2[13]}, {row2[14]}")
-
-        # Display conflicts
-        if conflicts:
-            # Create a Toplevel window for conflict display
-            conflict_window = tk.Toplevel(self.root)
-            conflict_window.title("Conflict Groups")
-
-            # Create a Canvas widget for scrolling
-            canvas = tk.Canvas(conflict_window)
-            canvas.pack(side="left", fill="both", expand=True)
-
-            # Create a Scrollbar widget
-            scrollbar_y = tk.Scrollbar(conflict_window, orient="vertical", command=canvas.yview)
-            scrollbar_x = tk.Scrollbar(conflict_window, orient="horizontal", command=canvas.xview)
-            scrollbar_y.pack(side="right", fill="y")
-            scrollbar_x.pack(side="bottom", fill="x")
-
-            # Create a Frame to hold the Treeview inside the Canvas
-            scrollable_frame = tk.Frame(canvas)
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-
-            # Bind the Frame to the Canvas' scroll region
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
-
-            # Configure the Canvas' scrollbars
-            canvas.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
-
-            # Create a Notebook widget for tabbed pages
-            notebook = ttk.Notebook(scrollable_frame)
-            notebook.pack(fill="both", expand=True)
-
-            # Define column names and widths
-            column_names = self.df.iloc[3].tolist()
-            column_names = [str(col) for col in column_names]  # Convert to strings
-            column_widths = [150] * len(column_names)  # Adjust column widths as needed
-
-            # Create tabs for each conflict group
-            for i, conflict_pair in enumerate(conflicts):
-                tab = ttk.Frame(notebook)
-                notebook.add(tab, text=f"Conflict {i+1}")
-
-                # Create Treeview widget for tabular display
-                tree = ttk.Treeview(tab, columns=column_names, show="headings")
-                tree.pack(fill="both", expand=True)
-
-                # Define column headings
-                for col, col_name in enumerate(column_names):
-                    tree.heading(col, text=col_name)
-                    tree.column(col, width=column_widths[col])
-
-                # Add rows to Treeview
-                for row in conflict_pair:
-                    tree.insert("", "end", values=row)
-
-            # Ensure the canvas is updated with the new scroll region
-            scrollable_frame.update_idletasks()
-            canvas.config(scrollregion=canvas.bbox("all"))
+        # Rooms are shared across colleges, so every college has to be checked
+        self.with_all_colleges(self.show_conflicts)
 
-        else:
+    def show_conflicts(self):
+        # The conflict index is kept up to date as rows change, so nothing is recomputed here
+        conflicts = self.conflict_index.conflicts()
+        if conflicts.empty:
             messagebox.showinfo("No Conflicts", "No scheduling conflicts found.")
+            return
+        ConflictViewer(self.root, self.model, conflicts)
 
+    def show_timetable(self):
+        # A room or faculty member can have classes in any college
+        self.with_all_colleges(lambda: TimetableViewer(self.root, self.model, self.conflict_index, self.search_index, self.takers_index))
 
-
-
-
-
-
-
-
-
-
+    def show_stats(self):
+        # The totals cover the loaded rows, so the whole term is read first
+        self.with_all_colleges(lambda: StatsViewer(self.root, self.model, self.stats))
 
     def delete_schedule(self):
-        selected_item = self.tree.selection()
+        # Any number of schedules can be selected, tree items are keyed by row ID
+        selected_ids = self.selected_row_ids()
         
-        if not selected_item:
+        if not selected_ids:
             messagebox.showwarning("Warning", "Please select a schedule to delete.")
             return
         
         # Confirm deletion
-        confirm = messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete the selected schedule?")
+        if len(selected_ids) == 1:
+            question = "Are you sure you want to delete the selected schedule?"
+        else:
+            question = f"Are you sure you want to delete the {len(selected_ids)} selected schedules?"
+        confirm = messagebox.askyesno("Confirm Deletion", question)
         if not confirm:
             return
 
-        # Get the selected item's values
-        item_values = self.tree.item(selected_item)['values'][1:]  # Skip the first empty string
-        
-        # Debug output
-        print("Selected Item Values:", item_values)
-
-        # Find the original row in the DataFrame that matches the selected item's values
-        found_match = False
-        for index, row in self.df.iterrows():
-            print(f"Checking row {index}: {row.tolist()}")  # Debug output
-            if len(row) == len(item_values):  # Ensure lengths match
-                # Convert both to strings and compare
-                if all(str(row[i]).strip() == str(item_values[i]).strip() for i in range(len(item_values))):
-                    print(f"Deleting row {index}")  # Indicate which row will be deleted
-                    self.df.drop(index, inplace=True)
-                    found_match = True
-                    break
-
-        if not found_match:
-            print("No matching row found for deletion.")  # Indicate no match found
-
-        # Reset the DataFrame index
-        self.df.reset_index(drop=True, inplace=True)
-
-        # Refresh the displayed table
-        self.show_table(self.df)
+        # All rows are removed in one transaction, only their items are removed from the table
+        transaction = self.model.transaction()
+        transaction.delete_many(selected_ids)
+        self.apply_transaction(transaction)
 
 
 
@@ -0,0 +1,2524 @@
+"""
+The scheduling logic without any UI: reading and writing the workbook, the model and its
+change events, the indexes, conflicts, merge planning and statistics.
+
+scheduling_algori-TEAM.py is the Tk window on top of this. Anything else (batch jobs,
+benchmarks) can use ScheduleCore directly, nothing here imports tkinter.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time
+from bisect import bisect_left
+from functools import lru_cache
+import copy
+import csv
+import html
+import importlib
+import itertools
+import json
+import os
+import queue
+import re
+import shlex
+import sqlite3
+import threading
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it the first time it is used.
+
+    pandas and openpyxl take longer to import than the whole window takes to build, so
+    they are only imported once a file is being read (on the worker thread).
+    """
+
+    def __init__(self, name):
+        self.module_name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        if self.module is None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, attribute)
+
+
+pd = LazyModule("pandas")
+openpyxl = LazyModule("openpyxl")
+
+HEADER_ROWS = 4  # Title rows plus the column names in row 4
+
+# Column positions of the schedule fields (see the column names in row 4)
+TAKERS, COURSE_CODE, COURSE_TITLE, OFFERED_TO, SECT, FACULTY = range(6)
+DAY1, BEGIN1, END1, ROOM1, DAY2, BEGIN2, END2, ROOM2, ENRL_CAP, REMARKS = range(6, 16)
+MEETING_SLOTS = [(DAY1, BEGIN1, END1, ROOM1), (DAY2, BEGIN2, END2, ROOM2)]  # Used when the headings don't name the slots
+
+# Day letters used in the sheet, H is Thursday
+DAY_LETTERS = "MTWHFSU"
+DAY_NAMES = {"MON": "M", "TUE": "T", "WED": "W", "THU": "H", "FRI": "F", "SAT": "S", "SUN": "U"}
+
+# Fields of the filter bar, and other names they can be typed as
+SEARCH_FIELDS = ("room", "faculty", "code", "title", "offered", "takers", "day")
+SEARCH_ALIASES = {"course": "code", "prof": "faculty", "block": "takers", "offeredto": "offered"}
+EXACT_PACKING_LIMIT = 12  # Groups up to this many sections get the exact merge search
+PACKING_SEARCH_BUDGET = 20000  # Steps the exact search may take per group before keeping first fit
+PROGRESS_EVERY = 1000  # Rows between progress updates of a task
+
+# Rooms that several classes can use at the same time, along with anything ONLINE
+SHARED_ROOMS = {'', 'ONLINE', 'OL', 'TBA'}
+ROOM_WEEK_MINUTES = 6 * 14 * 60  # A room can be booked Monday to Saturday, 0700 to 2100
+
+# A college section of the sheet: rows start (the college header) up to stop
+CollegeSection = namedtuple("CollegeSection", ["name", "start", "stop"])
+
+
+def is_college_header(row):
+    """
+    A college header has a name in the first column and fewer than 3 filled cells.
+    """
+    non_na_values = [value for value in row if value not in (None, '')]
+    return len(non_na_values) < 3 and len(row) > 0 and row[0] not in (None, '')
+
+
+def to_minutes(value):
+    """
+    Converts an HHMM time like 1530 or "0730" to minutes after midnight, None if it is not a time.
+    """
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return None
+    if not number.is_integer() or number < 0:
+        return None
+    hours, minutes = divmod(int(number), 100)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def minutes_to_times(minutes):
+    """
+    Minutes after midnight back to HHMM text, for a Series.
+    """
+    minutes = minutes.astype(int)
+    return (minutes // 60).map("{:02d}".format) + (minutes % 60).map("{:02d}".format)
+
+
+def to_time(minutes):
+    """
+    Minutes after midnight back to HHMM text.
+    """
+    return f"{minutes // 60:02d}{minutes % 60:02d}"
+
+
+def cap_number(value):
+    """
+    An Enrl Cap cell as an int, None if it is not a number.
+    """
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return None
+    return int(number) if number == number else None
+
+
+def is_shared_room(room):
+    return room in SHARED_ROOMS or "ONLINE" in room
+
+
+def times_to_minutes(values):
+    """
+    Vectorized to_minutes over a Series, invalid times become NaN.
+    """
+    numbers = pd.to_numeric(values.map(lambda value: str(value).strip()), errors="coerce")
+    hours, minutes = numbers // 100, numbers % 100
+    valid = (numbers >= 0) & (numbers == numbers.round()) & (hours <= 23) & (minutes <= 59)
+    return (hours * 60 + minutes).where(valid)
+
+
+def day_letters(value):
+    """
+    Turns a Day cell into the letters of the days it meets on, "" if it is not a day.
+
+    "MW" and "TH" list several days, "Saturday, 0900-1200" is a day name and a
+    date (one-off events) counts as the day of the week it falls on.
+    """
+    if isinstance(value, date):
+        return DAY_LETTERS[value.weekday()]
+    text = str(value).strip().upper()
+    if text[:3] in DAY_NAMES:
+        return DAY_NAMES[text[:3]]
+    if text and all(letter in DAY_LETTERS for letter in text):
+        return ''.join(dict.fromkeys(text))
+    return ''
+
+
+def find_meeting_slots(column_names):
+    """
+    Finds the (day, begin, end, room) columns of every meeting, from headings like Day1 ... Room1.
+    """
+    slots = {}
+    for col, name in enumerate(column_names):
+        match = re.fullmatch(r"(day|begin|end|room)\s*(\d+)", str(name).strip().casefold())
+        if match:
+            slots.setdefault(int(match[2]), {})[match[1]] = col
+    found = [(slot["day"], slot["begin"], slot["end"], slot["room"]) for _, slot in sorted(slots.items()) if len(slot) == 4]
+    return found or MEETING_SLOTS
+
+
+# One block in a Takers cell and how many of its students take the section (None if not given)
+TakersEntry = namedtuple("TakersEntry", ["block", "headcount"])
+
+# A block is a program code and its batch, like "CIV-121", "CS-STS-122", "BSAPHS-ID122" or
+# "IBSS 120", maybe after a year level ("FR BECEDS-122"), then its headcount as [12], (30)
+# or (4+14=18). Closing brackets are sometimes missing. Anything else in the cell, college
+# names (CCS), "merged with", "& above" and other remarks, is not a block.
+TAKERS_PATTERN = re.compile(r"""
+    (?:\b(?:FR|SO|JR|SR|ST)\s+(?=[A-Z]))?
+    (?P<block>
+        \b[A-Z][A-Z0-9]*(?:-[A-Z][A-Z0-9]*)*    # The program, BSMGT-BAS or IET-AD2
+        (?:(?:\s*-\s*|\s)\d{3}|(?<=[A-Z]\d{3}))  # Its batch, -121 or " 120", or the end of the program as in ID122
+    )\b
+    \s*
+    (?:[\[(](?P<count>[\d\s+=]*)[\])]?)?
+""", re.VERBOSE | re.IGNORECASE)
+
+
+def takers_count(text):
+    if text is None:
+        return None
+    numbers = re.findall(r"\d+", text.split("=")[-1])  # (4+14=18) -> 18, (4+14) -> 18
+    return sum(int(number) for number in numbers) if numbers else None
+
+
+@lru_cache(maxsize=None)
+def parse_takers(text):
+    """
+    The TakersEntry list of a Takers cell like "CIV-121 [12] CPE-121 [10]", as a tuple.
+
+    The same texts come up over and over, so the results are cached. Blocks listed twice
+    are combined.
+    """
+    entries = []
+    for match in TAKERS_PATTERN.finditer(str(text)):
+        block = re.sub(r"\s+", " ", re.sub(r"\s*-\s*", "-", match["block"].upper()))  # "ABELS -118" -> "ABELS-118"
+        entries.append(TakersEntry(block, takers_count(match["count"])))
+    return merge_takers([entries])
+
+
+def takers_remarks(text):
+    """
+    What a Takers cell says besides its blocks, like "pre-enlist?" or "CCS merged BAGCED, CLA".
+    """
+    rest = TAKERS_PATTERN.sub(" ", str(text))
+    return " ".join(rest.split()).strip(" +,;")
+
+
+def add_headcounts(a, b):
+    if a is None or b is None:
+        return a if b is None else b
+    return a + b
+
+
+def merge_takers(entry_lists):
+    """
+    One list of everyone's takers, the headcounts of a block in several lists are added up.
+    """
+    entries = {}
+    for entry_list in entry_lists:
+        for block, count in entry_list:
+            entries[block] = add_headcounts(entries[block], count) if block in entries else count
+    return tuple(TakersEntry(block, count) for block, count in entries.items())
+
+
+def format_takers(entries):
+    """
+    Writes TakersEntry values back as a Takers cell, "CIV-121 [12] CPE-121 [10]".
+    """
+    return " ".join(block if count is None else f"{block} [{count}]" for block, count in entries)
+
+
+def takers_blocks(text):
+    """
+    The blocks in a Takers cell, the headcounts are left out.
+    """
+    return [entry.block for entry in parse_takers(text)]
+
+
+def row_meetings(values, slots):
+    """
+    The meetings of one row as (meeting, day, begin, end, room) tuples.
+
+    Same rules as meetings_table, without pandas, for checking a few rows at a time.
+    """
+    meetings = []
+    for meeting, (day, begin, end, room) in enumerate(slots, start=1):
+        begin_minutes, end_minutes = to_minutes(values[begin]), to_minutes(values[end])
+        if begin_minutes is None or end_minutes is None or begin_minutes >= end_minutes:
+            continue
+        room_name = str(values[room]).strip().upper()
+        meetings.extend((meeting, letter, begin_minutes, end_minutes, room_name) for letter in day_letters(values[day]))
+    return meetings
+
+
+def meetings_table(df, slots):
+    """
+    Normalizes the meeting columns into one row per (section, meeting, day).
+
+    Columns are row_id, meeting (slot number), day (one letter), begin and end (minutes),
+    room and faculty. Meetings without a day or a valid time are left out.
+    """
+    frames = []
+    for meeting, (day, begin, end, room) in enumerate(slots, start=1):
+        frames.append(pd.DataFrame({
+            "row_id": df.index,
+            "meeting": meeting,
+            "day": df[day].to_numpy(),
+            "begin": times_to_minutes(df[begin]).to_numpy(),
+            "end": times_to_minutes(df[end]).to_numpy(),
+            "room": df[room].to_numpy(),
+            "faculty": df[FACULTY].to_numpy(),
+        }))
+    meetings = pd.concat(frames, ignore_index=True)
+
+    # Day cells repeat a lot, so each distinct value is only parsed once
+    days = meetings["day"].astype(str).where(~meetings["day"].map(lambda value: isinstance(value, date)), meetings["day"])
+    letters = {value: day_letters(value) for value in days.unique()}
+    meetings["day"] = days.map(letters)
+
+    meetings["room"] = meetings["room"].astype(str).str.strip().str.upper()
+    meetings["faculty"] = meetings["faculty"].astype(str).str.strip().str.upper()
+    meetings = meetings[(meetings["day"] != '') & (meetings["begin"] < meetings["end"])]
+
+    # A meeting on "MW" becomes one row per day
+    meetings = meetings.assign(day=meetings["day"].map(list)).explode("day", ignore_index=True)
+    return meetings.astype({"begin": int, "end": int})
+
+
+def conflict_keys(meetings):
+    """
+    The meetings in long format, once per resource they hold: kind is Room or Faculty
+    and value is the room or faculty name.
+    """
+    rooms = meetings[~meetings["room"].isin(SHARED_ROOMS) & ~meetings["room"].str.contains("ONLINE")]
+    faculty = meetings[~meetings["faculty"].isin({'', 'TBA'})]
+    keys = pd.concat([
+        rooms.assign(kind="Room", value=rooms["room"]),
+        faculty.assign(kind="Faculty", value=faculty["faculty"]),
+    ], ignore_index=True)
+    return keys[["kind", "value", "row_id", "meeting", "day", "begin", "end"]]
+
+
+def find_overlaps(keys):
+    """
+    Pairs of different sections that hold the same resource on a day at overlapping times.
+
+    Meetings are grouped by (kind, value, day) and each group is joined with itself, so
+    slot 1 of one section is checked against every slot of the other in the same pass.
+    """
+    pairs = keys.merge(keys, on=["kind", "value", "day"], suffixes=("_a", "_b"))
+    overlapping = (
+        (pairs["row_id_a"] < pairs["row_id_b"])
+        & (pairs["begin_a"] < pairs["end_b"])
+        & (pairs["begin_b"] < pairs["end_a"])
+    )
+    return pairs[overlapping]
+
+
+def sweep_overlaps(kind, value, meetings):
+    """
+    The find_overlaps records of one resource from its (row ID, day, begin, end, ...)
+    meetings, one per pair of sections, by a sweep over each day's meetings in begin order
+    instead of joining them with themselves.
+    """
+    days = {}
+    for row_id, day, begin, end, *_ in meetings:
+        days.setdefault(day, []).append((begin, end, row_id))
+    seen = set()
+    for day in sorted(days, key=DAY_LETTERS.index):
+        going_on = []
+        for begin, end, row_id in sorted(days[day]):
+            going_on = [meeting for meeting in going_on if meeting[1] > begin]
+            for other_begin, other_end, other in going_on:
+                a, b = sorted(((other, other_begin, other_end), (row_id, begin, end)))
+                if a[0] != b[0] and (a[0], b[0]) not in seen:
+                    seen.add((a[0], b[0]))
+                    yield {"kind": kind, "value": value, "row_id_a": a[0], "day": day, "begin_a": a[1], "end_a": a[2],
+                           "row_id_b": b[0], "begin_b": b[1], "end_b": b[2]}
+            going_on.append((begin, end, row_id))
+
+
+def find_conflicts(meetings):
+    """
+    Room and faculty conflicts as one row per pair of sections, sorted by row ID.
+    """
+    conflicts = find_overlaps(conflict_keys(meetings)).drop_duplicates(["kind", "row_id_a", "row_id_b"])
+    return conflicts.sort_values(["row_id_a", "row_id_b"], ignore_index=True)
+
+
+class CollegeIndex:
+    """
+    Lightweight index of the college sections in a workbook.
+
+    The sheet is scanned once to find where each college starts and stops, without
+    keeping the rows. The full rows of a college are read only when it is opened.
+    """
+
+    def __init__(self, file_path, task=None):
+        self.file_path = file_path
+        self.workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        self.sheet = self.workbook.worksheets[0]
+        self.header_rows = []
+        self.sections = []
+        self.width = 0
+
+        starts = []
+        names = []
+        row_count = 0
+        for index, row in enumerate(self.sheet.iter_rows(values_only=True)):
+            row_count = index + 1
+            if task is not None and index % PROGRESS_EVERY == 0:
+                task.progress(index, self.sheet.max_row)
+            self.width = max(self.width, len(row))
+            if index < HEADER_ROWS:
+                self.header_rows.append(row)
+            elif is_college_header(row) or index == HEADER_ROWS:
+                # Rows before the first college header are kept as an unnamed section
+                starts.append(index)
+                names.append(row[0] if is_college_header(row) else '')
+
+        for i, start in enumerate(starts):
+            stop = starts[i + 1] if i + 1 < len(starts) else row_count
+            self.sections.append(CollegeSection(str(names[i]), start, stop))
+
+        self.room_capacities = self.read_room_capacities()
+
+    def read_room_capacities(self):
+        """
+        Room -> capacity from a sheet named Rooms (rooms in the first column, capacities in
+        the second, one heading row), empty if the workbook doesn't have one.
+        """
+        capacities = {}
+        for sheet in self.workbook.worksheets[1:]:
+            if sheet.title.strip().casefold() != "rooms":
+                continue
+            for row in sheet.iter_rows(min_row=2, values_only=True):
+                if len(row) >= 2 and row[0] not in (None, '') and cap_number(row[1]) is not None:
+                    capacities[str(row[0]).strip().upper()] = cap_number(row[1])
+        return capacities
+
+    def read_sections(self, indices, task=None):
+        """
+        Reads the rows of several college sections in a single pass over the sheet.
+
+        A read-only sheet is parsed from the top on every iter_rows call, so reading the
+        sections one by one would get slower with each college further down.
+        """
+        sections = [self.sections[i] for i in sorted(indices)]
+        wanted = set()
+        for section in sections:
+            wanted.update(range(section.start, section.stop))
+        first = min(section.start for section in sections)
+        last = max(section.stop for section in sections)
+
+        rows = []
+        index = []
+        for row_id, row in enumerate(self.sheet.iter_rows(min_row=first + 1, max_row=last, values_only=True), start=first):
+            if task is not None and row_id % PROGRESS_EVERY == 0:
+                task.progress(row_id - first, last - first)
+            if row_id in wanted:
+                rows.append(row)
+                index.append(row_id)
+        return self.make_frame(rows, index)
+
+    def header_frame(self):
+        return self.make_frame(self.header_rows, range(len(self.header_rows)))
+
+    def make_frame(self, rows, index):
+        data = [[self.cell_value(value) for value in row] + [''] * (self.width - len(row)) for row in rows]
+        return pd.DataFrame(data, index=list(index), columns=range(self.width), dtype=object)
+
+    @staticmethod
+    def cell_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def reopen(self):
+        """
+        A copy of the index with its own handle on the file, so a worker thread can read
+        sections without sharing the workbook the Tk thread reads from.
+        """
+        other = copy.copy(self)
+        other.workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        other.sheet = other.workbook.worksheets[0]
+        return other
+
+    def close(self):
+        self.workbook.close()
+
+
+def write_workbook(df, file_path, task=None, room_capacities=None):
+    """
+    Writes the DataFrame to an Excel file row by row, blank cells are left empty.
+
+    The room capacities go in a Rooms sheet, so a workbook that had one keeps it.
+
+    The file is written next to the target first and only moved over it when done, so a
+    cancelled or failed save never leaves half a workbook behind.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for count, row in enumerate(df.itertuples(index=False)):
+        if task is not None and count % PROGRESS_EVERY == 0:
+            task.progress(count, len(df))
+        sheet.append([None if value == '' else value for value in row])
+    if room_capacities:
+        rooms = workbook.create_sheet("Rooms")
+        rooms.append(["Room", "Capacity"])
+        for room, capacity in sorted(room_capacities.items()):
+            rooms.append([room, capacity])
+
+    temp_path = f"{file_path}.saving"
+    try:
+        workbook.save(temp_path)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class Report:
+    """
+    Writes a report one line at a time, whatever its size only the current line is kept.
+
+    Like write_workbook the file is written next to the target and only moved over it
+    once it is complete. The subclasses write one format each, see REPORT_FORMATS.
+    """
+
+    def __init__(self, file_path, columns, title):
+        self.file_path = file_path
+        self.temp_path = f"{file_path}.saving"
+
+    def finish(self):
+        os.replace(self.temp_path, self.file_path)
+
+    def abort(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class CsvReport(Report):
+    def __init__(self, file_path, columns, title):
+        super().__init__(file_path, columns, title)
+        self.file = open(self.temp_path, "w", newline='', encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, line):
+        self.writer.writerow(line)
+
+    def finish(self):
+        self.file.close()
+        super().finish()
+
+    def abort(self):
+        self.file.close()
+        super().abort()
+
+
+class HtmlReport(Report):
+    def __init__(self, file_path, columns, title):
+        super().__init__(file_path, columns, title)
+        self.file = open(self.temp_path, "w", encoding="utf-8")
+        heading = "".join(f"<th>{html.escape(str(column))}</th>" for column in columns)
+        self.file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>\n"
+                        "<style>table {border-collapse: collapse} th, td {border: 1px solid #ccc; padding: 2px 6px}</style>\n"
+                        f"</head><body><h1>{html.escape(title)}</h1>\n<table><thead><tr>{heading}</tr></thead><tbody>\n")
+
+    def write(self, line):
+        self.file.write("<tr>" + "".join(f"<td>{html.escape(str(value))}</td>" for value in line) + "</tr>\n")
+
+    def finish(self):
+        self.file.write("</tbody></table></body></html>\n")
+        self.file.close()
+        super().finish()
+
+    def abort(self):
+        self.file.close()
+        super().abort()
+
+
+class XlsxReport(Report):
+    def __init__(self, file_path, columns, title):
+        super().__init__(file_path, columns, title)
+        self.workbook = openpyxl.Workbook(write_only=True)  # Rows go to a temporary file as they are added
+        self.sheet = self.workbook.create_sheet(title[:31] or "Report")
+        self.sheet.append(list(columns))
+
+    def write(self, line):
+        self.sheet.append(list(line))
+
+    def finish(self):
+        self.workbook.save(self.temp_path)
+        super().finish()
+
+    def abort(self):
+        # Until the workbook is saved the rows sit in openpyxl's own temporary file of the sheet
+        if not self.sheet.closed:
+            self.sheet.close()
+            self.sheet._writer.cleanup()
+        super().abort()
+
+
+REPORT_FORMATS = {".csv": CsvReport, ".html": HtmlReport, ".htm": HtmlReport, ".xlsx": XlsxReport}
+
+
+def export_report(file_path, columns, lines, task=None, title=''):
+    """
+    Writes the lines of a report (any iterable, e.g. a generator) to a CSV, HTML or XLSX
+    file picked by the extension, returns how many were written.
+    """
+    report_class = REPORT_FORMATS.get(os.path.splitext(file_path)[1].lower())
+    if report_class is None:
+        raise ValueError(f"Can't export to {os.path.basename(file_path)}, use .csv, .html or .xlsx.")
+    report = report_class(file_path, columns, title)
+    count = 0
+    try:
+        for line in lines:
+            if task is not None and count % PROGRESS_EVERY == 0:
+                task.progress(count)
+            report.write(line)
+            count += 1
+        report.finish()
+    finally:
+        report.abort()  # Nothing left to remove once finished
+    return count
+
+
+class StaleRowsError(ValueError):
+    """
+    Raised when an edit is pushed to a shared store but someone else changed the rows first.
+    """
+
+    def __init__(self, row_ids):
+        super().__init__(f"{len(row_ids)} of the schedules were changed by someone else in the meantime.")
+        self.row_ids = row_ids
+
+
+def encode_cell(value):
+    # For json.dumps, dates and times are tagged so they come back as the same type
+    if isinstance(value, (datetime, date, time)):
+        return {"$" + type(value).__name__: value.isoformat()}
+    if hasattr(value, "item"):
+        return value.item()  # numpy numbers
+    raise TypeError(f"Can't store {value!r}")
+
+
+def decode_cell(value):
+    if len(value) == 1:
+        (key, text), = value.items()
+        parse = {"$datetime": datetime, "$date": date, "$time": time}.get(key)
+        if parse is not None:
+            return parse.fromisoformat(text)
+    return value
+
+
+class StoreColleges:
+    """
+    Stands in for the CollegeIndex when the rows come from a ScheduleStore, they are all
+    read when the store is opened so there is nothing left to read later.
+    """
+
+    def __init__(self, file_path, sections, room_capacities):
+        self.file_path = file_path
+        self.sections = sections
+        self.room_capacities = room_capacities
+
+    def read_sections(self, indices, task=None):
+        return pd.DataFrame(dtype=object)
+
+    def reopen(self):
+        return self
+
+    def close(self):
+        pass
+
+
+class ScheduleStore:
+    """
+    A SQLite file several people edit the same schedule through, in WAL mode so readers
+    never wait for a writer.
+
+    Every row has a version that goes up with each change and the number of the change
+    that last touched it. An edit is pushed with the versions it was made on and is only
+    written if they are still current (compare and swap), otherwise StaleRowsError. pull()
+    loads just the rows changed since the last one, deleted rows are kept as tombstones
+    so the others find out about them too.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS rows (
+            row_id INTEGER PRIMARY KEY,
+            college INTEGER NOT NULL,  -- Index of its college section, -1 for the title rows
+            position REAL NOT NULL,  -- Sheet order within the college
+            version INTEGER NOT NULL,
+            changed INTEGER NOT NULL,  -- Number of the change that last touched it
+            deleted INTEGER NOT NULL DEFAULT 0,
+            cells TEXT NOT NULL  -- JSON list of the values
+        );
+        CREATE INDEX IF NOT EXISTS rows_changed ON rows (changed);
+        CREATE INDEX IF NOT EXISTS rows_position ON rows (college, position);
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # Autocommit, the transactions are started by hand so pushes can BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(file_path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+        self.versions = {}  # Row ID -> version of it this client has
+        self.last_change = 0  # Changes up to this one are in this client's model
+
+    @classmethod
+    def create(cls, file_path, model):
+        """
+        A new store holding every row of the model, which has to have all its colleges loaded.
+        """
+        store = cls(file_path)
+        if store.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]:
+            store.close()
+            raise ValueError(f"{file_path} already holds a schedule.")
+        colleges = model.colleges
+        meta = {
+            "sections": json.dumps([list(section) for section in colleges.sections]),
+            "room_capacities": json.dumps(colleges.room_capacities),
+            "next_row_id": str(model.next_row_id),
+            "change": "0",
+        }
+        rows = [
+            (int(row_id), model.row_college.get(row_id, -1), position, json.dumps(values, default=encode_cell))
+            for position, (row_id, values) in enumerate(zip(model.df.index, model.df.values.tolist()))
+        ]
+        with store.transaction():
+            store.connection.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+            store.connection.executemany("INSERT INTO rows VALUES (?, ?, ?, 1, 0, 0, ?)", rows)
+        return store
+
+    def transaction(self, mode="IMMEDIATE"):
+        return StoreTransaction(self.connection, mode)
+
+    def meta(self, key):
+        return self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def read(self):
+        """
+        (StoreColleges, DataFrame, row ID -> college) of the whole schedule, for ScheduleModel.set_store.
+        """
+        with self.transaction("DEFERRED"):  # One snapshot, a push in the meantime can't show up halfway
+            self.last_change = int(self.meta("change"))
+            sections = [CollegeSection(*section) for section in json.loads(self.meta("sections"))]
+            room_capacities = json.loads(self.meta("room_capacities"))
+            rows = self.connection.execute(
+                "SELECT row_id, college, version, cells FROM rows WHERE deleted = 0 ORDER BY college, position").fetchall()
+        values = [json.loads(cells, object_hook=decode_cell) for _, _, _, cells in rows]
+        width = max(len(row) for row in values)
+        df = pd.DataFrame([row + [''] * (width - len(row)) for row in values], index=[row[0] for row in rows], dtype=object)
+        self.versions = {row_id: version for row_id, _, version, _ in rows}
+        row_college = {row_id: college for row_id, college, _, _ in rows if college >= 0}
+        return StoreColleges(self.file_path, sections, room_capacities), df, row_college
+
+    def new_row_id(self):
+        with self.transaction():
+            row_id = int(self.meta("next_row_id"))
+            self.connection.execute("UPDATE meta SET value = ? WHERE key = 'next_row_id'", (str(row_id + 1),))
+        return row_id
+
+    def push(self, transaction):
+        """
+        Writes a validated ScheduleTransaction to the store before the model applies it.
+        """
+        df = transaction.model.df
+        connection = self.connection
+        with self.transaction():
+            # Compare: every row edited or deleted has to still be at the version the edit was made on,
+            # not the one the last pull brought in (row IDs from the DataFrame index are numpy ints,
+            # which sqlite3 would bind as blobs)
+            checked = [int(row_id) for row_id in list(transaction.updated) + list(transaction.deleted)]
+            current = dict(connection.execute(
+                f"SELECT row_id, version FROM rows WHERE deleted = 0 AND row_id IN ({','.join('?' * len(checked))})", checked))
+            base = {int(row_id): version for row_id, version in transaction.base_versions.items()}
+            stale = [row_id for row_id in checked if current.get(row_id) != base.get(row_id, self.versions.get(row_id))]
+            if stale:
+                raise StaleRowsError(stale)
+
+            # Swap
+            change = int(self.meta("change")) + 1
+            connection.execute("UPDATE meta SET value = ? WHERE key = 'change'", (str(change),))
+            for row_id, changes in transaction.updated.items():
+                values = df.loc[row_id].tolist()
+                for col, value in changes.items():
+                    values[col] = value
+                connection.execute("UPDATE rows SET cells = ?, version = version + 1, changed = ? WHERE row_id = ?",
+                                   (json.dumps(values, default=encode_cell), change, int(row_id)))
+            connection.executemany("UPDATE rows SET deleted = 1, version = version + 1, changed = ? WHERE row_id = ?",
+                                   [(change, int(row_id)) for row_id in transaction.deleted])
+            for row_id, values in transaction.inserted.items():
+                college, position = self.place_after(transaction.insert_after[row_id])
+                connection.execute("INSERT INTO rows VALUES (?, ?, ?, 1, ?, 0, ?)",
+                                   (int(row_id), college, position, change, json.dumps(values, default=encode_cell)))
+
+        # Our own change is in the model once it commits, the versions follow
+        for row_id in checked:
+            self.versions[row_id] = current[row_id] + 1
+        self.versions.update(dict.fromkeys(transaction.inserted, 1))
+
+    def place_after(self, anchor):
+        """
+        (college, position) of a row inserted below anchor, halfway to the next row.
+        """
+        connection = self.connection
+        row = connection.execute("SELECT college, position FROM rows WHERE row_id = ?", (None if anchor is None else int(anchor),)).fetchone()
+        if row is None:  # At the end of the last college
+            college, position = connection.execute("SELECT MAX(college), MAX(position) FROM rows").fetchone()
+            return college, position + 1
+        college, position = row
+        following = connection.execute("SELECT MIN(position) FROM rows WHERE college = ? AND position > ?", (college, position)).fetchone()[0]
+        return college, (position + following) / 2 if following is not None else position + 1
+
+    def pull(self, model):
+        """
+        Applies the rows other people changed since the last pull to the model, returns how many.
+        """
+        connection = self.connection
+        with self.transaction("DEFERRED"):
+            last_change = int(self.meta("change"))
+            rows = connection.execute(
+                "SELECT row_id, college, position, version, deleted, cells FROM rows WHERE changed > ? ORDER BY college, position",
+                (self.last_change,)).fetchall()
+            # The row above each new one, to put it in the same place
+            anchors = {row_id: connection.execute(
+                "SELECT row_id FROM rows WHERE college = ? AND position < ? AND deleted = 0 ORDER BY position DESC LIMIT 1",
+                (college, position)).fetchone() for row_id, college, position, _, deleted, _ in rows
+                if not deleted and row_id not in model.df.index}
+
+        transaction = model.transaction()
+        transaction.from_store = True
+        for row_id, _, _, version, deleted, cells in rows:
+            if self.versions.get(row_id) == version:
+                continue  # Our own change
+            if deleted:
+                if row_id in model.df.index:
+                    transaction.delete(row_id)
+                self.versions.pop(row_id, None)
+                continue
+            values = json.loads(cells, object_hook=decode_cell)
+            if row_id in model.df.index:
+                transaction.update(row_id, values)
+            else:
+                anchor = anchors[row_id][0] if anchors[row_id] else None
+                known = anchor in model.df.index or anchor in transaction.inserted
+                transaction.insert(values, after=anchor if known else None, row_id=row_id)
+            self.versions[row_id] = version
+        self.last_change = last_change
+        transaction.commit()
+        return len(transaction.inserted) + len(transaction.updated) + len(transaction.deleted)
+
+    def close(self):
+        self.connection.close()
+
+
+class StoreTransaction:
+    """
+    BEGIN ... COMMIT on a ScheduleStore connection, rolled back if the block raises.
+    """
+
+    def __init__(self, connection, mode):
+        self.connection = connection
+        self.mode = mode
+
+    def __enter__(self):
+        self.connection.execute(f"BEGIN {self.mode}")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+# Kinds of change events published by the model
+LOADED, INSERTED, UPDATED, DELETED, RESET = "loaded", "inserted", "updated", "deleted", "reset"
+
+# One changed row: before and after are the row values (None when the row did not or no longer exists),
+# remote when the change was pulled from a shared store instead of made here
+ChangeEvent = namedtuple("ChangeEvent", ["kind", "row_id", "before", "after", "remote"], defaults=(False,))
+
+
+class ScheduleModel:
+    """
+    The schedule DataFrame together with its row IDs and college sections.
+
+    Rows keep their ID (the index label) for as long as they exist, so the views can
+    refer to them. Every edit goes through a ScheduleTransaction. Subscribers get the
+    ChangeEvents of each committed transaction (or loaded college) as one batch, so the
+    derived views can update the changed rows instead of recomputing everything.
+    """
+
+    def __init__(self):
+        self.colleges = None
+        self.df = None
+        self.row_college = {}  # Row ID -> index of its college section
+        self.loaded_colleges = set()
+        self.next_row_id = HEADER_ROWS
+        self.store = None  # ScheduleStore the edits go through, None for a workbook
+        self.subscribers = []
+
+    def set_colleges(self, colleges):
+        """
+        Starts over with the college index of a newly opened file.
+        """
+        if self.colleges is not None:
+            self.colleges.close()
+        if self.store is not None:
+            self.store.close()
+        self.colleges = colleges
+        self.store = None
+        self.df = self.colleges.header_frame()
+        self.row_college = {}
+        self.loaded_colleges = set()
+        self.next_row_id = max(section.stop for section in self.colleges.sections) if self.colleges.sections else HEADER_ROWS
+        self.publish([ChangeEvent(RESET, None, None, None)])
+
+    def set_store(self, store, colleges, df, row_college):
+        """
+        Starts over with a shared store, every row was already read by store.read().
+        """
+        if self.colleges is not None:
+            self.colleges.close()
+        if self.store is not None and self.store is not store:
+            self.store.close()
+        self.colleges = colleges
+        self.store = store
+        self.df = df[df.index < HEADER_ROWS]
+        self.row_college = row_college
+        self.loaded_colleges = set(range(len(colleges.sections)))
+        self.publish([ChangeEvent(RESET, None, None, None)])
+        self.df = df
+        rows = df[df.index >= HEADER_ROWS]
+        self.publish([ChangeEvent(LOADED, row_id, None, values) for row_id, values in zip(rows.index, rows.values.tolist())])
+
+    def load_college(self, i):
+        """
+        Reads the rows of college i into the DataFrame if they are not loaded yet.
+        """
+        self.load_colleges([i])
+
+    def load_colleges(self, indices):
+        """
+        Reads the rows of the given colleges that are not loaded yet, as one batch of events.
+        """
+        indices = self.unloaded_colleges(indices)
+        if indices:
+            self.add_colleges(indices, self.colleges.read_sections(indices))
+
+    def unloaded_colleges(self, indices=None):
+        if self.colleges is None:
+            return []
+        if indices is None:
+            indices = range(len(self.colleges.sections))
+        return [i for i in indices if i not in self.loaded_colleges]
+
+    def add_colleges(self, indices, college_rows):
+        """
+        Puts the rows of colleges read from the workbook into the DataFrame.
+
+        The rows may have been read by a worker thread, colleges that were loaded in the
+        meantime are skipped.
+        """
+        indices = self.unloaded_colleges(indices)
+        if not indices:
+            return
+        ids = []
+        for i in indices:
+            section = self.colleges.sections[i]
+            ids.extend(range(section.start, section.stop))
+            self.row_college.update(dict.fromkeys(range(section.start, section.stop), i))
+        college_rows = college_rows[college_rows.index.isin(ids)]
+        self.loaded_colleges.update(indices)
+
+        # Keep the DataFrame in sheet order: header rows, then the colleges in order
+        self.df = pd.concat([self.df, college_rows])
+        order = pd.Series(self.df.index).map(self.row_college).fillna(-1).to_numpy()
+        self.df = self.df.iloc[order.argsort(kind="stable")]
+
+        self.publish([ChangeEvent(LOADED, row_id, None, values) for row_id, values in zip(college_rows.index, college_rows.values.tolist())])
+
+    def load_all_colleges(self):
+        if self.colleges is None:
+            return
+        self.load_colleges(range(len(self.colleges.sections)))
+
+    def college_rows(self, i):
+        """
+        Returns the loaded schedule rows of college i, without its header row.
+        """
+        in_college = self.df.index.map(lambda row_id: self.row_college.get(row_id) == i).to_numpy(dtype=bool)
+        return self.df[in_college & self.schedule_mask()]
+
+    def college_header_ids(self):
+        return [section.start for section in self.colleges.sections if section.name]
+
+    def schedule_mask(self):
+        """
+        Boolean mask over the DataFrame that is False for the title rows and college headers.
+        """
+        mask = ~self.df.index.isin(self.college_header_ids())
+        mask[:HEADER_ROWS] = False
+        return mask
+
+    def meetings(self):
+        """
+        The normalized meetings of every loaded schedule, see meetings_table.
+        """
+        slots = find_meeting_slots(self.df.iloc[3].tolist())
+        return meetings_table(self.df[self.schedule_mask()], slots)
+
+    def new_row_id(self):
+        if self.store is not None:
+            return self.store.new_row_id()  # Unique across everyone editing the store
+        row_id = self.next_row_id
+        self.next_row_id += 1
+        return row_id
+
+    def column_names(self):
+        return [str(name) for name in self.df.iloc[3].tolist()]
+
+    def column_index(self, name):
+        """
+        Finds a column by its name in row 4, ignoring case and surrounding spaces.
+        """
+        wanted = name.strip().casefold()
+        for col, column_name in enumerate(self.column_names()):
+            if column_name.strip().casefold() == wanted:
+                return col
+        raise ValueError(f"Unknown column: {name}")
+
+    def parse_assignments(self, text):
+        """
+        Parses "Column=value; Column=value" into a {column index: value} dict.
+        """
+        assignments = {}
+        for part in text.split(';'):
+            if not part.strip():
+                continue
+            if '=' not in part:
+                raise ValueError(f"Expected Column=value, got: {part.strip()}")
+            name, value = part.split('=', 1)
+            assignments[self.column_index(name)] = value.strip()
+        return assignments
+
+    def match_rows(self, criteria):
+        """
+        Returns the IDs of the loaded schedules whose columns equal all the given values.
+        """
+        mask = self.schedule_mask()
+        for col, value in criteria.items():
+            column = self.df[col].astype(str).str.strip().str.casefold()
+            mask &= (column == str(value).strip().casefold()).to_numpy()
+        return self.df.index[mask].tolist()
+
+    def snapshot(self):
+        """
+        A copy of the DataFrame for a worker thread, later edits to the model don't show up in it.
+        """
+        return self.df.copy()
+
+    def transaction(self, based_on=None):
+        """
+        A new ScheduleTransaction, based_on is the row_versions the edit was made on when that
+        was before now (like when a form was opened).
+        """
+        return ScheduleTransaction(self, based_on)
+
+    def row_versions(self, row_ids):
+        """
+        Row ID -> store version of the rows as they are in the model now, empty for a workbook.
+        """
+        if self.store is None:
+            return {}
+        return {row_id: self.store.versions.get(row_id) for row_id in row_ids}
+
+    def merge_transaction(self, groups):
+        """
+        A transaction that merges each group into one new row, see merge_rows.
+
+        groups is a list of (row IDs, host row ID). The merged row takes the place of the
+        host, next to its course code siblings, and the rows of the group are deleted.
+        """
+        merged_ids = set()
+        for row_ids, host in groups:
+            if len(row_ids) < 2 or host not in row_ids:
+                raise ValueError(f"A merge needs two or more schedules and one of them as the host ({row_ids}).")
+            if merged_ids & set(row_ids):
+                raise ValueError(f"Row {min(merged_ids & set(row_ids))} is in more than one merge.")
+            merged_ids.update(row_ids)
+
+        transaction = self.transaction()
+        for row_ids, host in groups:
+            rows = self.df.loc[row_ids].values.tolist()
+            host_values = rows[row_ids.index(host)]
+            merged = merge_rows(rows, row_ids.index(host))
+            # The rest is the host's as it is, a cell the merge doesn't touch doesn't stop it
+            changed = [col for col, (value, host_value) in enumerate(zip(merged, host_values)) if value != host_value]
+            transaction.insert(merged, after=host, checked=changed)
+            transaction.delete_many(row_ids)
+        return transaction
+
+    def subscribe(self, subscriber):
+        """
+        Registers a function that is called with the list of ChangeEvents of every change.
+        """
+        self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def publish(self, events):
+        if not events:
+            return
+        for subscriber in self.subscribers:
+            subscriber(events)
+
+
+class ScheduleTransaction:
+    """
+    A batch of edits to a ScheduleModel that is validated and committed as one change.
+
+    Used as a context manager, the edits are committed when the block exits without an
+    error. Validation errors are raised as a ValueError and nothing is changed. A commit
+    publishes one ChangeEvent per touched row.
+    """
+
+    def __init__(self, model, based_on=None):
+        self.model = model
+        self.base_versions = dict(based_on or {})  # Row ID -> store version the edit of it was made on
+        self.inserted = {}  # Row ID -> values of the new row
+        self.insert_after = {}  # Row ID -> row ID it goes below, None for the end
+        self.insert_checks = {}  # Row ID -> the columns of a new row to validate, when not all of them
+        self.updated = {}  # Row ID -> {column: new value}
+        self.deleted = set()
+        self.committed = False
+        self.from_store = False  # Changes pulled from the store, not pushed back to it
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def insert(self, values, after=None, row_id=None, checked=None):
+        """
+        Adds a new row below the row with ID after (or at the end) and returns its ID.
+
+        Every column of the new row is validated, or only the checked ones when it is
+        mostly a copy of a row already there (like a merged section).
+        """
+        width = len(self.model.df.columns)
+        if row_id is None:
+            row_id = self.model.new_row_id()
+        self.inserted[row_id] = (list(values) + [''] * width)[:max(width, len(values))]
+        self.insert_after[row_id] = after
+        if checked is not None:
+            self.insert_checks[row_id] = set(checked)
+        return row_id
+
+    def update(self, row_id, changes):
+        """
+        Changes some columns of a row, changes is a {column: value} dict or a full list of values.
+        """
+        if isinstance(changes, (list, tuple)):
+            changes = dict(enumerate(changes))
+        if row_id in self.inserted:
+            for col, value in changes.items():
+                self.inserted[row_id][col] = value
+            if row_id in self.insert_checks:
+                self.insert_checks[row_id].update(changes)
+        else:
+            self.note_version(row_id)
+            self.updated.setdefault(row_id, {}).update(changes)
+
+    def update_many(self, row_ids, changes):
+        for row_id in row_ids:
+            self.update(row_id, changes)
+
+    def delete(self, row_id):
+        if row_id in self.inserted:
+            del self.inserted[row_id]
+            del self.insert_after[row_id]
+            self.insert_checks.pop(row_id, None)
+        else:
+            self.note_version(row_id)
+            self.deleted.add(row_id)
+
+    def note_version(self, row_id):
+        # A row is edited as it is when first touched, unless the transaction was based on an earlier version
+        if self.model.store is not None and row_id not in self.base_versions:
+            self.base_versions[row_id] = self.model.store.versions.get(row_id)
+
+    def delete_many(self, row_ids):
+        for row_id in row_ids:
+            self.delete(row_id)
+
+    def validate(self):
+        """
+        Returns a list of problems with the batch, checked against the current DataFrame.
+        """
+        df = self.model.df
+        width = len(df.columns)
+        slots = find_meeting_slots(self.model.column_names())
+        errors = []
+
+        if self.deleted:
+            deleted = list(self.deleted)
+            missing = [row_id for row_id, exists in zip(deleted, pd.Index(deleted).isin(df.index)) if not exists]
+            errors.extend(f"Row {row_id} does not exist." for row_id in missing)
+            if min(deleted) < HEADER_ROWS:
+                errors.append("The title rows cannot be deleted.")
+
+        for row_id, values in self.inserted.items():
+            if len(values) > width:
+                errors.append(f"The new row has {len(values)} values, the sheet only has {width} columns.")
+            else:
+                errors.extend(self.check_values(values, self.insert_checks.get(row_id, range(width)), slots))
+
+        for row_id, changes in self.updated.items():
+            if row_id in self.deleted:
+                errors.append(f"Row {row_id} is both edited and deleted.")
+                continue
+            if row_id not in df.index:
+                errors.append(f"Row {row_id} does not exist.")
+                continue
+            if row_id < HEADER_ROWS:
+                errors.append("The title rows cannot be edited.")
+                continue
+            unknown = [col for col in changes if col not in df.columns]
+            if unknown:
+                errors.append(f"Row {row_id} has no column {unknown[0]}.")
+                continue
+            values = df.loc[row_id].tolist()
+            for col, value in changes.items():
+                values[col] = value
+            errors.extend(self.check_values(values, changes, slots))
+
+        return errors
+
+    @staticmethod
+    def check_values(values, changed_columns, slots):
+        """
+        Checks the times of every meeting slot (see find_meeting_slots) and the enrollment
+        cap of a row, only for the columns that changed.
+        """
+        errors = []
+        time_columns = {col for _, begin, end, _ in slots for col in (begin, end)}
+        for col in changed_columns:
+            value = values[col]
+            if col in time_columns and value != '' and to_minutes(value) is None:
+                errors.append(f"{value} is not a time, use HHMM like 1530.")
+            elif col == ENRL_CAP and value != '' and not str(value).strip().isdigit():
+                errors.append(f"{value} is not a valid enrollment cap.")
+
+        for _, begin, end, _ in slots:
+            if begin in changed_columns or end in changed_columns:
+                begin_minutes, end_minutes = to_minutes(values[begin]), to_minutes(values[end])
+                if begin_minutes is not None and end_minutes is not None and begin_minutes >= end_minutes:
+                    errors.append(f"The class has to end after it begins ({values[begin]}-{values[end]}).")
+        return errors
+
+    def commit(self):
+        if self.committed:
+            return
+        errors = self.validate() if not self.from_store else []  # The store only holds edits that passed already
+        if errors:
+            raise ValueError("\n".join(errors))
+        if self.model.store is not None and not self.from_store:
+            self.model.store.push(self)  # StaleRowsError if someone else got to the rows first
+
+        model = self.model
+        df = model.df
+        original_ids = df.index
+        changed_ids = list(self.deleted) + list(self.updated)
+        before = dict(zip(changed_ids, df.loc[changed_ids].values.tolist())) if changed_ids else {}
+
+        if self.deleted:
+            # One boolean mask over the index removes every deleted row at once
+            df = df[~df.index.isin(list(self.deleted))]
+
+        # Apply the updates one column at a time
+        by_column = {}
+        for row_id, changes in self.updated.items():
+            for col, value in changes.items():
+                by_column.setdefault(col, {})[row_id] = value
+        for col, column_changes in by_column.items():
+            df.loc[list(column_changes), col] = list(column_changes.values())
+
+        if self.inserted:
+            new_rows = pd.DataFrame(list(self.inserted.values()), index=list(self.inserted), columns=df.columns, dtype=object)
+
+            # Each new row goes below its anchor row and takes the anchor's college, an anchor
+            # deleted in this same transaction still holds its place (a merge replaces its rows)
+            below = {}
+            for row_id, after in self.insert_after.items():
+                below.setdefault(after, []).append(row_id)
+            last_college = model.row_college.get(original_ids[-1]) if len(original_ids) else None
+            order = []
+
+            def place(row_id, college):
+                if row_id not in self.deleted:
+                    order.append(row_id)
+                for new_id in below.pop(row_id, []):
+                    model.row_college[new_id] = college
+                    place(new_id, college)
+
+            for row_id in original_ids:
+                place(row_id, model.row_college.get(row_id))
+            for new_ids in list(below.values()):
+                for new_id in new_ids:
+                    model.row_college[new_id] = last_college
+                    place(new_id, last_college)
+
+            df = pd.concat([df, new_rows]).loc[order]
+
+        for row_id in self.deleted:
+            model.row_college.pop(row_id, None)
+        model.df = df
+        self.committed = True
+
+        remote = self.from_store
+        events = [ChangeEvent(DELETED, row_id, before[row_id], None, remote) for row_id in self.deleted]
+        if self.updated:
+            updated_ids = list(self.updated)
+            after = df.loc[updated_ids].values.tolist()
+            events.extend(ChangeEvent(UPDATED, row_id, before[row_id], values, remote) for row_id, values in zip(updated_ids, after))
+        events.extend(ChangeEvent(INSERTED, row_id, None, values, remote) for row_id, values in self.inserted.items())
+        model.publish(events)
+
+
+class ConflictIndex:
+    """
+    Room and faculty conflicts, kept up to date from the model's change events.
+
+    Meetings are bucketed by (kind, value, day). A change removes the changed rows and
+    only checks their new meetings against the buckets they land in, so an edit never
+    rescans the whole sheet.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rebuild()
+        model.subscribe(self.on_change)
+
+    def rebuild(self):
+        self.buckets = {}  # (kind, value, day) -> {(row_id, meeting): (begin, end)}
+        self.row_buckets = {}  # Row ID -> bucket keys holding its meetings
+        self.pairs = {}  # (kind, row_id_a, row_id_b) -> conflict record
+        self.row_pairs = {}  # Row ID -> keys of the pairs it is in
+        if self.model.df is not None:
+            self.add_rows(self.model.df)
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.rebuild()
+            return
+
+        for event in events:
+            self.remove_row(event.row_id)
+        rows = {event.row_id: event.after for event in events if event.after is not None}
+        if rows:
+            self.add_rows(pd.DataFrame(list(rows.values()), index=list(rows), columns=self.model.df.columns, dtype=object))
+
+    def remove_row(self, row_id):
+        for key in self.row_buckets.pop(row_id, ()):
+            bucket = self.buckets[key]
+            for meeting_key in [meeting_key for meeting_key in bucket if meeting_key[0] == row_id]:
+                del bucket[meeting_key]
+            if not bucket:
+                del self.buckets[key]
+        for pair in self.row_pairs.pop(row_id, ()):
+            self.pairs.pop(pair, None)
+            other = pair[2] if pair[1] == row_id else pair[1]
+            other_pairs = self.row_pairs.get(other)
+            if other_pairs is not None:
+                other_pairs.discard(pair)
+                if not other_pairs:
+                    del self.row_pairs[other]
+
+    def add_rows(self, rows):
+        rows = rows[(rows.index >= HEADER_ROWS) & ~rows.index.isin(self.model.college_header_ids())]
+        slots = find_meeting_slots(self.model.column_names())
+        new_keys = conflict_keys(meetings_table(rows, slots))
+        if new_keys.empty:
+            return
+
+        # The new meetings are checked against each other and the meetings already in their buckets
+        touched = set(zip(new_keys["kind"], new_keys["value"], new_keys["day"]))
+        existing = [
+            (kind, value, row_id, meeting, day, begin, end)
+            for kind, value, day in touched
+            for (row_id, meeting), (begin, end) in self.buckets.get((kind, value, day), {}).items()
+        ]
+        candidates = pd.concat([new_keys, pd.DataFrame(existing, columns=new_keys.columns)], ignore_index=True)
+        for pair in find_overlaps(candidates).to_dict("records"):
+            key = (pair["kind"], pair["row_id_a"], pair["row_id_b"])
+            if key not in self.pairs:
+                self.pairs[key] = pair
+                self.row_pairs.setdefault(pair["row_id_a"], set()).add(key)
+                self.row_pairs.setdefault(pair["row_id_b"], set()).add(key)
+
+        for kind, value, row_id, meeting, day, begin, end in new_keys.itertuples(index=False):
+            self.buckets.setdefault((kind, value, day), {})[(row_id, meeting)] = (begin, end)
+            self.row_buckets.setdefault(row_id, set()).add((kind, value, day))
+
+    def conflicts(self):
+        """
+        All current conflicts in the same shape as find_conflicts.
+        """
+        conflicts = pd.DataFrame(list(self.pairs.values()))
+        if conflicts.empty:
+            return conflicts
+        return conflicts.sort_values(["row_id_a", "row_id_b"], ignore_index=True)
+
+    def row_conflicts(self, row_id):
+        return [self.pairs[key] for key in self.row_pairs.get(row_id, ())]
+
+    def values(self, kind):
+        """
+        The sorted rooms or faculty members (kind Room or Faculty) with meetings, shared rooms are never bucketed.
+        """
+        return sorted({value for bucket_kind, value, _ in self.buckets if bucket_kind == kind})
+
+
+class SearchIndex:
+    """
+    Inverted indexes from the tokens of each filter field to row IDs, kept up to date from change events.
+
+    A query like "room:LAG-COVCA day:T faculty:tumale" intersects the row sets of its
+    terms. A term matches every token of its field that starts with it, found by bisecting
+    the sorted tokens, and a term without a field is looked up in all of them.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+        model.subscribe(self.on_change)
+
+    def clear(self):
+        self.tokens = {field: {} for field in SEARCH_FIELDS}  # Field -> token -> row IDs
+        self.sorted_tokens = {}  # Field -> sorted tokens, dropped when a token is added or removed
+        self.row_tokens = {}  # Row ID -> (field, token) pairs it was indexed under
+        self.slots = None
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.clear()
+            return
+        college_headers = set(self.model.college_header_ids())
+        for event in events:
+            self.remove_row(event.row_id)
+            if event.after is not None and event.row_id >= HEADER_ROWS and event.row_id not in college_headers:
+                self.add_row(event.row_id, event.after)
+
+    def row_search_tokens(self, values):
+        if self.slots is None:
+            self.slots = find_meeting_slots(self.model.column_names())
+        tokens = set()
+        for day, begin, end, room in self.slots:
+            room_name = str(values[room]).strip().upper()
+            if room_name:
+                tokens.add(("room", room_name))
+            tokens.update(("day", letter) for letter in day_letters(values[day]))
+
+        faculty = str(values[FACULTY]).strip().upper()
+        if faculty:
+            tokens.add(("faculty", faculty))
+            tokens.update(("faculty", word) for word in re.findall(r"[A-Z0-9]+", faculty))
+        for field, col in (("code", COURSE_CODE), ("offered", OFFERED_TO)):
+            value = str(values[col]).strip().upper()
+            if value:
+                tokens.add((field, value))
+        tokens.update(("title", word) for word in re.findall(r"[A-Z0-9]+", str(values[COURSE_TITLE]).upper()))
+
+        tokens.update(("takers", block) for block in takers_blocks(values[TAKERS]))
+        tokens.update(("takers", word) for word in re.findall(r"[A-Z0-9-]+", str(values[TAKERS]).upper()))  # takers:ccs too
+        return tokens
+
+    def add_row(self, row_id, values):
+        tokens = self.row_search_tokens(values)
+        self.row_tokens[row_id] = tokens
+        for field, token in tokens:
+            ids = self.tokens[field].get(token)
+            if ids is None:
+                ids = self.tokens[field][token] = set()
+                self.sorted_tokens.pop(field, None)
+            ids.add(row_id)
+
+    def remove_row(self, row_id):
+        for field, token in self.row_tokens.pop(row_id, ()):
+            ids = self.tokens[field][token]
+            ids.discard(row_id)
+            if not ids:
+                del self.tokens[field][token]
+                self.sorted_tokens.pop(field, None)
+
+    def match(self, field, value):
+        """
+        Row IDs with a token in the field (or any field) that starts with value.
+        """
+        ids = set()
+        for field in ([field] if field else SEARCH_FIELDS):
+            field_tokens = self.tokens[field]
+            if field == "day":
+                for letter in day_letters(value):
+                    ids |= field_tokens.get(letter, set())
+                continue
+            if field not in self.sorted_tokens:
+                self.sorted_tokens[field] = sorted(field_tokens)
+            tokens = self.sorted_tokens[field]
+            position = bisect_left(tokens, value)
+            while position < len(tokens) and tokens[position].startswith(value):
+                ids |= field_tokens[tokens[position]]
+                position += 1
+        return ids
+
+    def query_words(self, text):
+        """
+        (field or None for any field, word) of every word of a query.
+        """
+        try:
+            terms = shlex.split(text)
+        except ValueError:
+            terms = text.split()
+
+        words = []
+        for term in terms:
+            field, separator, value = term.partition(':')
+            field = SEARCH_ALIASES.get(field.casefold(), field.casefold())
+            if not separator or field not in SEARCH_FIELDS:
+                field, value = None, term
+            # Quoted values with spaces ("de ramos") need every word to match
+            words.extend((field, word) for word in value.upper().split())
+        return words
+
+    def query(self, text):
+        """
+        Row IDs matching every term of the query, None if the query has no terms.
+        """
+        result = None
+        for field, word in self.query_words(text):
+            ids = self.match(field, word)
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def matching(self, text, row_ids):
+        """
+        The given rows that match the query, each checked against its own tokens only.
+
+        Keeps a filter up to date after an edit without running the query over the sheet.
+        """
+        words = self.query_words(text)
+
+        def matches(tokens, field, word):
+            days = set(day_letters(word))
+            return any(token in days if token_field == "day" else token.startswith(word)
+                       for token_field, token in tokens if field is None or token_field == field)
+
+        return {row_id for row_id in row_ids
+                if all(matches(self.row_tokens.get(row_id, ()), field, word) for field, word in words)}
+
+
+class SortKeys:
+    """
+    Typed sort keys per column, cached and kept up to date from the change events.
+
+    Times sort as minutes, days in week order, numbers as numbers and everything else
+    case-folded. A column's keys are computed the first time it is sorted, after that an
+    edit only marks the cells that changed as dirty and the next sort recomputes those.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.keys = {}  # Column -> Series of sort keys indexed by row ID
+        self.dirty = {}  # Column -> row IDs whose key is out of date
+        model.subscribe(self.on_change)
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.keys.clear()
+            self.dirty.clear()
+            return
+        for event in events:
+            for col, dirty in self.dirty.items():
+                if event.before is None or event.after is None or event.before[col] != event.after[col]:
+                    dirty.add(event.row_id)
+
+    def column_keys(self, col):
+        """
+        The sort keys of every loaded schedule in column col, blanks and bad values are NaN.
+        """
+        df = self.model.df
+        if col not in self.keys:
+            self.keys[col] = self.typed_keys(col, df.loc[self.model.schedule_mask(), col])
+            self.dirty[col] = set()
+        elif self.dirty[col]:
+            # Deleted rows are dropped, changed and new rows get their key recomputed
+            dirty = pd.Index(list(self.dirty[col]))
+            keys = self.keys[col].drop(dirty, errors="ignore")
+            self.keys[col] = pd.concat([keys, self.typed_keys(col, df.loc[dirty[dirty.isin(df.index)], col])])
+            self.dirty[col] = set()
+        return self.keys[col]
+
+    def typed_keys(self, col, values):
+        slots = find_meeting_slots(self.model.column_names())
+        if any(col in (begin, end) for _, begin, end, _ in slots):
+            return times_to_minutes(values)
+        if any(col == day for day, _, _, _ in slots):
+            letters = values.map(lambda value: day_letters(value)[:1])
+            return letters.map(lambda letter: DAY_LETTERS.index(letter) if letter else None).astype(float)
+        if col == ENRL_CAP or "cap" in self.model.column_names()[col].casefold():
+            return pd.to_numeric(values.map(lambda value: str(value).strip()), errors="coerce")
+        text = values.astype(str).str.strip().str.casefold()
+        return text.where(text != '')
+
+
+class PrefixTrie:
+    """
+    Distinct values by prefix, ignoring case. Values are counted, so a value stays until
+    the last row holding it is gone.
+    """
+
+    def __init__(self):
+        self.root = {}  # Letter -> child node, the None key holds {value: count} of values ending here
+
+    def add(self, value, count=1):
+        node = self.root
+        for letter in value.casefold():
+            node = node.setdefault(letter, {})
+        values = node.setdefault(None, {})
+        values[value] = values.get(value, 0) + count
+
+    def remove(self, value):
+        path = [self.root]
+        for letter in value.casefold():
+            node = path[-1].get(letter)
+            if node is None:
+                return
+            path.append(node)
+        values = path[-1].get(None, {})
+        if value not in values:
+            return
+        values[value] -= 1
+        if values[value] > 0:
+            return
+        del values[value]
+        if not values:
+            del path[-1][None]
+        # Drop the nodes that lead nowhere anymore
+        letters = value.casefold()
+        for depth in range(len(letters), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][letters[depth - 1]]
+
+    def complete(self, prefix, limit=10):
+        """
+        Up to limit values starting with prefix, in alphabetical order.
+        """
+        node = self.root
+        for letter in prefix.casefold():
+            node = node.get(letter)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            found.extend(sorted(node.get(None, ())))
+            stack.extend(node[letter] for letter in sorted((key for key in node if key is not None), reverse=True))
+        return found[:limit]
+
+
+class ValueIndex:
+    """
+    A PrefixTrie of the distinct values of each column, for autocompleting the forms.
+
+    A column's trie is built the first time it is asked for and then kept up to date from
+    the change events, so a new faculty name can be picked as soon as it is saved.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.tries = {}  # Column -> PrefixTrie
+        model.subscribe(self.on_change)
+
+    @staticmethod
+    def cell_text(value):
+        return str(value).strip()
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.tries.clear()
+            return
+        college_headers = set(self.model.college_header_ids())
+        for event in events:
+            if event.row_id < HEADER_ROWS or event.row_id in college_headers:
+                continue
+            for col, trie in self.tries.items():
+                before = self.cell_text(event.before[col]) if event.before is not None else ''
+                after = self.cell_text(event.after[col]) if event.after is not None else ''
+                if before == after:
+                    continue
+                if before:
+                    trie.remove(before)
+                if after:
+                    trie.add(after)
+
+    def trie(self, col):
+        if col not in self.tries:
+            trie = PrefixTrie()
+            values = self.model.df.loc[self.model.schedule_mask(), col].map(self.cell_text)
+            for value, count in values[values != ''].value_counts().items():
+                trie.add(value, count)
+            self.tries[col] = trie
+        return self.tries[col]
+
+    def complete(self, col, prefix, limit=10):
+        return self.trie(col).complete(prefix.strip(), limit)
+
+
+class RoomCapacities:
+    """
+    How many students fit in each room.
+
+    A Rooms sheet in the workbook has the final say. Rooms it doesn't list hold the
+    biggest Enrl Cap the schedule already puts in them, kept up to date from the change
+    events (counted, so deleting the biggest section lowers it again).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+        model.subscribe(self.on_change)
+
+    def clear(self):
+        self.caps = {}  # Room -> {Enrl Cap: number of rows}
+        self.row_caps = {}  # Row ID -> (rooms, Enrl Cap) it was counted under
+        self.slots = None
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.clear()
+            return
+        college_headers = set(self.model.college_header_ids())
+        for event in events:
+            self.remove_row(event.row_id)
+            if event.after is not None and event.row_id >= HEADER_ROWS and event.row_id not in college_headers:
+                self.add_row(event.row_id, event.after)
+
+    def add_row(self, row_id, values):
+        cap = cap_number(values[ENRL_CAP])
+        if cap is None:
+            return
+        if self.slots is None:
+            self.slots = find_meeting_slots(self.model.column_names())
+        rooms = {str(values[room]).strip().upper() for _, _, _, room in self.slots} - {''}
+        for room in rooms:
+            counts = self.caps.setdefault(room, {})
+            counts[cap] = counts.get(cap, 0) + 1
+        self.row_caps[row_id] = (rooms, cap)
+
+    def remove_row(self, row_id):
+        rooms, cap = self.row_caps.pop(row_id, ((), None))
+        for room in rooms:
+            counts = self.caps[room]
+            counts[cap] -= 1
+            if not counts[cap]:
+                del counts[cap]
+
+    def capacity(self, room):
+        """
+        The capacity of the room, None if nothing is known about it.
+        """
+        declared = self.model.colleges.room_capacities if self.model.colleges is not None else {}
+        if room in declared:
+            return declared[room]
+        counts = self.caps.get(room)
+        return max(counts) if counts else None
+
+
+class TakersIndex:
+    """
+    Takers block -> the sections it takes, kept up to date from the change events.
+
+    Answers "where does block X meet?" without scanning the sheet. The meetings of each
+    row are worked out the first time they are asked for and dropped when the row changes.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+        model.subscribe(self.on_change)
+
+    def clear(self):
+        self.sections = {}  # Block -> row IDs of the sections it takes
+        self.row_entries = {}  # Row ID -> its TakersEntry tuple
+        self.row_meetings = {}  # Row ID -> row_meetings of the rows looked at so far
+        self.slots = None
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.clear()
+            return
+        college_headers = set(self.model.college_header_ids())
+        for event in events:
+            self.remove_row(event.row_id)
+            if event.after is not None and event.row_id >= HEADER_ROWS and event.row_id not in college_headers:
+                self.add_row(event.row_id, event.after)
+
+    def add_row(self, row_id, values):
+        entries = parse_takers(values[TAKERS])
+        if not entries:
+            return
+        self.row_entries[row_id] = entries
+        for entry in entries:
+            self.sections.setdefault(entry.block, set()).add(row_id)
+
+    def remove_row(self, row_id):
+        self.row_meetings.pop(row_id, None)
+        for entry in self.row_entries.pop(row_id, ()):
+            row_ids = self.sections[entry.block]
+            row_ids.discard(row_id)
+            if not row_ids:
+                del self.sections[entry.block]
+
+    def blocks(self):
+        return sorted(self.sections)
+
+    def entries(self, row_id):
+        return self.row_entries.get(row_id, ())
+
+    def meetings(self, block):
+        """
+        (row ID, day, begin, end, room) of every meeting of the block's sections, in row order.
+        """
+        row_ids = sorted(self.sections.get(block, ()))
+        missing = [row_id for row_id in row_ids if row_id not in self.row_meetings]
+        if missing:
+            if self.slots is None:
+                self.slots = find_meeting_slots(self.model.column_names())
+            for row_id, values in zip(missing, self.model.df.loc[missing].values.tolist()):
+                self.row_meetings[row_id] = row_meetings(values, self.slots)
+        return [(row_id, day, begin, end, room)
+                for row_id in row_ids for _, day, begin, end, room in self.row_meetings[row_id]]
+
+
+class ScheduleStats:
+    """
+    Seats per course, college and Offered To, contact hours per faculty and room use.
+
+    Each row's share (its seats, and the minutes of its meetings per faculty and room) is
+    kept, so a change subtracts the old shares of its rows and adds the new ones, grouped
+    with pandas per batch of events. The totals are built the first time they are asked
+    for, like the ValueIndex tries, and only kept up to date after that.
+    """
+
+    SEAT_FIELDS = ("course", "college", "offered")
+
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+        model.subscribe(self.on_change)
+
+    def clear(self):
+        self.ready = False
+        self.totals = {field: {} for field in self.SEAT_FIELDS + ("faculty", "room")}  # Field -> key -> (total, count)
+        self.row_seats = {}  # Row ID -> (course, college, offered, seats)
+        self.row_minutes = {}  # Row ID -> (faculty, room, minutes) of each meeting day
+        self.slots = None
+
+    def on_change(self, events):
+        if any(event.kind == RESET for event in events):
+            self.clear()
+            return
+        if not self.ready:
+            return
+        self.remove_rows([event.row_id for event in events])
+        rows = {event.row_id: event.after for event in events if event.after is not None}
+        if rows:
+            self.add_rows(pd.DataFrame(list(rows.values()), index=list(rows), columns=self.model.df.columns, dtype=object))
+
+    def build(self):
+        if not self.ready:
+            self.ready = True
+            self.add_rows(self.model.df)
+
+    @staticmethod
+    def add_grouped(totals, frame, key, value, sign):
+        if frame.empty:
+            return
+        for name, total, count in frame.groupby(key)[value].agg(["sum", "count"]).itertuples():
+            old_total, old_count = totals.get(name, (0, 0))
+            if old_count + sign * count:
+                totals[name] = (old_total + sign * total, old_count + sign * count)
+            else:
+                totals.pop(name, None)
+
+    def apply(self, seats, minutes, sign):
+        for field in self.SEAT_FIELDS:
+            self.add_grouped(self.totals[field], seats[seats[field] != ''], field, "seats", sign)
+        self.add_grouped(self.totals["faculty"], minutes[~minutes["faculty"].isin({'', 'TBA'})], "faculty", "minutes", sign)
+        self.add_grouped(self.totals["room"], minutes[~minutes["room"].map(is_shared_room).astype(bool)], "room", "minutes", sign)
+
+    def add_rows(self, rows):
+        rows = rows[(rows.index >= HEADER_ROWS) & ~rows.index.isin(self.model.college_header_ids())]
+        if rows.empty:
+            return
+        if self.slots is None:
+            self.slots = find_meeting_slots(self.model.column_names())
+        names = [section.name for section in self.model.colleges.sections] if self.model.colleges is not None else []
+        colleges = pd.Series(rows.index).map(self.model.row_college).map(lambda i: names[int(i)] if i == i and i < len(names) else '')
+        seats = pd.DataFrame({
+            "course": rows[COURSE_CODE].astype(str).str.strip().str.upper().to_numpy(),
+            "college": colleges.to_numpy(),
+            "offered": rows[OFFERED_TO].astype(str).str.strip().str.upper().to_numpy(),
+            "seats": pd.to_numeric(rows[ENRL_CAP].astype(str).str.strip(), errors="coerce").fillna(0).to_numpy(),
+        }, index=rows.index)
+        meetings = meetings_table(rows, self.slots)
+        minutes = pd.DataFrame({
+            "faculty": meetings["faculty"], "room": meetings["room"], "minutes": meetings["end"] - meetings["begin"],
+        })
+        self.apply(seats, minutes, 1)
+
+        self.row_seats.update(zip(seats.index, seats.itertuples(index=False, name=None)))
+        for row_id, record in zip(meetings["row_id"], minutes.itertuples(index=False, name=None)):
+            self.row_minutes.setdefault(row_id, []).append(record)
+
+    def remove_rows(self, row_ids):
+        seats = [self.row_seats.pop(row_id) for row_id in row_ids if row_id in self.row_seats]
+        minutes = [record for row_id in row_ids for record in self.row_minutes.pop(row_id, ())]
+        self.apply(pd.DataFrame(seats, columns=["course", "college", "offered", "seats"]),
+                   pd.DataFrame(minutes, columns=["faculty", "room", "minutes"]), -1)
+
+    def seats(self, field):
+        """
+        (name, sections, seats) per course, college or Offered To.
+        """
+        self.build()
+        return [(name, count, int(total)) for name, (total, count) in sorted(self.totals[field].items())]
+
+    def faculty_hours(self):
+        """
+        (faculty, meetings per week, contact hours per week).
+        """
+        self.build()
+        return [(name, count, round(total / 60, 1)) for name, (total, count) in sorted(self.totals["faculty"].items())]
+
+    def room_use(self):
+        """
+        (room, hours booked per week, % of ROOM_WEEK_MINUTES).
+        """
+        self.build()
+        return [(name, round(total / 60, 1), round(100 * total / ROOM_WEEK_MINUTES, 1))
+                for name, (total, count) in sorted(self.totals["room"].items())]
+
+
+# One way to merge a group of sections: keep the host's time and room, problems lists why it doesn't fit
+MergeOption = namedtuple("MergeOption", ["host", "problems"])
+
+
+def merge_rows(rows, host):
+    """
+    The values of a merged section: the host's course, faculty and meetings, everyone's
+    takers (headcounts of the same block added up, the remarks after them) and the Enrl
+    Caps added up. host is the position of the host in rows.
+    """
+    merged = list(rows[host])
+    texts = [str(row[TAKERS]).strip() for row in rows]
+    entries = merge_takers(parse_takers(text) for text in texts)  # A block in several sections is listed once, with its students added up
+    remarks = " + ".join(dict.fromkeys(remark for remark in map(takers_remarks, texts) if remark))
+    merged[TAKERS] = " ".join(part for part in (format_takers(entries), remarks) if part)
+    merged[ENRL_CAP] = sum(cap_number(row[ENRL_CAP]) or 0 for row in rows)
+    return merged
+
+
+class MergeChecker:
+    """
+    Checks whether a group of sections can become one section, for each of their times.
+
+    The merged section keeps the host's meetings, rooms and faculty. It has to fit the
+    rooms and must not clash with any section outside the group, in the rooms, for the
+    faculty (both from the conflict index) or for any of the takers blocks it now holds
+    (from the takers index).
+    These are lookups in the indexes plus the meetings of a few rows, which are cached,
+    so a plan of hundreds of merges is checked at once. The meetings of each takers block
+    are sorted by day and begin time the first time a merge needs them, and kept until
+    the next change.
+    """
+
+    def __init__(self, model, conflict_index, takers_index, room_capacities):
+        self.model = model
+        self.conflict_index = conflict_index
+        self.takers_index = takers_index
+        self.room_capacities = room_capacities
+        self.rows = {}  # Row ID -> (values, row_meetings) of the rows looked at so far
+        self.block_days = {}  # Takers block -> day -> (begins, (begin, end, row ID) sorted, longest meeting)
+        self.labels = None  # Row ID -> "CODE SECT", built the first time a problem names a section
+        model.subscribe(self.on_change)
+
+    def on_change(self, events):
+        self.block_days.clear()
+        if any(event.kind == RESET for event in events):
+            self.rows.clear()
+            self.labels = None
+            return
+        for event in events:
+            self.rows.pop(event.row_id, None)
+            if self.labels is not None:
+                if event.after is None:
+                    self.labels.pop(event.row_id, None)
+                else:
+                    self.labels[event.row_id] = f"{event.after[COURSE_CODE]} {event.after[SECT]}".strip()
+
+    def row_info(self, row_ids):
+        missing = [row_id for row_id in row_ids if row_id not in self.rows]
+        if missing:
+            slots = find_meeting_slots(self.model.column_names())
+            for row_id, values in zip(missing, self.model.df.loc[missing].values.tolist()):
+                self.rows[row_id] = (values, row_meetings(values, slots))
+        return [self.rows[row_id] for row_id in row_ids]
+
+    def label(self, row_id):
+        if self.labels is None:
+            df = self.model.df
+            self.labels = dict(zip(df.index, (df[COURSE_CODE].astype(str) + " " + df[SECT].astype(str)).str.strip()))
+        return self.labels.get(row_id, '')
+
+    def block_meetings(self, block, day):
+        days = self.block_days.get(block)
+        if days is None:
+            days = {}
+            for row_id, meeting_day, begin, end, _ in self.takers_index.meetings(block):
+                days.setdefault(meeting_day, []).append((begin, end, row_id))
+            for meeting_day, meetings in days.items():
+                meetings.sort()
+                days[meeting_day] = ([meeting[0] for meeting in meetings], meetings, max(end - begin for begin, end, _ in meetings))
+            self.block_days[block] = days
+        return days.get(day)
+
+    def block_clash(self, block, group, meetings):
+        """
+        A section outside the group that the block has at the same time as one of the meetings, or None.
+        """
+        for _, day, begin, end, _ in meetings:
+            found = self.block_meetings(block, day)
+            if found is None:
+                continue
+            begins, block_meetings, longest = found
+            # Only the meetings beginning less than the longest one before it can still be going on
+            for other_begin, other_end, other in block_meetings[bisect_left(begins, begin - longest):bisect_left(begins, end)]:
+                if other_end > begin and other not in group:
+                    return other
+        return None
+
+    def options(self, row_ids):
+        """
+        A MergeOption per section of the group, the ones without problems first.
+        """
+        options = [MergeOption(host, self.problems(row_ids, host)) for host in row_ids]
+        return sorted(options, key=lambda option: len(option.problems))
+
+    def problems(self, row_ids, host):
+        group = set(row_ids)
+        rows = self.row_info(row_ids)
+        total = sum(cap_number(values[ENRL_CAP]) or 0 for values, _ in rows)
+        meetings = rows[row_ids.index(host)][1]
+        problems = []
+
+        for room in sorted({meeting[4] for meeting in meetings if not is_shared_room(meeting[4])}):
+            capacity = self.room_capacities.capacity(room)
+            if capacity is not None and total > capacity:
+                problems.append(f"{room} holds {capacity}, the merged section has {total}")
+
+        # The host's own room and faculty clashes, unless they are with a section being merged
+        for pair in self.conflict_index.row_conflicts(host):
+            other = pair["row_id_b"] if pair["row_id_a"] == host else pair["row_id_a"]
+            if other not in group:
+                problems.append(f"{pair['kind']} {pair['value']} is also used by {self.label(other)}")
+
+        # Every takers block of the group now meets at the host's time
+        blocks = sorted({entry.block for row_id in row_ids for entry in self.takers_index.entries(row_id)})
+        for block in blocks:
+            other = self.block_clash(block, group, meetings)
+            if other is not None:
+                problems.append(f"Block {block} has {self.label(other)} at that time")
+        return problems
+
+    def describe(self, host):
+        """
+        The time of the host section, like "CCPROG3 X22: T 1530-1730 LAG-COVCA".
+        """
+        times = ", ".join(f"{day} {to_time(begin)}-{to_time(end)} {room}".strip() for _, day, begin, end, room in self.row_info([host])[0][1])
+        return f"{self.label(host)}: {times or 'no meeting time'}"
+
+
+class TaskCancelled(Exception):
+    """
+    Raised inside a task's worker once its Cancel button was pressed.
+    """
+
+
+class Task:
+    """
+    What a worker gets to report progress and notice that it was cancelled.
+
+    Workers are only handed snapshots of the model, never the model itself, and the
+    progress goes through a queue since Tk can only be called from its own thread.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.cancel_event = threading.Event()
+        self.updates = queue.Queue()
+        self.future = None
+
+    def progress(self, done, total=None):
+        self.check()
+        self.updates.put((done, total))
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+def rows_below_cap(df, threshold):
+    """
+    The schedules whose Enrl Cap is below the threshold, blanks and text caps are left out.
+    """
+    enrl_cap = pd.to_numeric(df[ENRL_CAP], errors='coerce')
+    return df[enrl_cap < threshold]
+
+
+def group_by_course(df):
+    """
+    Course code -> (row IDs in sheet order, total Enrl Cap) for the given schedules.
+    """
+    enrl_cap = pd.to_numeric(df[ENRL_CAP], errors='coerce').fillna(0).astype(int)
+    codes = df[COURSE_CODE].astype(str).str.strip()
+    return {
+        code: (row_ids.tolist(), int(enrl_cap[row_ids].sum()))
+        for code, row_ids in df.index.to_series().groupby(codes.to_numpy())
+    }
+
+
+def pack_first_fit_decreasing(sizes, capacity):
+    """
+    Packs the sizes into bins of the given capacity, biggest first into the first bin with room.
+
+    Returns the bins as lists of positions in sizes. A size over the capacity gets a bin of its own.
+    """
+    bins = []
+    free = []
+    for position in sorted(range(len(sizes)), key=lambda position: -sizes[position]):
+        size = sizes[position]
+        for i, room in enumerate(free):
+            if size <= room:
+                bins[i].append(position)
+                free[i] -= size
+                break
+        else:
+            bins.append([position])
+            free.append(capacity - size)
+    return bins
+
+
+def pack_exact(sizes, capacity, budget=PACKING_SEARCH_BUDGET):
+    """
+    The fewest bins for the sizes, by a depth-first search that starts from the first fit answer.
+
+    The search stops after budget steps and keeps the best packing found so far, so it is
+    only worth it for small groups.
+    """
+    best = pack_first_fit_decreasing(sizes, capacity)
+    lower_bound = -(-sum(sizes) // capacity) if capacity > 0 else len(sizes)
+    if len(best) <= lower_bound or any(size > capacity for size in sizes):
+        return best
+
+    order = sorted(range(len(sizes)), key=lambda position: -sizes[position])
+    bins = []
+    free = []
+    steps = 0
+
+    def search(i):
+        nonlocal best, steps
+        steps += 1
+        if steps > budget or len(best) <= lower_bound:
+            return
+        if i == len(order):
+            best = [list(items) for items in bins]
+            return
+        position = order[i]
+        size = sizes[position]
+        tried = set()
+        for b in range(len(bins)):
+            # Bins with the same room left give the same packings, one of them is enough
+            if size <= free[b] and free[b] not in tried:
+                tried.add(free[b])
+                bins[b].append(position)
+                free[b] -= size
+                search(i + 1)
+                free[b] += size
+                bins[b].pop()
+        if len(bins) + 1 < len(best):
+            bins.append([position])
+            free.append(capacity - size)
+            search(i + 1)
+            bins.pop()
+            free.pop()
+
+    search(0)
+    return best
+
+
+def plan_merges(df, threshold, capacity):
+    """
+    Merges the schedules below the threshold into as few sections as fit the capacity.
+
+    Only sections of the same course code offered to the same group are merged. Each group
+    is packed first fit decreasing, and small groups are then searched exactly. Returns
+    group name -> (row IDs, total enrollment cap) for every merge of two or more sections,
+    and the number of candidate sections before and after.
+    """
+    candidates = rows_below_cap(df, threshold)
+    enrl_cap = pd.to_numeric(candidates[ENRL_CAP], errors='coerce').astype(int)
+    keys = pd.DataFrame({
+        "code": candidates[COURSE_CODE].astype(str).str.strip().str.upper(),
+        "offered": candidates[OFFERED_TO].astype(str).str.strip().str.upper(),
+    }, index=candidates.index)
+
+    plan = {}
+    sections_after = 0
+    for (code, offered), group in keys.groupby(["code", "offered"]):
+        row_ids = group.index.tolist()
+        sizes = enrl_cap[row_ids].tolist()
+        if len(row_ids) <= EXACT_PACKING_LIMIT:
+            bins = pack_exact(sizes, capacity)
+        else:
+            bins = pack_first_fit_decreasing(sizes, capacity)
+        sections_after += len(bins)
+        for number, positions in enumerate(bins, start=1):
+            if len(positions) > 1:
+                merged = sorted(row_ids[position] for position in positions)
+                name = f"{code} ({offered}) merge {number}" if offered else f"{code} merge {number}"
+                plan[name] = (merged, sum(sizes[position] for position in positions))
+    return plan, len(candidates), sections_after
+
+
+class ScheduleCore:
+    """
+    A schedule with its model and every index on it, wired up in one place.
+
+    The indexes subscribe to the model in a fixed order, so whatever subscribes after
+    them (the app's table, a batch job) finds them up to date. For example:
+
+        core = ScheduleCore.open("TestFile.xlsx")
+        print(len(core.conflicts()), "conflicts")
+    """
+
+    def __init__(self):
+        self.model = ScheduleModel()
+        self.conflict_index = ConflictIndex(self.model)
+        self.search_index = SearchIndex(self.model)
+        self.sort_keys = SortKeys(self.model)
+        self.value_index = ValueIndex(self.model)
+        self.room_capacities = RoomCapacities(self.model)
+        self.takers_index = TakersIndex(self.model)
+        self.stats = ScheduleStats(self.model)
+        self.merge_checker = MergeChecker(self.model, self.conflict_index, self.takers_index, self.room_capacities)
+
+    @classmethod
+    def open(cls, file_path, task=None):
+        """
+        A core with every college of the workbook read in.
+        """
+        core = cls()
+        core.use_workbook(cls.read_workbook(file_path, task))
+        missing = core.model.unloaded_colleges()
+        core.model.add_colleges(missing, core.model.colleges.read_sections(missing, task))
+        return core
+
+    @classmethod
+    def open_store(cls, file_path):
+        """
+        A core on a shared ScheduleStore, edits go through the store from then on.
+        """
+        core = cls()
+        core.use_store(*cls.read_store(file_path))
+        return core
+
+    @staticmethod
+    def read_workbook(file_path, task=None):
+        """
+        Indexes the college sections of a workbook without touching the core, so it can run
+        on a worker. Hand the index to use_workbook, the rows are read when the colleges are.
+        """
+        return CollegeIndex(file_path, task)
+
+    def use_workbook(self, colleges):
+        self.model.set_colleges(colleges)
+
+    @staticmethod
+    def read_store(file_path):
+        """
+        (store, its contents) of a shared store, for use_store. Like read_workbook it can run on a worker.
+        """
+        store = ScheduleStore(file_path)
+        return store, store.read()
+
+    def use_store(self, store, contents):
+        self.model.set_store(store, *contents)
+
+    def share(self, file_path):
+        """
+        Copies the schedule into a new ScheduleStore and switches over to it.
+        """
+        self.model.load_all_colleges()
+        store = ScheduleStore.create(file_path, self.model)
+        self.model.set_store(store, *store.read())
+
+    def close(self):
+        """
+        Closes the workbook and the shared store, once the session is over.
+        """
+        if self.model.colleges is not None:
+            self.model.colleges.close()
+        if self.model.store is not None:
+            self.model.store.close()
+
+    def conflicts(self):
+        """
+        Every room and faculty conflict, in the shape of find_conflicts.
+        """
+        return self.conflict_index.conflicts()
+
+    def takers_conflicts(self):
+        """
+        Sections sharing a takers block that meet at overlapping times, in the shape of
+        find_conflicts with kind Takers and the block as value.
+        """
+        rows = self.model.df[self.model.df.index.isin(list(self.takers_index.row_entries))]
+        meetings = meetings_table(rows, find_meeting_slots(self.model.column_names()))
+        blocks = meetings["row_id"].map(lambda row_id: [entry.block for entry in self.takers_index.entries(row_id)])
+        keys = meetings.assign(kind="Takers", value=blocks).explode("value", ignore_index=True)
+        keys = keys[["kind", "value", "row_id", "meeting", "day", "begin", "end"]]
+        conflicts = find_overlaps(keys).drop_duplicates(["kind", "value", "row_id_a", "row_id_b"])
+        return conflicts.sort_values(["row_id_a", "row_id_b"], ignore_index=True)
+
+    def validation_errors(self):
+        """
+        (row ID, problem) for every loaded schedule the transactions would refuse, like a
+        time that isn't HHMM or a class that ends before it begins.
+        """
+        df = self.model.df
+        rows = df[self.model.schedule_mask()]
+        columns = range(len(df.columns))
+        slots = find_meeting_slots(self.model.column_names())
+        return [(row_id, error) for row_id, values in zip(rows.index, rows.values.tolist())
+                for error in ScheduleTransaction.check_values(values, columns, slots)]
+
+    @staticmethod
+    def report_row(rows, row_id):
+        """
+        (sheet row, "CODE SECT", faculty) of a row of a snapshot for the reports.
+        """
+        return row_id + 1, f"{rows.at[row_id, COURSE_CODE]} {rows.at[row_id, SECT]}".strip(), str(rows.at[row_id, FACULTY]).strip()
+
+    def takers_sections(self):
+        """
+        Block -> row IDs of its sections in sheet order, a copy of the TakersIndex for a report.
+        """
+        return {block: sorted(self.takers_index.sections[block]) for block in self.takers_index.blocks()}
+
+    @staticmethod
+    def block_meetings(sections, rows, slots):
+        """
+        (block, meetings like TakersIndex.meetings) of every block of takers_sections, worked
+        out from a snapshot on the worker, so the TakersIndex cache is left to the Tk thread.
+        """
+        meetings = {}
+        for block, row_ids in sections.items():
+            for row_id in row_ids:
+                if row_id not in meetings:
+                    meetings[row_id] = row_meetings(rows.loc[row_id].tolist(), slots)
+            yield block, [(row_id, day, begin, end, room) for row_id in row_ids for _, day, begin, end, room in meetings[row_id]]
+
+    def conflict_report(self):
+        """
+        (columns, lines) of every room, faculty and takers conflict.
+
+        The reports are made on the Tk thread and written on a worker, which only reads what
+        is copied here (the conflicts, the blocks' sections and a snapshot of the rows). The
+        lines are generated from those one at a time while they are written, the takers
+        conflicts by a sweep over each block's meetings, the room and faculty ones first.
+        """
+        pairs = sorted(self.conflict_index.pairs.values(), key=lambda pair: (pair["row_id_a"], pair["row_id_b"]))
+        sections = self.takers_sections()
+        rows = self.model.snapshot()
+        slots = find_meeting_slots(self.model.column_names())
+        columns = ("Kind", "Room / Faculty / Block", "Day", "Time", "Sheet Row A", "Schedule A", "Sheet Row B", "Schedule B")
+
+        def lines():
+            takers_pairs = (pair for block, meetings in self.block_meetings(sections, rows, slots)
+                            for pair in sweep_overlaps("Takers", block, meetings))
+            for pair in itertools.chain(pairs, takers_pairs):
+                sheet_row_a, label_a, _ = self.report_row(rows, pair["row_id_a"])
+                sheet_row_b, label_b, _ = self.report_row(rows, pair["row_id_b"])
+                time_text = f"{to_time(max(pair['begin_a'], pair['begin_b']))}-{to_time(min(pair['end_a'], pair['end_b']))}"
+                yield (pair["kind"], pair["value"], pair["day"], time_text, sheet_row_a, label_a, sheet_row_b, label_b)
+
+        return columns, lines()
+
+    def timetable_report(self, kind):
+        """
+        (columns, lines) of the week of every room, faculty member or takers block (kind is
+        Room, Faculty or Block), by name, day and time.
+
+        Like conflict_report the buckets (or the blocks' sections) and the rows are copied
+        when the report is made, each bucket is sorted while the lines are written.
+        """
+        columns = (kind, "Day", "Begin", "End", "Sheet Row", "Schedule", "Room", "Faculty")
+        slots = find_meeting_slots(self.model.column_names())
+        rows = self.model.snapshot()
+
+        def bucket_lines(buckets):
+            for (_, value, day), bucket in sorted(buckets, key=lambda item: (item[0][1], DAY_LETTERS.index(item[0][2]))):
+                for (row_id, meeting), (begin, end) in sorted(bucket.items(), key=lambda item: (item[1], item[0])):
+                    sheet_row, label, faculty = self.report_row(rows, row_id)
+                    room = str(rows.at[row_id, slots[meeting - 1][3]]).strip()
+                    yield (value, day, to_time(begin), to_time(end), sheet_row, label, room, faculty)
+
+        def block_lines(sections):
+            for block, meetings in self.block_meetings(sections, rows, slots):
+                for row_id, day, begin, end, room in sorted(meetings, key=lambda meeting: (DAY_LETTERS.index(meeting[1]), meeting[2], meeting[0])):
+                    sheet_row, label, faculty = self.report_row(rows, row_id)
+                    yield (block, day, to_time(begin), to_time(end), sheet_row, label, room, faculty)
+
+        if kind == "Block":
+            return columns, block_lines(self.takers_sections())
+        return columns, bucket_lines([(key, bucket.copy()) for key, bucket in self.conflict_index.buckets.items() if key[0] == kind])
+
+    def merge_plan_report(self, plan, hosts, notes):
+        """
+        (columns, lines) of a merge plan with check_merge_plan's hosts and notes, one line per section.
+        """
+        columns = ("Merge", "Total Enrl Cap", "Sheet Row", "Schedule", "Enrl Cap", "Keeps Its Time", "Note")
+        rows = self.model.df.loc[self.model.df.index.isin([row_id for row_ids, _ in plan.values() for row_id in row_ids])].copy()
+
+        def lines():
+            for name, (row_ids, total) in plan.items():
+                for row_id in row_ids:
+                    if row_id in rows.index:
+                        sheet_row, label, _ = self.report_row(rows, row_id)
+                        enrl_cap = rows.at[row_id, ENRL_CAP]
+                    else:  # Deleted since the plan was made
+                        sheet_row, label, enrl_cap = row_id + 1, '', ''
+                    yield (name, total, sheet_row, label, enrl_cap, "Yes" if hosts.get(name) == row_id else '', notes.get(name, ''))
+
+        return columns, lines()
+
+    def schedules(self):
+        """
+        A copy of the loaded schedule rows, without the header rows, for a worker.
+        """
+        return self.model.df[self.model.schedule_mask()].copy()
+
+    def changed_rows(self, rows, versions=None):
+        """
+        The IDs of the rows of a copy like schedules() that were edited or deleted since it
+        was taken. versions is model.row_versions of the rows from then, for a shared store.
+        """
+        df = self.model.df
+        current = df.reindex(rows.index)
+        same = (current == rows).all(axis=1).to_numpy() & rows.index.isin(df.index)
+        changed = set(rows.index[~same])
+        if versions:
+            now = self.model.row_versions(rows.index)
+            changed.update(row_id for row_id, version in versions.items() if now.get(row_id) != version)
+        return sorted(changed)
+
+    def merge_suggestions(self, threshold, schedules=None):
+        """
+        Course code -> (row IDs, total Enrl Cap) of the schedules below the threshold.
+
+        Like merge_plan it works on the loaded schedules, or on a copy from schedules()
+        when it runs on a worker.
+        """
+        if schedules is None:
+            schedules = self.model.df[self.model.schedule_mask()]
+        return group_by_course(rows_below_cap(schedules, threshold))
+
+    def merge_plan(self, threshold, capacity, schedules=None):
+        """
+        plan_merges over the loaded schedules: (plan, sections before, sections after).
+        """
+        if schedules is None:
+            schedules = self.model.df[self.model.schedule_mask()]
+        return plan_merges(schedules, threshold, capacity)
+
+    def check_merge_plan(self, plan):
+        """
+        The host each planned merge fits at ({name: host}, the ones that don't fit are left
+        out) and a note per merge with that time or its problems.
+        """
+        notes = {}
+        hosts = {}
+        self.merge_checker.row_info([row_id for row_ids, _ in plan.values() for row_id in row_ids])  # One lookup for all of them
+        for name, (row_ids, _) in plan.items():
+            best = self.merge_checker.options(row_ids)[0]
+            notes[name] = f"OK at {self.merge_checker.describe(best.host)}" if not best.problems else "; ".join(best.problems)
+            if not best.problems:
+                hosts[name] = best.host
+        return hosts, notes
+
+    def bulk_edit(self, criteria, changes):
+        """
+        Sets changes on every schedule matching criteria in one transaction, returns their IDs.
+        """
+        row_ids = self.model.match_rows(criteria)
+        if row_ids:
+            transaction = self.model.transaction()
+            transaction.update_many(row_ids, changes)
+            transaction.commit()
+        return row_ids
+
+    def save(self, file_path, task=None):
+        # The whole sheet is written back
+        self.model.load_all_colleges()
+        self.save_work(file_path)(task)
+
+    def save_work(self, file_path):
+        """
+        work(task) writing a copy of the schedule to file_path, which can run on a worker.
+        Every college has to be loaded by then.
+        """
+        colleges = self.model.colleges
+        if colleges is not None:
+            colleges.close()  # The workbook may be the one being overwritten, a shared store stays open
+        snapshot = self.model.snapshot()
+        room_capacities = dict(colleges.room_capacities) if colleges is not None else {}
+        return lambda task=None: write_workbook(snapshot, file_path, task, room_capacities)
@@ -0,0 +1,87 @@
+import pytest
+
+from scheduling_core import (
+    DAY1, BEGIN1, END1, FACULTY, LOADED, ROOM1, TAKERS,
+    ChangeEvent, ConflictIndex, ScheduleCore, ScheduleStats, SearchIndex, TakersIndex,
+)
+
+
+@pytest.fixture
+def core(workbook_path):
+    core = ScheduleCore.open(workbook_path)
+    core.stats.build()  # Only kept up to date once built
+    return core
+
+
+def rebuilt(core):
+    """
+    Fresh indexes over the model as it is now, fed the rows the way loading a workbook does.
+    """
+    model = core.model
+    loaded = [ChangeEvent(LOADED, row_id, None, values) for row_id, values in zip(model.df.index, model.df.values.tolist())]
+    conflict_index = ConflictIndex(model)
+    search_index, takers_index, stats = SearchIndex(model), TakersIndex(model), ScheduleStats(model)
+    for index in (search_index, takers_index):
+        index.on_change(loaded)
+    stats.build()
+    for index in (conflict_index, search_index, takers_index, stats):
+        model.unsubscribe(index.on_change)
+    return conflict_index, search_index, takers_index, stats
+
+
+def check_indexes(core):
+    conflict_index, search_index, takers_index, stats = rebuilt(core)
+    assert core.conflict_index.buckets == conflict_index.buckets
+    assert core.conflict_index.pairs == conflict_index.pairs
+    assert core.conflict_index.row_pairs == conflict_index.row_pairs
+    assert core.search_index.tokens == search_index.tokens
+    assert core.search_index.row_tokens == search_index.row_tokens
+    assert core.takers_index.sections == takers_index.sections
+    assert core.takers_index.row_entries == takers_index.row_entries
+    assert core.stats.totals == stats.totals
+
+
+def test_loaded_indexes_match_a_rebuild(core):
+    check_indexes(core)
+
+
+def test_update_keeps_indexes_consistent(core):
+    rows = core.schedules()
+    target, other = rows.index[0], rows.index[1]
+    with core.model.transaction() as transaction:
+        # Move the target into the other row's room and time, and give it new takers
+        transaction.update(target, {col: rows.at[other, col] for col in (DAY1, BEGIN1, END1, ROOM1)})
+        transaction.update(target, {TAKERS: "CIV-121 [5] NEW-120 [3]", FACULTY: "SOMEONE, NEW"})
+    assert core.conflict_index.row_conflicts(target)
+    assert core.takers_index.sections["NEW-120"] == {target}
+    check_indexes(core)
+
+
+def test_delete_keeps_indexes_consistent(core):
+    conflicting = sorted({row_id for _, row_id_a, row_id_b in core.conflict_index.pairs for row_id in (row_id_a, row_id_b)})
+    with core.model.transaction() as transaction:
+        transaction.delete_many(conflicting[:3] + core.schedules().index[:5].tolist())
+    check_indexes(core)
+
+
+def test_insert_keeps_indexes_consistent(core):
+    rows = core.schedules()
+    source = next(row_id for row_id in rows.index if not core.conflict_index.row_conflicts(row_id) and str(rows.at[row_id, ROOM1]).strip())
+    with core.model.transaction() as transaction:
+        new_id = transaction.insert(rows.loc[source].tolist(), after=source)
+    # The copy meets in the same room at the same time as its source
+    assert any(pair["row_id_b"] == new_id or pair["row_id_a"] == new_id for pair in core.conflict_index.row_conflicts(source))
+    check_indexes(core)
+
+
+def test_edits_in_a_row_keep_indexes_consistent(core):
+    rows = core.schedules()
+    with core.model.transaction() as transaction:
+        new_id = transaction.insert(rows.loc[rows.index[2]].tolist(), after=rows.index[2])
+    with core.model.transaction() as transaction:
+        transaction.update(new_id, {ROOM1: "NEW ROOM", TAKERS: "IE-120 [4]"})
+        transaction.delete(rows.index[3])
+    with core.model.transaction() as transaction:
+        transaction.delete(new_id)
+        transaction.update(rows.index[4], {ROOM1: rows.at[rows.index[2], ROOM1]})
+    check_indexes(core)
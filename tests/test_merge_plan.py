@@ -0,0 +1,57 @@
+import pytest
+
+from scheduling_core import BEGIN1, DAY1, END1, FACULTY, ROOM1, ScheduleCore
+
+# A Saturday evening in a room big enough for the merged GEDANCE sections
+MEETING = {DAY1: "S", BEGIN1: "1900", END1: "2000", ROOM1: "RL301"}
+
+
+@pytest.fixture
+def core(workbook_path):
+    core = ScheduleCore.open(workbook_path)
+    with core.model.transaction() as transaction:
+        transaction.update_many([250, 254], MEETING)
+    return core
+
+
+@pytest.fixture
+def planned(core):
+    schedules = core.schedules()
+    plan, _, _ = core.merge_plan(30, 60, schedules)
+    return plan, schedules.loc[[row_id for row_ids, _ in plan.values() for row_id in row_ids]]
+
+
+def test_plan_fits_until_another_section_takes_the_time(core, planned):
+    plan, rows = planned
+    hosts, _ = core.check_merge_plan(plan)
+    assert hosts == {"GEDANCE merge 1": 250}
+
+    other = next(row_id for row_id in core.schedules().index if row_id not in rows.index)
+    with core.model.transaction() as transaction:
+        transaction.update(other, MEETING)
+    hosts, notes = core.check_merge_plan(plan)
+    assert hosts == {}
+    assert "RL301" in notes["GEDANCE merge 1"]
+    assert core.changed_rows(rows) == []  # The plan's own rows are as they were
+
+
+def test_changed_rows_of_a_plan(core, planned):
+    _, rows = planned
+    assert core.changed_rows(rows) == []
+    with core.model.transaction() as transaction:
+        transaction.update(250, {FACULTY: "SOMEONE, NEW"})
+        transaction.delete(254)
+    assert core.changed_rows(rows) == [250, 254]
+
+
+def test_changed_rows_of_a_shared_store(core, tmp_path):
+    core.share(str(tmp_path / "schedule.db"))
+    other = ScheduleCore.open_store(str(tmp_path / "schedule.db"))
+    rows = core.schedules()
+    versions = core.model.row_versions(rows.index)
+    with other.model.transaction() as transaction:
+        transaction.update(250, {FACULTY: "SOMEONE, NEW"})
+    core.model.store.pull(core.model)
+    assert core.changed_rows(rows, versions) == [250]
+    other.close()
+    core.close()
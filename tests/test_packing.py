@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from scheduling_core import pack_exact, pack_first_fit_decreasing
+
+
+def partitions(items):
+    # Every way of splitting the items into groups
+    if not items:
+        yield []
+        return
+    first, rest = items[0], items[1:]
+    for partition in partitions(rest):
+        for i in range(len(partition)):
+            yield partition[:i] + [[first] + partition[i]] + partition[i + 1:]
+        yield [[first]] + partition
+
+
+def fewest_bins(sizes, capacity):
+    return min(
+        len(partition) for partition in partitions(list(range(len(sizes))))
+        if all(sum(sizes[position] for position in group) <= capacity for group in partition)
+    )
+
+
+def check_packing(bins, sizes, capacity):
+    positions = sorted(position for items in bins for position in items)
+    assert positions == list(range(len(sizes)))
+    for items in bins:
+        assert len(items) == 1 or sum(sizes[position] for position in items) <= capacity
+
+
+@pytest.mark.parametrize("sizes, capacity, count", [
+    ([], 10, 0),
+    ([5], 10, 1),
+    ([5, 5, 5, 5], 10, 2),
+    ([4, 4, 4, 3, 3, 3], 10, 3),
+    ([3, 3, 2, 2, 2, 2], 7, 2),  # First fit decreasing needs 3
+    ([12, 3], 10, 2),  # Over the capacity, a bin of its own
+])
+def test_pack_exact_small_cases(sizes, capacity, count):
+    bins = pack_exact(sizes, capacity)
+    check_packing(bins, sizes, capacity)
+    assert len(bins) == count
+
+
+def test_first_fit_decreasing_is_not_always_optimal():
+    sizes, capacity = [3, 3, 2, 2, 2, 2], 7
+    assert len(pack_first_fit_decreasing(sizes, capacity)) == 3
+    assert len(pack_exact(sizes, capacity)) == 2
+
+
+def test_pack_exact_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(200):
+        capacity = rng.randint(5, 20)
+        sizes = [rng.randint(1, capacity) for _ in range(rng.randint(1, 7))]
+        bins = pack_exact(sizes, capacity)
+        check_packing(bins, sizes, capacity)
+        assert len(bins) == fewest_bins(sizes, capacity)
+
+
+def test_first_fit_decreasing_packs_valid_bins():
+    rng = random.Random(3)
+    for _ in range(200):
+        capacity = rng.randint(5, 20)
+        sizes = [rng.randint(1, capacity) for _ in range(rng.randint(1, 12))]
+        bins = pack_first_fit_decreasing(sizes, capacity)
+        check_packing(bins, sizes, capacity)
+        # First fit decreasing never uses more than 11/9 of the optimum plus one
+        if len(sizes) <= 7:
+            assert len(bins) <= 11 * fewest_bins(sizes, capacity) // 9 + 1
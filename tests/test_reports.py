@@ -0,0 +1,38 @@
+import pytest
+
+from scheduling_core import FACULTY, ROOM1, ScheduleCore
+
+
+@pytest.fixture
+def core(workbook_path):
+    return ScheduleCore.open(workbook_path)
+
+
+def edit_everything(core):
+    # Deletes the rows of every conflict and renames the rooms and faculty of the rest
+    conflicting = {row_id for _, row_id_a, row_id_b in core.conflict_index.pairs for row_id in (row_id_a, row_id_b)}
+    with core.model.transaction() as transaction:
+        transaction.delete_many(sorted(conflicting))
+        transaction.update_many([row_id for row_id in core.schedules().index if row_id not in conflicting], {ROOM1: "ELSEWHERE", FACULTY: "SOMEONE"})
+
+
+@pytest.mark.parametrize("make_report", [
+    lambda core: core.conflict_report(),
+    lambda core: core.timetable_report("Room"),
+    lambda core: core.timetable_report("Faculty"),
+    lambda core: core.timetable_report("Block"),
+])
+def test_reports_show_the_schedule_as_it_was_when_made(core, make_report):
+    _, expected = make_report(core)
+    expected = list(expected)
+    _, lines = make_report(core)
+    edit_everything(core)
+    assert list(lines) == expected
+    assert list(make_report(core)[1]) != expected
+
+
+def test_conflict_report_lists_takers_conflicts(core):
+    _, lines = core.conflict_report()
+    takers = sorted((value, row_a - 1, row_b - 1) for kind, value, _, _, row_a, _, row_b, _ in lines if kind == "Takers")
+    expected = core.takers_conflicts()
+    assert takers == sorted(zip(expected["value"], expected["row_id_a"], expected["row_id_b"]))
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from schedule_service import ScheduleService, ScheduleView
+from scheduling_core import ROOM1, ScheduleCore, to_time
+
+
+@pytest.fixture
+def core(workbook_path):
+    return ScheduleCore.open(workbook_path)
+
+
+def run(service, requests):
+    """
+    Starts the service on a free port, sends the (method, target, body) requests one after
+    another and returns the (status, result) of each.
+    """
+    async def main():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        writer_task = asyncio.create_task(service.writer())
+        port = server.sockets[0].getsockname()[1]
+        answers = []
+        for method, target, body in requests:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            payload = json.dumps(body).encode() if body is not None else b""
+            writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+            status_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            answers.append((int(status_line.split()[1]), json.loads(await reader.read())))
+            writer.close()
+        writer_task.cancel()
+        server.close()
+        await server.wait_closed()
+        return answers
+
+    return asyncio.run(main())
+
+
+def busy_rows(core, kind, value, day, begin, end):
+    # What /free should say, straight from the conflict index
+    meetings = core.conflict_index.buckets.get((kind, value, day), {})
+    return sorted(row_id + 1 for (row_id, _), (meeting_begin, meeting_end) in meetings.items() if meeting_begin < end and meeting_end > begin)
+
+
+def test_free_matches_the_conflict_index(core):
+    service = ScheduleService(core)
+    rng = random.Random(5)
+    for kind, value, day in rng.sample(sorted(core.conflict_index.buckets), 40):
+        begin = rng.randrange(7 * 60, 20 * 60, 30)
+        end = begin + rng.choice([30, 90, 180])
+        name = "room" if kind == "Room" else "faculty"
+        status, result = service.answer("GET", f"/free?{name}={value}&day={day}&begin={to_time(begin)}&end={to_time(end)}", b"")
+        expected = busy_rows(core, kind, value, day, begin, end)
+        assert status == 200
+        assert sorted(meeting["row"] for meeting in result["busy"]) == expected
+        assert result["free"] == (not expected)
+
+
+def test_free_over_several_days(core):
+    service = ScheduleService(core)
+    (kind, value, day), meetings = next(iter(core.conflict_index.buckets.items()))
+    begin, end = next(iter(meetings.values()))
+    other_day = next(letter for letter in "MTWHFS" if letter != day)
+    name = "room" if kind == "Room" else "faculty"
+    status, result = service.answer("GET", f"/free?{name}={value.lower()}&day={other_day}{day}&begin={to_time(begin)}&end={to_time(end)}", b"")
+    assert status == 200
+    assert not result["free"]
+    assert {meeting["day"] for meeting in result["busy"]} >= {day}
+
+
+@pytest.mark.parametrize("target", [
+    "/free?day=T&begin=1100&end=1230",
+    "/free?room=MRE113&begin=1100&end=1230",
+    "/free?room=MRE113&day=T&begin=1230&end=1100",
+    "/free?room=MRE113&day=T&begin=noon&end=1300",
+])
+def test_free_rejects_bad_queries(core, target):
+    status, result = ScheduleService(core).answer("GET", target, b"")
+    assert status == 400
+    assert "error" in result
+
+
+def test_shared_rooms_are_always_free(core):
+    status, result = ScheduleService(core).answer("GET", "/free?room=ONLINE&day=T&begin=0700&end=2100", b"")
+    assert (status, result["free"]) == (200, True)
+
+
+def test_edit_updates_the_view(core):
+    service = ScheduleService(core)
+    (_, room, day), row_id, (begin, end) = next(
+        (key, row_id, times) for key, meetings in core.conflict_index.buckets.items() if key[0] == "Room"
+        for (row_id, meeting), times in meetings.items() if meeting == 1)
+    free = f"/free?room={{}}&day={day}&begin={to_time(begin)}&end={to_time(end)}"
+
+    answers = run(service, [
+        ("POST", "/edit", {"row": int(row_id) + 1, "changes": {"Room1": "NEW ROOM"}}),
+        ("GET", free.format("NEW%20ROOM"), None),
+        ("GET", free.format(room), None),
+    ])
+    assert answers[0] == (200, {"version": 1})
+    assert [meeting["row"] for meeting in answers[1][1]["busy"]] == [row_id + 1]
+    assert row_id + 1 not in [meeting["row"] for meeting in answers[2][1]["busy"]]
+    assert core.model.df.at[row_id, ROOM1] == "NEW ROOM"
+
+
+def test_edits_keep_the_view_like_a_rebuild(core):
+    service = ScheduleService(core)
+    conflicting = sorted({row_id for _, row_id_a, row_id_b in core.conflict_index.pairs for row_id in (row_id_a, row_id_b)})
+    moved = core.schedules().index[0]
+    answers = run(service, [
+        ("POST", "/edit", {"row": int(conflicting[0]) + 1, "delete": True}),
+        ("POST", "/edit", {"row": int(moved) + 1, "changes": {"Room1": core.model.df.at[conflicting[1], ROOM1]}}),
+        ("POST", "/edit", {"row": int(conflicting[2]) + 1, "changes": {"Faculty": "SOMEONE, NEW"}}),
+    ])
+    assert [status for status, _ in answers] == [200, 200, 200]
+    assert service.view.version == 3
+
+    rebuilt = ScheduleView.build(core)
+    assert service.view.busy == rebuilt.busy
+    assert service.view.labels == rebuilt.labels
+    assert {key: sorted(map(str, pairs)) for key, pairs in service.view.conflicts.items()} == \
+        {key: sorted(map(str, pairs)) for key, pairs in rebuilt.conflicts.items()}
+    assert service.answer("GET", f"/schedule?row={int(conflicting[0]) + 1}", b"")[0] == 404
+
+
+@pytest.mark.parametrize("edit", [
+    {"changes": {"Room1": "X"}},
+    {"row": 1, "changes": {"Room1": "X"}},
+    {"row": 6},
+    {"row": 6, "changes": {"No Such Column": "X"}},
+    {"row": 6, "changes": {"Begin1": "noon"}},
+])
+def test_bad_edits_are_rejected(core, edit):
+    service = ScheduleService(core)
+    before = core.model.df.copy()
+    (status, result), = run(service, [("POST", "/edit", edit)])
+    assert status == 400
+    assert "error" in result
+    assert core.model.df.equals(before)
+    assert service.view.version == 0
@@ -0,0 +1,112 @@
+import pytest
+
+from scheduling_core import FACULTY, ROOM1, ScheduleCore, StaleRowsError
+
+
+@pytest.fixture
+def cores(workbook_path, tmp_path):
+    """
+    Two people on the same shared store, one shared the workbook and the other opened the store.
+    """
+    alice = ScheduleCore.open(workbook_path)
+    alice.share(str(tmp_path / "schedule.db"))
+    bob = ScheduleCore.open_store(str(tmp_path / "schedule.db"))
+    yield alice, bob
+    alice.close()
+    bob.close()
+
+
+def schedule_row(core, n=0):
+    return core.schedules().index[n]
+
+
+def test_pull_applies_the_others_edits(cores):
+    alice, bob = cores
+    row_id = schedule_row(alice)
+    with alice.model.transaction() as transaction:
+        transaction.update(row_id, {FACULTY: "SOMEONE, NEW"})
+    assert bob.model.df.at[row_id, FACULTY] != "SOMEONE, NEW"
+    assert bob.model.store.pull(bob.model) == 1
+    assert bob.model.df.at[row_id, FACULTY] == "SOMEONE, NEW"
+    assert alice.model.store.pull(alice.model) == 0  # Our own change is already in
+
+
+def test_pull_places_inserts_and_deletes(cores):
+    alice, bob = cores
+    anchor, deleted = schedule_row(alice, 3), schedule_row(alice, 4)
+    with alice.model.transaction() as transaction:
+        new_id = transaction.insert(alice.model.df.loc[anchor].tolist(), after=anchor)
+        transaction.delete(deleted)
+    bob.model.store.pull(bob.model)
+    assert bob.model.df.index.tolist() == alice.model.df.index.tolist()
+    assert bob.model.df.loc[new_id].tolist() == alice.model.df.loc[new_id].tolist()
+    assert deleted not in bob.model.df.index
+
+
+def test_stale_update_is_rejected(cores):
+    alice, bob = cores
+    row_id = schedule_row(alice)
+    with alice.model.transaction() as transaction:
+        transaction.update(row_id, {FACULTY: "ALICE"})
+    before = bob.model.df.copy()
+    with pytest.raises(StaleRowsError) as error:
+        with bob.model.transaction() as transaction:
+            transaction.update(row_id, {FACULTY: "BOB"})
+    assert error.value.row_ids == [row_id]
+    assert bob.model.df.equals(before)  # Nothing applied
+
+    # The store still has the first edit, and once bob has it his edit goes through
+    bob.model.store.pull(bob.model)
+    assert bob.model.df.at[row_id, FACULTY] == "ALICE"
+    with bob.model.transaction() as transaction:
+        transaction.update(row_id, {FACULTY: "BOB"})
+    alice.model.store.pull(alice.model)
+    assert alice.model.df.at[row_id, FACULTY] == "BOB"
+
+
+def test_edit_made_before_a_pull_is_rejected(cores):
+    alice, bob = cores
+    row_id = schedule_row(alice)
+    versions = bob.model.row_versions([row_id])  # Bob opens the edit form
+    with alice.model.transaction() as transaction:
+        transaction.update(row_id, {FACULTY: "ALICE"})
+    bob.model.store.pull(bob.model)  # The background pull runs while the form is open
+    with pytest.raises(StaleRowsError):
+        with bob.model.transaction(based_on=versions) as transaction:
+            transaction.update(row_id, {FACULTY: "BOB"})
+    assert bob.model.df.at[row_id, FACULTY] == "ALICE"
+    alice.model.store.pull(alice.model)
+    assert alice.model.df.at[row_id, FACULTY] == "ALICE"
+
+    # Made again on the new version it goes through
+    with bob.model.transaction(based_on=bob.model.row_versions([row_id])) as transaction:
+        transaction.update(row_id, {FACULTY: "BOB"})
+    alice.model.store.pull(alice.model)
+    assert alice.model.df.at[row_id, FACULTY] == "BOB"
+
+
+def test_edit_of_a_deleted_row_is_rejected(cores):
+    alice, bob = cores
+    row_id = schedule_row(alice)
+    with alice.model.transaction() as transaction:
+        transaction.delete(row_id)
+    with pytest.raises(StaleRowsError):
+        with bob.model.transaction() as transaction:
+            transaction.update(row_id, {ROOM1: "NEW ROOM"})
+    with pytest.raises(StaleRowsError):
+        with bob.model.transaction() as transaction:
+            transaction.delete(row_id)
+
+
+def test_edits_of_different_rows_both_go_through(cores):
+    alice, bob = cores
+    first, second = schedule_row(alice, 0), schedule_row(alice, 1)
+    with alice.model.transaction() as transaction:
+        transaction.update(first, {FACULTY: "ALICE"})
+    with bob.model.transaction() as transaction:
+        transaction.update(second, {FACULTY: "BOB"})
+    alice.model.store.pull(alice.model)
+    bob.model.store.pull(bob.model)
+    assert alice.model.df.equals(bob.model.df)
+    assert alice.model.df.at[second, FACULTY] == "BOB"
+    assert bob.model.df.at[first, FACULTY] == "ALICE"
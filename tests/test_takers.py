@@ -0,0 +1,59 @@
+import pytest
+
+from scheduling_core import ENRL_CAP, TAKERS, TakersEntry, format_takers, merge_rows, merge_takers, parse_takers, takers_remarks
+
+
+@pytest.mark.parametrize("text, entries", [
+    ("CIV-122 [13] CPE-121 [10]", [("CIV-122", 13), ("CPE-121", 10)]),
+    ("ST-119 (9)", [("ST-119", 9)]),
+    ("IET-GD2-119 (16+16=32)", [("IET-GD2-119", 32)]),
+    ("IET-AD2-120 (2+9)", [("IET-AD2-120", 11)]),
+    ("BSCHYFS-ID121 [4]", [("BSCHYFS-ID121", 4)]),
+    ("IBSS 120 [12]", [("IBSS 120", 12)]),
+    ("CS-GD 117", [("CS-GD 117", None)]),
+    ("SR ABELSS -119 [8]", [("ABELSS-119", 8)]),
+    ("FR BECEDS-122 [9] JR BECEDS-120 [1]", [("BECEDS-122", 9), ("BECEDS-120", 1)]),
+    ("cpe-121 [3]", [("CPE-121", 3)]),
+])
+def test_parse_takers(text, entries):
+    assert parse_takers(text) == tuple(TakersEntry(block, count) for block, count in entries)
+
+
+@pytest.mark.parametrize("text", ["", "CLA", "IRREGULAR", "merge1 + merge2", "TAKERS", "[ENDCELL# 254] 25-042423"])
+def test_parse_takers_without_blocks(text):
+    assert parse_takers(text) == ()
+
+
+def test_words_between_blocks_are_not_blocks():
+    text = "CIV-121 [12] WITH CPE-121 [10]"
+    assert parse_takers(text) == (TakersEntry("CIV-121", 12), TakersEntry("CPE-121", 10))
+    assert takers_remarks(text) == "WITH"
+
+
+def test_remarks_after_a_block():
+    assert parse_takers("ABELS -118 & above") == (TakersEntry("ABELS-118", None),)
+    assert takers_remarks("ABELS -118 & above") == "& above"
+    assert takers_remarks("CIV-122 [13] CPE-121 [10]") == ""
+
+
+def test_blocks_listed_twice_are_combined():
+    assert parse_takers("CPE-121 [3] CPE-121 [4]") == (TakersEntry("CPE-121", 7),)
+    assert parse_takers("CIV-121 [12] CIV-121") == (TakersEntry("CIV-121", 12),)
+
+
+def test_merge_and_format_round_trip():
+    entries = merge_takers([parse_takers("CIV-121 [2] IE-120"), parse_takers("CIV-121 [3] IE-120 [4]")])
+    assert entries == (TakersEntry("CIV-121", 5), TakersEntry("IE-120", 4))
+    assert format_takers(entries) == "CIV-121 [5] IE-120 [4]"
+    assert parse_takers(format_takers(entries)) == entries
+
+
+def test_merge_rows_keeps_the_remarks():
+    width = ENRL_CAP + 2
+    host = [""] * width
+    host[TAKERS], host[ENRL_CAP] = "CIV-121 [12] pre-enlist?", 12
+    other = [""] * width
+    other[TAKERS], other[ENRL_CAP] = "CIV-121 [3] CPE-121 [10]", "13"
+    merged = merge_rows([host, other], 0)
+    assert merged[TAKERS] == "CIV-121 [15] CPE-121 [10] pre-enlist?"
+    assert merged[ENRL_CAP] == 25